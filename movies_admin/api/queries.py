@@ -0,0 +1,139 @@
+"""
+SQL, который собирает кинокартины вместе с жанрами и участниками
+в готовый JSON. Страница списка — один запрос: JSON строит Postgres
+функциями json_agg и json_build_object, а Python отдаёт его как есть.
+"""
+
+from typing import Optional, Sequence, Tuple
+from uuid import UUID
+
+from django.db import connection
+from film_works.models import RolePerson
+
+# Участники кинокартины по ролям: для каждой роли из RolePerson
+# свой ключ, даже если участников с ней нет
+PERSONS_BY_ROLE = ",\n".join(f"""
+            %(role_{index})s, coalesce(
+                json_agg(
+                    json_build_object('id', p.id, 'full_name', p.full_name)
+                    ORDER BY p.full_name
+                ) FILTER (WHERE fwp.role = %(role_{index})s),
+                '[]'
+            )""" for index, _ in enumerate(RolePerson.values))
+
+FILM_WORK_JSON = f"""
+    json_build_object(
+        'id', fw.id,
+        'title', fw.title,
+        'description', fw.description,
+        'creation_date', fw.creation_date,
+        'certificate', fw.certificate,
+        'file_path', fw.file_path,
+        'rating', fw.rating,
+        'type', fw.type,
+        'genres', (
+            SELECT coalesce(
+                json_agg(
+                    json_build_object('id', g.id, 'title', g.title)
+                    ORDER BY g.title
+                ),
+                '[]'
+            )
+            FROM film_works_genres fwg
+                     JOIN genres g ON g.id = fwg.genre_id
+            WHERE fwg.film_work_id = fw.id
+        ),
+        'persons', (
+            SELECT json_build_object({PERSONS_BY_ROLE}
+            )
+            FROM film_works_persons fwp
+                     JOIN persons p ON p.id = fwp.person_id
+            WHERE fwp.film_work_id = fw.id
+        )
+    )
+"""
+
+# Страница из limit кинокартин по возрастанию id. Строка limit + 1
+# читается только для того, чтобы узнать, есть ли следующая страница.
+PAGE_SQL = """
+    WITH page AS (
+        SELECT fw.*
+        FROM film_work fw
+        WHERE {where}
+        ORDER BY fw.id
+        LIMIT %(limit)s + 1
+    ),
+         shown AS (
+             SELECT *
+             FROM page
+             ORDER BY id
+             LIMIT %(limit)s
+         )
+    SELECT (SELECT count(*) FROM page) > %(limit)s,
+           (SELECT id FROM shown ORDER BY id DESC LIMIT 1),
+           coalesce(json_agg({film_work} ORDER BY fw.id), '[]')::text
+    FROM shown fw
+"""
+
+DETAIL_SQL = f"""
+    SELECT {FILM_WORK_JSON}::text
+    FROM film_work fw
+    WHERE fw.id = %(id)s
+"""
+
+
+def _role_params() -> dict:
+    return {f"role_{index}": role for index, role in enumerate(RolePerson.values)}
+
+
+def film_works_page(
+    limit: int,
+    after: Optional[UUID] = None,
+    genres: Sequence[UUID] = (),
+    film_work_type: Optional[str] = None,
+    rating_min: Optional[float] = None,
+    rating_max: Optional[float] = None,
+) -> Tuple[str, Optional[UUID]]:
+    """
+    JSON-массив кинокартин страницы и id последней из них, если
+    за ней есть ещё кинокартины. Фильтр по жанрам оставляет
+    кинокартины, у которых есть хотя бы один из genres.
+    """
+    conditions = ["TRUE"]
+    params = {"limit": limit, **_role_params()}
+    if after is not None:
+        conditions.append("fw.id > %(after)s")
+        params["after"] = after
+    if genres:
+        conditions.append("""EXISTS(
+                SELECT 1
+                FROM film_works_genres fwg
+                WHERE fwg.film_work_id = fw.id
+                  AND fwg.genre_id = ANY (%(genres)s::uuid[])
+            )""")
+        params["genres"] = [str(genre) for genre in genres]
+    if film_work_type is not None:
+        conditions.append("fw.type = %(type)s")
+        params["type"] = film_work_type
+    if rating_min is not None:
+        conditions.append("fw.rating >= %(rating_min)s")
+        params["rating_min"] = rating_min
+    if rating_max is not None:
+        conditions.append("fw.rating <= %(rating_max)s")
+        params["rating_max"] = rating_max
+
+    sql = PAGE_SQL.format(
+        where="\n          AND ".join(conditions), film_work=FILM_WORK_JSON
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        more, last_id, results = cursor.fetchone()
+    return results, last_id if more else None
+
+
+def film_work(pk: UUID) -> Optional[str]:
+    """ JSON одной кинокартины или None, если её нет """
+    with connection.cursor() as cursor:
+        cursor.execute(DETAIL_SQL, {"id": pk, **_role_params()})
+        row = cursor.fetchone()
+    return row[0] if row else None
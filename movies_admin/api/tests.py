@@ -0,0 +1,173 @@
+from urllib.parse import parse_qs, urlsplit
+from uuid import UUID
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.http import urlsafe_base64_decode
+from film_works.models import (
+    FilmWork,
+    FilmWorksGenres,
+    FilmWorksPersons,
+    FilmWorkType,
+    Genre,
+    Person,
+    RolePerson,
+)
+
+ROWS = 12
+LIMIT = 5
+
+
+class FilmWorksApiTest(TestCase):
+    """
+    Страница списка — один запрос, кинокартины в нём идут по id
+    с жанрами и участниками по ролям, а неверные параметры дают 400.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.drama = Genre.objects.create(title="Драма")
+        cls.comedy = Genre.objects.create(title="Комедия")
+        cls.horror = Genre.objects.create(title="Ужасы")
+        cls.film_works = FilmWork.objects.bulk_create(
+            FilmWork(
+                title=f"Кинокартина {i}",
+                type=FilmWorkType.MOVIE if i % 2 else FilmWorkType.TV_SERIES,
+                rating=i,
+            )
+            for i in range(ROWS)
+        )
+        cls.film_works.sort(key=lambda film_work: film_work.pk)
+        FilmWorksGenres.objects.bulk_create(
+            FilmWorksGenres(film_work=film_work, genre=(cls.drama, cls.comedy)[i % 2])
+            for i, film_work in enumerate(cls.film_works)
+        )
+
+        cls.film_work = cls.film_works[0]
+        FilmWorksGenres.objects.create(film_work=cls.film_work, genre=cls.horror)
+        cls.director = Person.objects.create(full_name="Режиссёр")
+        cls.actors = Person.objects.bulk_create(
+            Person(full_name=name) for name in ("Яков", "Алексей")
+        )
+        FilmWorksPersons.objects.bulk_create(
+            [
+                FilmWorksPersons(
+                    film_work=cls.film_work,
+                    person=cls.director,
+                    role=RolePerson.DIRECTOR,
+                ),
+                *(
+                    FilmWorksPersons(
+                        film_work=cls.film_work, person=actor, role=RolePerson.ACTOR
+                    )
+                    for actor in cls.actors
+                ),
+            ]
+        )
+
+    def setUp(self):
+        # Ответы хранятся в кэше Django, см. cache_page
+        cache.clear()
+
+    def get(self, url: str, params=None, status: int = 200) -> dict:
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status)
+        self.assertEqual(response["Content-Type"], "application/json")
+        return response.json()
+
+    def ids(self, params: dict) -> list:
+        data = self.get(reverse("api:film_works"), params)
+        return [UUID(row["id"]) for row in data["results"]]
+
+    def test_one_query_per_page(self):
+        url = reverse("api:film_works")
+        params = {"limit": LIMIT}
+        pages = []
+        while url is not None:
+            with self.assertNumQueries(1):
+                data = self.get(url, params)
+            pages.append([UUID(row["id"]) for row in data["results"]])
+            url, params = data["next"], None
+        self.assertEqual(
+            [len(page) for page in pages], [LIMIT, LIMIT, ROWS - 2 * LIMIT]
+        )
+        self.assertEqual(
+            [pk for page in pages for pk in page],
+            [film_work.pk for film_work in self.film_works],
+        )
+
+    def test_cursor(self):
+        data = self.get(reverse("api:film_works"), {"limit": LIMIT})
+        cursor = parse_qs(urlsplit(data["next"]).query)["cursor"][0]
+        last = UUID(bytes=urlsafe_base64_decode(cursor))
+        self.assertEqual(last, self.film_works[LIMIT - 1].pk)
+        self.assertEqual(UUID(data["results"][-1]["id"]), last)
+
+    def test_film_work(self):
+        url = reverse("api:film_works")
+        listed = self.get(url, {"limit": 1})["results"][0]
+        detail = self.get(reverse("api:film_work", args=(self.film_work.pk,)))
+        self.assertEqual(listed, detail)
+
+        self.assertEqual(detail["title"], self.film_work.title)
+        self.assertEqual(
+            [genre["title"] for genre in detail["genres"]], ["Драма", "Ужасы"]
+        )
+        persons = detail["persons"]
+        self.assertEqual(set(persons), set(RolePerson.values))
+        self.assertEqual(
+            persons[RolePerson.DIRECTOR],
+            [{"id": str(self.director.pk), "full_name": "Режиссёр"}],
+        )
+        self.assertEqual(
+            [person["full_name"] for person in persons[RolePerson.ACTOR]],
+            ["Алексей", "Яков"],
+        )
+        self.assertEqual(persons[RolePerson.WRITERS], [])
+
+    def test_film_work_not_found(self):
+        url = reverse("api:film_work", args=(self.drama.pk,))
+        self.assertIn("error", self.get(url, status=404))
+
+    def test_filters(self):
+        comedies = [film_work.pk for film_work in self.film_works[1::2]]
+        self.assertEqual(self.ids({"genre": [self.comedy.pk]}), comedies)
+        self.assertEqual(
+            self.ids({"genre": [self.comedy.pk, self.horror.pk]}),
+            [self.film_work.pk, *comedies],
+        )
+        self.assertEqual(
+            self.ids({"type": FilmWorkType.TV_SERIES}),
+            [
+                film_work.pk
+                for film_work in self.film_works
+                if film_work.type == FilmWorkType.TV_SERIES
+            ],
+        )
+        self.assertEqual(
+            self.ids({"rating_min": 3, "rating_max": 7.5}),
+            [
+                film_work.pk
+                for film_work in self.film_works
+                if 3 <= film_work.rating <= 7.5
+            ],
+        )
+
+    def test_bad_parameters(self):
+        url = reverse("api:film_works")
+        for params in (
+            {"limit": 0},
+            {"limit": 101},
+            {"limit": "десять"},
+            {"cursor": "!!!"},
+            {"cursor": "AAAA"},
+            {"genre": "драма"},
+            {"type": "cartoon"},
+            {"rating_min": "nan"},
+            {"rating_max": "высокий"},
+        ):
+            with self.subTest(params=params):
+                with self.assertNumQueries(0):
+                    data = self.get(url, params, status=400)
+                self.assertIn("error", data)
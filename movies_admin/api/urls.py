@@ -0,0 +1,9 @@
+from api import views
+from django.urls import path
+
+app_name = "api"
+
+urlpatterns = [
+    path("v1/film_works/", views.film_works, name="film_works"),
+    path("v1/film_works/<uuid:pk>/", views.film_work, name="film_work"),
+]
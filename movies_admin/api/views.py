@@ -0,0 +1,91 @@
+import json
+import math
+from typing import Optional
+from uuid import UUID
+
+from api import queries
+from django.http import HttpResponse, JsonResponse
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from django.views.decorators.cache import cache_page
+from django.views.decorators.http import require_GET
+from film_works.models import FilmWorkType
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+# Сколько секунд ответ хранится в кэше Django и у клиентов
+CACHE_SECONDS = 60
+
+CURSOR_VAR = "cursor"
+
+
+def _encode_cursor(pk: UUID) -> str:
+    return urlsafe_base64_encode(pk.bytes)
+
+
+def _decode_cursor(cursor: str) -> UUID:
+    return UUID(bytes=urlsafe_base64_decode(cursor))
+
+
+def _rating(request, name: str) -> Optional[float]:
+    value = request.GET.get(name)
+    if value is None:
+        return None
+    rating = float(value)
+    if not math.isfinite(rating):
+        raise ValueError(value)
+    return rating
+
+
+def _json(body: str) -> HttpResponse:
+    return HttpResponse(body, content_type="application/json")
+
+
+@require_GET
+@cache_page(CACHE_SECONDS)
+def film_works(request):
+    """
+    Кинокартины с жанрами и участниками по ролям, по возрастанию id.
+    Фильтры: genre (можно несколько, достаточно одного из них), type,
+    rating_min, rating_max. Размер страницы — limit, следующая страница
+    открывается ссылкой next.
+    """
+    try:
+        limit = int(request.GET.get("limit", PAGE_SIZE))
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(limit)
+        cursor = request.GET.get(CURSOR_VAR)
+        after = _decode_cursor(cursor) if cursor else None
+        genres = [UUID(genre) for genre in request.GET.getlist("genre")]
+        film_work_type = request.GET.get("type")
+        if film_work_type is not None and film_work_type not in FilmWorkType.values:
+            raise ValueError(film_work_type)
+        rating_min = _rating(request, "rating_min")
+        rating_max = _rating(request, "rating_max")
+    except ValueError as error:
+        return JsonResponse({"error": f"Invalid parameter: {error}"}, status=400)
+
+    results, last_id = queries.film_works_page(
+        limit,
+        after=after,
+        genres=genres,
+        film_work_type=film_work_type,
+        rating_min=rating_min,
+        rating_max=rating_max,
+    )
+    next_url = None
+    if last_id is not None:
+        params = request.GET.copy()
+        params[CURSOR_VAR] = _encode_cursor(last_id)
+        next_url = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+    # Массив кинокартин уже собран Postgres и вставляется без разбора
+    return _json(f'{{"next": {json.dumps(next_url)}, "results": {results}}}')
+
+
+@require_GET
+@cache_page(CACHE_SECONDS)
+def film_work(request, pk: UUID):
+    """ Одна кинокартина в том же виде, что и в списке """
+    body = queries.film_work(pk)
+    if body is None:
+        return JsonResponse({"error": "Not found"}, status=404)
+    return _json(body)
@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.prod")
+# Синхронный код под ASGI выполняется в потоках исполнителя, и постоянные
+# соединения в них не закрываются: по умолчанию соединения берутся из пула
+# config.db.pool. POSTGRES_POOL_SIZE=0 возвращает CONN_MAX_AGE.
+os.environ.setdefault("POSTGRES_POOL_SIZE", "10")
 
 application = get_asgi_application()
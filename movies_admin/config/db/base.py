@@ -0,0 +1,101 @@
+"""
+Бэкенд PostgreSQL с проверкой постоянных соединений и пулом.
+
+CONN_HEALTH_CHECKS: постоянное соединение (CONN_MAX_AGE > 0) в начале
+каждого запроса перед первым использованием проверяется SELECT 1,
+и разорванное сервером соединение открывается заново вместо ошибки.
+В Django 3.1 этой настройки ещё нет, поэтому она реализована здесь
+так же, как в Django 4.1.
+
+POOL: с SIZE > 0 соединения берутся из ограниченного пула
+config.db.pool и возвращаются в него вместо закрытия.
+
+Тестовая база получает схему из search_path, см. config.db.creation.
+"""
+
+from functools import partial
+
+from config.db.creation import DatabaseCreation
+from config.db.pool import ConnectionPool, get_pool
+from django.db.backends.postgresql import base
+from django.utils.asyncio import async_unsafe
+from psycopg2 import extensions
+
+
+def connect(alias: str, settings_dict: dict) -> extensions.connection:
+    """
+    Новое соединение для пула. Его открывает отдельная обёртка
+    по settings_dict, поэтому обёртки потоков, которые берут
+    соединения из пула, не меняются.
+    """
+    wrapper = base.DatabaseWrapper(settings_dict, alias)
+    return wrapper.get_new_connection(wrapper.get_connection_params())
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_enabled = self.settings_dict.get("CONN_HEALTH_CHECKS", False)
+        # Соединение уже проверено или только что открыто в этом запросе
+        self.health_check_done = False
+
+    @property
+    def pool(self):
+        pool = self.settings_dict.get("POOL") or {}
+        if not pool.get("SIZE"):
+            return None
+        return get_pool(
+            self.alias,
+            lambda: ConnectionPool(
+                partial(connect, self.alias, self.settings_dict),
+                size=pool["SIZE"],
+                timeout=pool.get("TIMEOUT", 10),
+                health_checks=self.health_check_enabled,
+            ),
+        )
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        connection = pool.acquire()
+        self.isolation_level = self.settings_dict["OPTIONS"].get(
+            "isolation_level", connection.isolation_level
+        )
+        return connection
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        # Соединение, закрытое внутри atomic, остаётся у обёртки
+        # до отката, поэтому в пул оно не возвращается
+        pool.release(self.connection, discard=self.in_atomic_block)
+
+    def connect(self):
+        super().connect()
+        # Соединения из пула проверяет сам пул
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def close_if_health_check_failed(self):
+        """ Закрывает соединение, если оно не отвечает """
+        if (
+            self.connection is None
+            or not self.health_check_enabled
+            or self.health_check_done
+        ):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
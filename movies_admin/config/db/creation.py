@@ -0,0 +1,35 @@
+import re
+from typing import Optional
+
+from django.db.backends.postgresql import creation
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    """
+    Тестовая база создаётся пустой, без схемы content из
+    schema_design/db.sql. Таблицы Django создаёт в первой схеме
+    search_path, поэтому она создаётся сразу после базы.
+    """
+
+    def _search_path_schema(self) -> Optional[str]:
+        options = self.connection.settings_dict["OPTIONS"].get("options", "")
+        match = re.search(r"search_path=([^,\s]+)", options)
+        return match.group(1) if match else None
+
+    def _create_test_db(self, verbosity, autoclobber, keepdb=False):
+        test_database_name = super()._create_test_db(verbosity, autoclobber, keepdb)
+        schema = self._search_path_schema()
+        if schema is None:
+            return test_database_name
+
+        # Отдельное соединение без пула: пул псевдонима открыт на основную базу
+        test_connection = self.connection.copy()
+        test_connection.settings_dict.update(NAME=test_database_name, POOL={})
+        try:
+            with test_connection.cursor() as cursor:
+                cursor.execute(
+                    f"CREATE SCHEMA IF NOT EXISTS {self._quote_name(schema)}"
+                )
+        finally:
+            test_connection.close()
+        return test_database_name
@@ -0,0 +1,177 @@
+"""
+Ограниченный пул соединений с Postgres, общий для всех потоков процесса.
+
+Django держит по соединению на поток. Под ASGI синхронный код
+выполняется в потоках исполнителя, и постоянные соединения
+(CONN_MAX_AGE > 0) остаются открытыми в потоках, которых уже нет.
+С пулом соединение в конце запроса возвращается в пул, а не
+закрывается, и открытых соединений не больше SIZE.
+Поток, которому не хватило соединения, ждёт не дольше TIMEOUT секунд:
+время ожидания и насыщение пула видны в stats().
+"""
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, List
+
+import psycopg2
+from psycopg2 import extensions
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool:
+    """
+    Не больше size соединений: свободные хранятся и выдаются
+    последним вернувшимся первым, чтобы лишние дольше простаивали.
+    С health_checks=True соединение из пула перед выдачей
+    проверяется запросом SELECT 1.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], extensions.connection],
+        size: int,
+        timeout: float,
+        health_checks: bool = False,
+    ) -> None:
+        self.connect = connect
+        self.size = size
+        self.timeout = timeout
+        self.health_checks = health_checks
+        self._idle: List[extensions.connection] = []
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.acquired = 0
+        # Сколько раз пришлось ждать, пока освободится соединение
+        self.waited = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+        self.discarded = 0
+
+    def _usable(self, connection: extensions.connection) -> bool:
+        if connection.closed:
+            return False
+        if not self.health_checks:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            if not connection.autocommit:
+                connection.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def acquire(self) -> extensions.connection:
+        started = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self.timeouts += 1
+                raise psycopg2.OperationalError(
+                    f"connection pool exhausted: {self.size} connections "
+                    f"are in use for more than {self.timeout} s"
+                )
+            waited = time.monotonic() - started
+            with self._lock:
+                self.waited += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            logger.debug("Waited %.3f s for a pooled connection", waited)
+
+        with self._lock:
+            self.acquired += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+        try:
+            while True:
+                with self._lock:
+                    connection = self._idle.pop() if self._idle else None
+                if connection is None:
+                    return self.connect()
+                if self._usable(connection):
+                    return connection
+                self._discard(connection)
+        except BaseException:
+            self._free_slot()
+            raise
+
+    def release(self, connection: extensions.connection, discard: bool = False):
+        """
+        Возвращает соединение в пул. Незавершённая транзакция
+        откатывается; сломанное соединение закрывается.
+        """
+        try:
+            status = connection.get_transaction_status()
+            if status in (
+                extensions.TRANSACTION_STATUS_INTRANS,
+                extensions.TRANSACTION_STATUS_INERROR,
+            ):
+                connection.rollback()
+                status = connection.get_transaction_status()
+            discard = discard or status != extensions.TRANSACTION_STATUS_IDLE
+        except psycopg2.Error:
+            discard = True
+
+        if discard:
+            self._discard(connection)
+        else:
+            with self._lock:
+                self._idle.append(connection)
+        self._free_slot()
+
+    def _discard(self, connection: extensions.connection) -> None:
+        with self._lock:
+            self.discarded += 1
+        try:
+            connection.close()
+        except psycopg2.Error:
+            pass
+
+    def _free_slot(self) -> None:
+        with self._lock:
+            self.in_use -= 1
+        self._slots.release()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "size": self.size,
+                "in_use": self.in_use,
+                "idle": len(self._idle),
+                "peak_in_use": self.peak_in_use,
+                "saturation": self.in_use / self.size,
+                "acquired": self.acquired,
+                "waited": self.waited,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+                "timeouts": self.timeouts,
+                "discarded": self.discarded,
+            }
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias: str, factory: Callable[[], ConnectionPool]) -> ConnectionPool:
+    """ Пул базы alias, созданный factory() при первом обращении """
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None:
+            pool = _pools[alias] = factory()
+        return pool
+
+
+def stats() -> Dict[str, Dict[str, float]]:
+    """ Метрики пулов процесса по псевдонимам баз """
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.stats() for alias, pool in pools.items()}
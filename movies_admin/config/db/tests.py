@@ -0,0 +1,183 @@
+import threading
+import time
+from unittest import mock
+
+import psycopg2
+from config.db import pool
+from config.db.base import DatabaseWrapper, connect
+from django.db import DEFAULT_DB_ALIAS, Error, connection
+from django.test import TestCase
+from psycopg2 import extensions
+
+
+def _pid(conn: extensions.connection) -> int:
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_backend_pid()")
+        return cursor.fetchone()[0]
+
+
+def _terminate(pid: int) -> None:
+    """ Разрывает соединение со стороны сервера, как при его перезапуске """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_terminate_backend(%s)", [pid])
+
+
+class ConnectionPoolTest(TestCase):
+    """
+    Пул выдаёт не больше size соединений, последнее вернувшееся первым,
+    и проверяет их перед выдачей; не дождавшийся соединения поток
+    получает OperationalError.
+    """
+
+    def make_pool(self, size: int = 2, **kwargs) -> pool.ConnectionPool:
+        connections = []
+
+        def factory():
+            conn = connect(DEFAULT_DB_ALIAS, connection.settings_dict)
+            connections.append(conn)
+            return conn
+
+        self.addCleanup(lambda: [conn.close() for conn in connections])
+        return pool.ConnectionPool(factory, size=size, timeout=0.1, **kwargs)
+
+    def test_acquire_and_release(self):
+        conns = self.make_pool()
+        first = conns.acquire()
+        self.assertEqual(conns.stats()["in_use"], 1)
+        conns.release(first)
+        stats = conns.stats()
+        self.assertEqual((stats["in_use"], stats["idle"]), (0, 1))
+        self.assertIs(conns.acquire(), first)
+        self.assertEqual(conns.stats()["acquired"], 2)
+
+    def test_last_released_is_reused_first(self):
+        conns = self.make_pool()
+        first, second = conns.acquire(), conns.acquire()
+        conns.release(first)
+        conns.release(second)
+        self.assertIs(conns.acquire(), second)
+        self.assertIs(conns.acquire(), first)
+
+    def test_release_rolls_back(self):
+        conns = self.make_pool()
+        conn = conns.acquire()
+        _pid(conn)
+        self.assertEqual(
+            conn.get_transaction_status(), extensions.TRANSACTION_STATUS_INTRANS
+        )
+        conns.release(conn)
+        self.assertEqual(
+            conn.get_transaction_status(), extensions.TRANSACTION_STATUS_IDLE
+        )
+        self.assertIs(conns.acquire(), conn)
+
+    def test_release_discard(self):
+        conns = self.make_pool()
+        conn = conns.acquire()
+        conns.release(conn, discard=True)
+        self.assertTrue(conn.closed)
+        self.assertEqual(conns.stats()["discarded"], 1)
+        self.assertIsNot(conns.acquire(), conn)
+
+    def test_timeout(self):
+        conns = self.make_pool(size=1)
+        conn = conns.acquire()
+        with self.assertRaises(psycopg2.OperationalError):
+            conns.acquire()
+        stats = conns.stats()
+        self.assertEqual((stats["timeouts"], stats["in_use"]), (1, 1))
+        conns.release(conn)
+        self.assertIs(conns.acquire(), conn)
+
+    def test_wait(self):
+        conns = self.make_pool(size=1)
+        conn = conns.acquire()
+        timer = threading.Timer(0.05, conns.release, [conn])
+        timer.start()
+        self.addCleanup(timer.join)
+        started = time.monotonic()
+        self.assertIs(conns.acquire(), conn)
+        self.assertGreaterEqual(time.monotonic() - started, 0.04)
+        stats = conns.stats()
+        self.assertEqual((stats["waited"], stats["timeouts"]), (1, 0))
+
+    def test_health_check_replaces_broken(self):
+        conns = self.make_pool(health_checks=True)
+        conn = conns.acquire()
+        pid = _pid(conn)
+        conns.release(conn)
+        _terminate(pid)
+
+        fresh = conns.acquire()
+        self.assertIsNot(fresh, conn)
+        self.assertNotEqual(_pid(fresh), pid)
+        self.assertEqual(conns.stats()["discarded"], 1)
+
+
+class DatabaseWrapperTest(TestCase):
+    """
+    Обёртка проверяет постоянное соединение перед первым запросом
+    и берёт соединения из пула, не меняя другие обёртки.
+    """
+
+    def setUp(self):
+        patcher = mock.patch.dict(pool._pools, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.close_pools)
+
+    def close_pools(self) -> None:
+        for conns in pool._pools.values():
+            for conn in conns._idle:
+                conn.close()
+
+    def make_wrapper(self, **settings) -> DatabaseWrapper:
+        settings_dict = {**connection.settings_dict, "POOL": {}, **settings}
+        wrapper = DatabaseWrapper(settings_dict, DEFAULT_DB_ALIAS)
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def reconnects(self, wrapper: DatabaseWrapper) -> bool:
+        """ Переживёт ли следующий запрос разрыв соединения сервером """
+        wrapper.ensure_connection()
+        pid = _pid(wrapper.connection)
+        # Начало следующего запроса, как по сигналу request_started
+        wrapper.close_if_unusable_or_obsolete()
+        _terminate(pid)
+        try:
+            with wrapper.cursor() as cursor:
+                cursor.execute("SELECT pg_backend_pid()")
+                return cursor.fetchone()[0] != pid
+        except Error:
+            return False
+
+    def test_health_check_reconnects(self):
+        wrapper = self.make_wrapper(CONN_HEALTH_CHECKS=True)
+        self.assertTrue(self.reconnects(wrapper))
+
+    def test_without_health_check(self):
+        wrapper = self.make_wrapper(CONN_HEALTH_CHECKS=False)
+        self.assertFalse(self.reconnects(wrapper))
+
+    def test_pooled_connection_is_reused(self):
+        first = self.make_wrapper(POOL={"SIZE": 1, "TIMEOUT": 0.1})
+        second = self.make_wrapper(POOL={"SIZE": 1, "TIMEOUT": 0.1})
+        first.ensure_connection()
+        conn = first.connection
+        first.close()
+        self.assertIsNone(first.connection)
+        self.assertFalse(conn.closed)
+
+        second.ensure_connection()
+        self.assertIs(second.connection, conn)
+        self.assertEqual(pool.stats()[DEFAULT_DB_ALIAS]["in_use"], 1)
+
+    def test_pool_does_not_touch_other_wrappers(self):
+        first = self.make_wrapper(POOL={"SIZE": 2, "TIMEOUT": 0.1})
+        second = self.make_wrapper(POOL={"SIZE": 2, "TIMEOUT": 0.1})
+        first.ensure_connection()
+        first.isolation_level = mock.sentinel.isolation_level
+        # Пул, созданный первой обёрткой, открывает соединение второй
+        second.ensure_connection()
+        self.assertIsNot(second.connection, first.connection)
+        self.assertIs(first.isolation_level, mock.sentinel.isolation_level)
@@ -10,4 +10,9 @@ env = environ.Env(
     POSTGRES_USER=(str, "postgres"),
     POSTGRES_PASSWORD=(str, "postgres"),
     POSTGRES_OPTIONS=(dict, {"options": "-c search_path=content"}),
+    POSTGRES_CONN_MAX_AGE=(int, 60),
+    POSTGRES_CONN_HEALTH_CHECKS=(bool, True),
+    POSTGRES_POOL_SIZE=(int, 0),
+    POSTGRES_POOL_TIMEOUT=(float, 10.0),
+    CACHE_URL=(str, "locmemcache://movies_admin?timeout=300&max_entries=10000"),
 )
@@ -40,10 +40,11 @@ DJANGO_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
 ]
 
 THIRD_PARTY_APPS = ["django_extensions"]
-LOCAL_APPS = ["film_works.apps.FilmWorksConfig"]
+LOCAL_APPS = ["film_works.apps.FilmWorksConfig", "api.apps.ApiConfig"]
 
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
@@ -81,19 +82,42 @@ WSGI_APPLICATION = "config.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
+# ENGINE config.db — бэкенд postgresql с проверкой соединений
+# (CONN_HEALTH_CHECKS) и пулом (POOL). С пулом соединение в конце
+# запроса возвращается в него, поэтому CONN_MAX_AGE не нужен.
+# В тестовой базе он создаёт схему из search_path.
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql_psycopg2",
+        "ENGINE": "config.db",
         "OPTIONS": env("POSTGRES_OPTIONS"),
         "NAME": env("POSTGRES_DB"),
         "HOST": env("POSTGRES_HOST"),
         "PORT": env("POSTGRES_PORT"),
         "USER": env("POSTGRES_USER"),
         "PASSWORD": env("POSTGRES_PASSWORD"),
+        "CONN_MAX_AGE": (
+            0 if env("POSTGRES_POOL_SIZE") else env("POSTGRES_CONN_MAX_AGE")
+        ),
+        "CONN_HEALTH_CHECKS": env("POSTGRES_CONN_HEALTH_CHECKS"),
+        "POOL": {
+            "SIZE": env("POSTGRES_POOL_SIZE"),
+            "TIMEOUT": env("POSTGRES_POOL_TIMEOUT"),
+        },
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# CACHE_URL: locmemcache://name (по умолчанию), filecache:///path
+# или rediscache://host:port/db (нужен пакет django-redis).
+# timeout — время жизни записей в секундах, max_entries — предел
+# их числа, после которого вытесняются давно не читавшиеся.
+
+CACHES = {"default": env.cache("CACHE_URL")}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
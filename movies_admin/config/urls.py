@@ -13,7 +13,14 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+
 from django.contrib import admin
-from django.urls import path
+from django.urls import include, path
+from film_works.views import cache_stats, db_pool_stats
 
-urlpatterns = [path("admin/", admin.site.urls)]
+urlpatterns = [
+    path("admin/cache-stats/", cache_stats, name="cache_stats"),
+    path("admin/db-pool-stats/", db_pool_stats, name="db_pool_stats"),
+    path("admin/", admin.site.urls),
+    path("api/", include("api.urls")),
+]
@@ -1,48 +1,265 @@
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.contrib.postgres.aggregates import ArrayAgg, StringAgg
+from django.contrib.postgres.fields import ArrayField
+from django.db.models import Count, IntegerField, OuterRef, Subquery, TextField
+from django.db.models.functions import Coalesce
+from django.forms.models import BaseInlineFormSet
 from django.utils.translation import gettext_lazy as _
 from film_works import models
+from film_works.cache import CachedAutocompleteAdminMixin, CachedRelatedFieldListFilter
+from film_works.pagination import KeysetPaginationAdminMixin
+from film_works.search import FullTextSearchAdminMixin, TrigramAutocompleteAdminMixin
+
+
+def _count(model, key: str, **filters):
+    """
+    Количество связанных строк подзапросом. В отличие от Count через JOIN,
+    внешний запрос не размножает строки и не требует GROUP BY.
+    """
+    rows = (
+        model.objects.filter(**{key: OuterRef("pk")}, **filters)
+        .order_by()
+        .values(key)
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    return Coalesce(Subquery(rows, output_field=IntegerField()), 0)
+
+
+def _aggregate(model, key: str, aggregate, output_field, **filters):
+    """ Значения связанных строк, собранные array_agg или string_agg """
+    rows = (
+        model.objects.filter(**{key: OuterRef("pk")}, **filters)
+        .order_by()
+        .values(key)
+        .annotate(value=aggregate)
+        .values("value")
+    )
+    return Subquery(rows, output_field=output_field)
+
+
+def _cached(choices):
+    """
+    Варианты выбора, которые запрашиваются при первой отрисовке списка
+    и затем общие для всех строк формы.
+    """
+    cache = []
+
+    def get_choices():
+        if not cache:
+            cache.extend(choices)
+        return cache
+
+    return get_choices
+
+
+class PrefetchedAutocompleteSelect(AutocompleteSelect):
+    """
+    Автодополнение, которое берёт подпись выбранного значения из уже
+    загруженного объекта, а не отдельным запросом на каждую строку.
+    """
+
+    selected = None
+
+    def optgroups(self, name, value, attr=None):
+        selected = self.selected
+        if selected is None or [str(v) for v in value] != [str(selected.pk)]:
+            return super().optgroups(name, value, attr)
+
+        default = (None, [], 0)
+        if not self.is_required:
+            default[1].append(self.create_option(name, "", "", False, 0))
+        label = self.choices.field.label_from_instance(selected)
+        default[1].append(
+            self.create_option(
+                name, selected.pk, label, {str(selected.pk)}, len(default[1])
+            )
+        )
+        return [default]
+
+
+class PrefetchedInlineFormSet(BaseInlineFormSet):
+    """ Передаёт виджетам автодополнения связанные объекты строки """
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        if form.instance.pk is None:
+            return form
+        for name, field in form.fields.items():
+            widget = getattr(field.widget, "widget", field.widget)
+            if isinstance(widget, PrefetchedAutocompleteSelect):
+                widget.selected = getattr(form.instance, name)
+        return form
+
+
+class PrefetchedInline(admin.TabularInline):
+    """
+    Строки встроенной формы не делают своих запросов: связанные объекты
+    автодополнения загружаются вместе со строками, а варианты обычных
+    списков выбора — один раз на всю форму.
+    """
+
+    extra = 0
+    formset = PrefetchedInlineFormSet
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        autocomplete_fields = self.get_autocomplete_fields(request)
+        if autocomplete_fields:
+            queryset = queryset.select_related(*autocomplete_fields)
+        return queryset
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.get_autocomplete_fields(request):
+            kwargs["widget"] = PrefetchedAutocompleteSelect(
+                db_field.remote_field, self.admin_site, using=kwargs.get("using")
+            )
+            return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+        formfield = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if formfield is not None:
+            formfield.choices = _cached(formfield.choices)
+        return formfield
 
 
 @admin.register(models.Genre)
-class GenresAdmin(admin.ModelAdmin):
+class GenresAdmin(CachedAutocompleteAdminMixin, admin.ModelAdmin):
     search_fields = ("title",)
+    list_display = ("title", "film_works_count")
+
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(film_works_count=_count(models.FilmWorksGenres, "genre"))
+        )
+
+    def film_works_count(self, instance):
+        return instance.film_works_count
+
+    film_works_count.short_description = _("Кинокартин")
 
 
-class FilmWorksGenresInline(admin.TabularInline):
+class FilmWorksGenresInline(PrefetchedInline):
     model = models.FilmWorksGenres
-    extra = 0
 
 
-class FilmWorksPersonsInline(admin.TabularInline):
+class FilmWorksPersonsInline(PrefetchedInline):
     model = models.FilmWorksPersons
-    extra = 0
     autocomplete_fields = ("person",)
 
 
 @admin.register(models.FilmWork)
-class FilmWorkAdmin(admin.ModelAdmin):
+class FilmWorkAdmin(
+    FullTextSearchAdminMixin,
+    TrigramAutocompleteAdminMixin,
+    KeysetPaginationAdminMixin,
+    admin.ModelAdmin,
+):
     search_fields = ("title",)
-    list_filter = ("type",)
+    trigram_field = "title"
+    search_vectors = (("search_vector", models.FILM_WORK_SEARCH_CONFIG),)
+    list_filter = ("type", ("genres", CachedRelatedFieldListFilter))
+    list_display = ("title", "type", "rating", "genre_names", "directors", "actors")
     inlines = (FilmWorksPersonsInline, FilmWorksGenresInline)
 
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                genre_names=_aggregate(
+                    models.FilmWorksGenres,
+                    "film_work",
+                    StringAgg("genre__title", ", ", ordering="genre__title"),
+                    TextField(),
+                ),
+                directors=_aggregate(
+                    models.FilmWorksPersons,
+                    "film_work",
+                    StringAgg("person__full_name", ", ", ordering="person__full_name"),
+                    TextField(),
+                    role=models.RolePerson.DIRECTOR,
+                ),
+                actors=_count(
+                    models.FilmWorksPersons,
+                    "film_work",
+                    role=models.RolePerson.ACTOR,
+                ),
+            )
+        )
+
+    def genre_names(self, instance):
+        return instance.genre_names
+
+    def directors(self, instance):
+        return instance.directors
 
-class FilmWorkInline(admin.TabularInline):
+    def actors(self, instance):
+        return instance.actors
+
+    genre_names.short_description = _("Жанры")
+    directors.short_description = _("Режиссеры")
+    actors.short_description = _("Актеров")
+
+
+class FilmWorkInline(PrefetchedInline):
     model = models.FilmWorksPersons
-    extra = 0
     autocomplete_fields = ("film_work",)
 
 
 @admin.register(models.Person)
-class PersonsAdmin(admin.ModelAdmin):
+class PersonsAdmin(
+    FullTextSearchAdminMixin,
+    TrigramAutocompleteAdminMixin,
+    KeysetPaginationAdminMixin,
+    admin.ModelAdmin,
+):
     search_fields = ("full_name",)
+    trigram_field = "full_name"
+    search_vectors = (("search_vector", models.PERSON_SEARCH_CONFIG),)
+    list_display = ("full_name", "roles", "film_works_count")
     inlines = (FilmWorkInline,)
 
+    def get_queryset(self, request):
+        return (
+            super()
+            .get_queryset(request)
+            .annotate(
+                role_values=_aggregate(
+                    models.FilmWorksPersons,
+                    "person",
+                    ArrayAgg("role", distinct=True, ordering="role"),
+                    ArrayField(TextField()),
+                ),
+                film_works_count=_count(models.FilmWorksPersons, "person"),
+            )
+        )
+
+    def roles(self, instance):
+        return ", ".join(
+            str(models.RolePerson(role).label) for role in instance.role_values or ()
+        )
+
+    def film_works_count(self, instance):
+        return instance.film_works_count
+
+    roles.short_description = _("Роли")
+    film_works_count.short_description = _("Кинокартин")
+
 
 @admin.register(models.FilmWorksPersons)
-class FilmWorksPersonsAdmin(admin.ModelAdmin):
+class FilmWorksPersonsAdmin(
+    FullTextSearchAdminMixin, KeysetPaginationAdminMixin, admin.ModelAdmin
+):
     list_display = ("id", "film_work", "person")
     list_display_links = ("id",)
     search_fields = ("film_work__title", "person__full_name")
+    search_vectors = (
+        ("film_work__search_vector", models.FILM_WORK_SEARCH_CONFIG),
+        ("person__search_vector", models.PERSON_SEARCH_CONFIG),
+    )
     list_filter = ("role",)
 
     def get_queryset(self, request):
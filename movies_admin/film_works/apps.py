@@ -1,5 +1,16 @@
 from django.apps import AppConfig
+from django.db.models import CharField, TextField
 
 
 class FilmWorksConfig(AppConfig):
     name = "film_works"
+
+    def ready(self):
+        from film_works import cache, models
+        from film_works.search import TrigramWordSimilar
+
+        CharField.register_lookup(TrigramWordSimilar)
+        TextField.register_lookup(TrigramWordSimilar)
+        # Кэшируются только строки этих моделей: изменения связей
+        # кинокартин с лицами и жанрами записи кэша не затрагивают
+        cache.connect(models.Genre, models.Person, models.FilmWork)
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import time
+from typing import Callable, Dict, Sequence, TypeVar
+
+from django.contrib.admin import RelatedFieldListFilter
+from django.contrib.admin.views.autocomplete import AutocompleteJsonView
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.http import JsonResponse
+
+T = TypeVar("T")
+
+PREFIX = "film_works"
+# Что кэшируется: страницы автодополнения и варианты фильтров списков
+AUTOCOMPLETE = "autocomplete"
+FILTER_CHOICES = "filter_choices"
+NAMESPACES = (AUTOCOMPLETE, FILTER_CHOICES)
+
+
+def _version_key(model) -> str:
+    return f"{PREFIX}:version:{model._meta.label_lower}"
+
+
+def _version(model) -> int:
+    """
+    Версия данных модели, которая входит в ключи её записей в кэше.
+    Новая версия — текущее время в наносекундах, а не счётчик: если
+    версию вытеснит из кэша, старые записи всё равно не станут видны.
+    """
+    key = _version_key(model)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate(sender, **kwargs) -> None:
+    """ Приёмник post_save и post_delete: сбрасывает записи модели sender """
+    cache.set(_version_key(sender), time.time_ns(), None)
+
+
+def connect(*models) -> None:
+    """ Сбрасывает записи моделей при их сохранении и удалении через Django """
+    for model in models:
+        uid = f"{PREFIX}:{model._meta.label_lower}"
+        post_save.connect(invalidate, sender=model, dispatch_uid=uid)
+        post_delete.connect(invalidate, sender=model, dispatch_uid=uid)
+
+
+def _record(namespace: str, outcome: str) -> None:
+    key = f"{PREFIX}:stats:{namespace}:{outcome}"
+    if cache.add(key, 1, None):
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Счётчик вытеснили между add и incr
+        cache.add(key, 1, None)
+
+
+def cached(namespace: str, model, parts: Sequence, compute: Callable[[], T]) -> T:
+    """
+    Значение из кэша или результат compute(), который кладётся в кэш
+    на время TIMEOUT из CACHE_URL. Запись зависит только от строк model:
+    их изменение через Django сбрасывает её сразу, а изменение в обход
+    Django (перенос из SQLite) становится видно по истечении TIMEOUT.
+    """
+    digest = hashlib.md5(json.dumps(parts, default=str).encode()).hexdigest()
+    key = ":".join(
+        (PREFIX, namespace, model._meta.label_lower, str(_version(model)), digest)
+    )
+    value = cache.get(key)
+    if value is not None:
+        _record(namespace, "hits")
+        return value
+    _record(namespace, "misses")
+    value = compute()
+    cache.set(key, value)
+    return value
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    """ Попадания и промахи кэша по видам записей """
+    keys = [
+        f"{PREFIX}:stats:{namespace}:{outcome}"
+        for namespace in NAMESPACES
+        for outcome in ("hits", "misses")
+    ]
+    values = cache.get_many(keys)
+    return {
+        namespace: {
+            outcome: values.get(f"{PREFIX}:stats:{namespace}:{outcome}", 0)
+            for outcome in ("hits", "misses")
+        }
+        for namespace in NAMESPACES
+    }
+
+
+class CachedRelatedFieldListFilter(RelatedFieldListFilter):
+    """ Фильтр по связанной модели, варианты которого берутся из кэша """
+
+    def field_choices(self, field, request, model_admin):
+        return cached(
+            FILTER_CHOICES,
+            field.related_model,
+            (model_admin.model._meta.label_lower, self.field_path),
+            lambda: super(CachedRelatedFieldListFilter, self).field_choices(
+                field, request, model_admin
+            ),
+        )
+
+
+class CachedAutocompleteJsonView(AutocompleteJsonView):
+    """
+    Автодополнение, которое отдаёт страницы результатов из кэша.
+    Права пользователя проверяются на каждый запрос. Кроме results
+    и pagination get_page_data может положить в запись служебные
+    ключи: page_served получает их и при попадании в кэш.
+    """
+
+    def get(self, request, *args, **kwargs):
+        allowed = self.model_admin.get_search_fields(request) and self.has_perm(request)
+        if not allowed:
+            return super().get(request, *args, **kwargs)
+
+        self.paginator_class = self.model_admin.paginator
+        self.term = request.GET.get("term", "")
+        parts = (self.term, request.GET.get(self.page_kwarg, ""))
+        data = cached(AUTOCOMPLETE, self.model_admin.model, parts, self.get_page_data)
+        self.page_served(data)
+        return JsonResponse(
+            {"results": data["results"], "pagination": data["pagination"]}
+        )
+
+    def get_page_data(self) -> dict:
+        self.object_list = self.get_queryset()
+        context = self.get_context_data()
+        return {
+            "results": [
+                {"id": str(obj.pk), "text": str(obj)} for obj in context["object_list"]
+            ],
+            "pagination": {"more": context["page_obj"].has_next()},
+        }
+
+    def page_served(self, data: dict) -> None:
+        """ Страница data отдаётся пользователю: из кэша или только что собрана """
+
+
+class CachedAutocompleteAdminMixin:
+    """ Подключает кэш к автодополнению ModelAdmin """
+
+    def autocomplete_view(self, request):
+        return CachedAutocompleteJsonView.as_view(model_admin=self)(request)
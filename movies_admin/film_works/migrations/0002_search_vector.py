@@ -0,0 +1,82 @@
+# Generated by Django 3.1.14 on 2026-10-18 02:07
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# search_vector заполняется триггером: так его получают и строки,
+# которые пишет перенос из SQLite мимо Django
+SEARCH_VECTOR_SQL = """
+    CREATE FUNCTION film_work_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER film_work_search_vector
+        BEFORE INSERT OR UPDATE OF title, description ON film_work
+        FOR EACH ROW EXECUTE PROCEDURE film_work_search_vector();
+
+    CREATE FUNCTION persons_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := to_tsvector('simple', coalesce(NEW.full_name, ''));
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER persons_search_vector
+        BEFORE INSERT OR UPDATE OF full_name ON persons
+        FOR EACH ROW EXECUTE PROCEDURE persons_search_vector();
+
+    UPDATE film_work SET search_vector =
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B');
+    UPDATE persons SET search_vector = to_tsvector('simple', coalesce(full_name, ''));
+"""
+
+DROP_SEARCH_VECTOR_SQL = """
+    DROP TRIGGER film_work_search_vector ON film_work;
+    DROP FUNCTION film_work_search_vector();
+    DROP TRIGGER persons_search_vector ON persons;
+    DROP FUNCTION persons_search_vector();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("film_works", "0001_initial")]
+
+    operations = [
+        migrations.AddField(
+            model_name="filmwork",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="person",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunSQL(SEARCH_VECTOR_SQL, DROP_SEARCH_VECTOR_SQL),
+        # Индексы строятся после заполнения: так быстрее, чем обновлять их
+        # на каждую строку
+        migrations.AddIndex(
+            model_name="filmwork",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="film_work_search_vector"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="person",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="persons_search_vector"
+            ),
+        ),
+    ]
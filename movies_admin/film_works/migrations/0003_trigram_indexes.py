@@ -0,0 +1,31 @@
+# Generated by Django 3.1.14 on 2026-10-18 02:10
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("film_works", "0002_search_vector")]
+
+    operations = [
+        # Класс операторов gin_trgm_ops даёт расширение pg_trgm
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name="filmwork",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["title"],
+                name="film_work_title_trgm",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="person",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["full_name"],
+                name="persons_full_name_trgm",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+    ]
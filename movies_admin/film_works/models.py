@@ -1,10 +1,18 @@
 from uuid import uuid4
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.db.models import UniqueConstraint
 from django.utils.translation import gettext_lazy as _
 from django_extensions.db.models import TimeStampedModel
 
+# Конфигурации полнотекстового поиска: названия и описания фильмов
+# со стеммингом, имена лиц как есть. Те же конфигурации использует
+# триггер, который заполняет search_vector (миграция 0002).
+FILM_WORK_SEARCH_CONFIG = "english"
+PERSON_SEARCH_CONFIG = "simple"
+
 
 class Genre(TimeStampedModel):
     """ Модель для хранения жанров. """
@@ -32,10 +40,19 @@ class Person(TimeStampedModel):
     id = models.UUIDField(primary_key=True, blank=True, default=uuid4, editable=False)
     full_name = models.CharField(_("имя"), db_index=True, max_length=255)
     birth_date = models.DateField(blank=True, null=True)
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         ordering = ("id",)
         db_table = "persons"
+        indexes = [
+            GinIndex(fields=["search_vector"], name="persons_search_vector"),
+            GinIndex(
+                fields=["full_name"],
+                name="persons_full_name_trgm",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
         verbose_name = _("Участник кинокартины")
         verbose_name_plural = _("Участники кинокартины")
 
@@ -57,10 +74,19 @@ class FilmWork(TimeStampedModel):
     )
     persons = models.ManyToManyField(Person, through="FilmWorksPersons")
     genres = models.ManyToManyField(Genre, through="FilmWorksGenres")
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         ordering = ("id",)
         db_table = "film_work"
+        indexes = [
+            GinIndex(fields=["search_vector"], name="film_work_search_vector"),
+            GinIndex(
+                fields=["title"],
+                name="film_work_title_trgm",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
         verbose_name = _("Кинокартина")
         verbose_name_plural = _("Кинокартина")
 
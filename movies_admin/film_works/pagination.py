@@ -0,0 +1,316 @@
+import hashlib
+import json
+from typing import List, Optional, Tuple
+
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Field, Q
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from film_works.cache import CachedAutocompleteJsonView
+
+# Параметр списка, по которому считается точное количество строк
+EXACT_COUNT_VAR = "exact_count"
+# Параметры списка с ключом последней или первой строки соседней страницы
+AFTER_VAR = "after"
+BEFORE_VAR = "before"
+
+# Поле сортировки: (имя, по убыванию, поле модели)
+SortKey = Tuple[str, bool, Field]
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор без точного COUNT(*) на больших таблицах.
+    Для списка без фильтров количество берётся из оценки планировщика
+    pg_class.reltuples, если она не меньше estimate_threshold,
+    иначе таблица считается точно. Отфильтрованный список считается
+    не дальше count_cap строк: count_cap должен быть больше
+    list_max_show_all, иначе список покажется целиком.
+    С exact=True считается точно.
+    """
+
+    estimate_threshold = 100_000
+    count_cap = 10_000
+
+    def __init__(self, *args, exact: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.exact = exact
+        # Количество — оценка или нижняя граница, а не точное значение
+        self.estimated = False
+
+    def _estimate(self):
+        queryset = self.object_list
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else 0
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if self.exact:
+            return queryset.count()
+
+        if not queryset.query.where:
+            estimate = self._estimate()
+            if estimate >= self.estimate_threshold:
+                self.estimated = True
+                return estimate
+            return queryset.count()
+
+        count = queryset.order_by()[: self.count_cap + 1].count()
+        if count > self.count_cap:
+            self.estimated = True
+            return self.count_cap
+        return count
+
+
+class EstimatedCountChangeList(ChangeList):
+    """
+    Список, в котором общее количество строк без фильтров
+    считается только по запросу: с параметром exact_count.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.exact_count = EXACT_COUNT_VAR in request.GET
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(EXACT_COUNT_VAR, None)
+        return lookup_params
+
+    def get_results(self, request):
+        super().get_results(request)
+        if self.exact_count:
+            self.show_full_result_count = True
+            self.full_result_count = self.root_queryset.count()
+
+    @property
+    def exact_count_url(self):
+        return self.get_query_string({EXACT_COUNT_VAR: 1})
+
+
+class EstimatedCountAdminMixin:
+    """ Подключает оценку количества строк к ModelAdmin """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return EstimatedCountChangeList
+
+    def get_paginator(self, request, queryset, per_page, *args, **kwargs):
+        return self.paginator(
+            queryset, per_page, *args, exact=EXACT_COUNT_VAR in request.GET, **kwargs
+        )
+
+
+def _seek(keys: List[SortKey], values: list, forward: bool) -> Q:
+    """
+    Условие для строк после values (или до них при forward=False)
+    в порядке keys: (k1 > v1) OR (k1 = v1 AND (k2 > v2 OR ...)).
+    """
+    condition = None
+    for (name, descending, _), value in reversed(list(zip(keys, values))):
+        lookup = "gt" if descending != forward else "lt"
+        step = Q(**{f"{name}__{lookup}": value})
+        if condition is not None:
+            step |= Q(**{name: value}) & condition
+        condition = step
+    return condition
+
+
+def _encode_cursor(keys: List[SortKey], obj) -> str:
+    values = [field.value_to_string(obj) for _, _, field in keys]
+    return urlsafe_base64_encode(json.dumps(values).encode())
+
+
+def _decode_cursor(keys: List[SortKey], cursor: str) -> list:
+    try:
+        values = json.loads(urlsafe_base64_decode(cursor))
+        if len(values) != len(keys):
+            raise ValueError(cursor)
+        return [field.to_python(value) for (_, _, field), value in zip(keys, values)]
+    except (ValueError, TypeError, ValidationError) as error:
+        raise IncorrectLookupParameters(error)
+
+
+class KeysetChangeList(EstimatedCountChangeList):
+    """
+    Список, который листается по ключу сортировки последней показанной
+    строки, а не через OFFSET: любая страница стоит как первая,
+    а новые строки не сдвигают уже открытые страницы.
+    Ключом служат поля сортировки списка, дополненные pk. Если список
+    отсортирован по вычисляемой или nullable колонке, открыт номер
+    страницы (p) или список редактируемый, работают обычные страницы.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.after = request.GET.get(AFTER_VAR)
+        self.before = request.GET.get(BEFORE_VAR)
+        self.keyset = False
+        self.next_url = self.previous_url = self.first_url = None
+        super().__init__(request, *args, **kwargs)
+        # Ссылки сортировки и фильтров начинают список с первой страницы
+        self.params.pop(AFTER_VAR, None)
+        self.params.pop(BEFORE_VAR, None)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(AFTER_VAR, None)
+        lookup_params.pop(BEFORE_VAR, None)
+        return lookup_params
+
+    def _sort_keys(self) -> Optional[List[SortKey]]:
+        """ Поля сортировки списка или None, если по ним нельзя искать """
+        keys = []
+        for item in self.queryset.query.order_by:
+            if not isinstance(item, str):
+                return None
+            name = item.lstrip("-")
+            try:
+                field = (
+                    self.lookup_opts.pk
+                    if name == "pk"
+                    else self.lookup_opts.get_field(name)
+                )
+            except FieldDoesNotExist:
+                return None
+            if not field.concrete or field.null or field.is_relation:
+                return None
+            keys.append((name, item.startswith("-"), field))
+        return keys or None
+
+    def get_results(self, request):
+        super().get_results(request)
+        # Номер страницы смотрим в запросе, а не в page_num: в разных
+        # версиях Django page_num отсчитывается от 0 или от 1
+        numbered = PAGE_VAR in request.GET
+        if numbered or (self.show_all and self.can_show_all) or self.list_editable:
+            return
+        keys = self._sort_keys()
+        if keys is None:
+            return
+
+        forward = self.before is None
+        cursor = self.after if forward else self.before
+        queryset = self.queryset
+        if cursor:
+            queryset = queryset.filter(
+                _seek(keys, _decode_cursor(keys, cursor), forward)
+            )
+        if not forward:
+            queryset = queryset.reverse()
+
+        rows = list(queryset[: self.list_per_page + 1])
+        more = len(rows) > self.list_per_page
+        rows = rows[: self.list_per_page]
+        if not forward:
+            rows.reverse()
+
+        self.keyset = True
+        self.result_list = rows
+        has_next = more if forward else True
+        has_previous = bool(self.after) if forward else more
+        if rows and has_next:
+            self.next_url = self.get_query_string(
+                {AFTER_VAR: _encode_cursor(keys, rows[-1])}, [BEFORE_VAR]
+            )
+        if rows and has_previous:
+            self.previous_url = self.get_query_string(
+                {BEFORE_VAR: _encode_cursor(keys, rows[0])}, [AFTER_VAR]
+            )
+            self.first_url = self.get_query_string(remove=[AFTER_VAR, BEFORE_VAR])
+
+
+class KeysetPage:
+    """ Страница, найденная по ключу: без номера и общего количества """
+
+    def __init__(self, object_list: list, has_next: bool) -> None:
+        self.object_list = object_list
+        self._has_next = has_next
+
+    def has_next(self) -> bool:
+        return self._has_next
+
+
+class KeysetAutocompleteJsonView(CachedAutocompleteJsonView):
+    """
+    Автодополнение, которое листает результаты по pk последней строки.
+    select2 запрашивает страницы по номеру, поэтому pk последней строки
+    страницы хранится в кэше под номером следующей. Если его там нет,
+    страница выбирается обычным OFFSET. Страница из кэша результатов
+    не проходит через paginate_queryset, поэтому pk хранится и в ней.
+    """
+
+    cursor_timeout = 600
+
+    def _cursor_key(self, page: int) -> str:
+        term = hashlib.md5(self.term.encode()).hexdigest()
+        return ":".join(
+            (
+                "autocomplete",
+                self.model_admin.opts.label_lower,
+                self.request.session.session_key or "",
+                term,
+                str(page),
+            )
+        )
+
+    def _page(self) -> int:
+        try:
+            return int(self.request.GET.get(self.page_kwarg) or 1)
+        except ValueError:
+            return 1
+
+    def get_queryset(self):
+        return super().get_queryset().order_by("pk")
+
+    def get_page_data(self) -> dict:
+        self.next_cursor = None
+        data = super().get_page_data()
+        data["next_cursor"] = self.next_cursor
+        return data
+
+    def page_served(self, data: dict) -> None:
+        super().page_served(data)
+        if data.get("next_cursor") is not None:
+            cache.set(
+                self._cursor_key(self._page() + 1),
+                data["next_cursor"],
+                self.cursor_timeout,
+            )
+
+    def paginate_queryset(self, queryset, page_size):
+        page = self._page()
+        if page > 1:
+            after = cache.get(self._cursor_key(page))
+            if after is None:
+                return super().paginate_queryset(queryset, page_size)
+            queryset = queryset.filter(pk__gt=after)
+
+        rows = list(queryset[: page_size + 1])
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        if more:
+            self.next_cursor = rows[-1].pk
+        return None, KeysetPage(rows, more), rows, more
+
+
+class KeysetPaginationAdminMixin(EstimatedCountAdminMixin):
+    """ Листает список и автодополнение по ключу вместо OFFSET """
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def autocomplete_view(self, request):
+        return KeysetAutocompleteJsonView.as_view(model_admin=self)(request)
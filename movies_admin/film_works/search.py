@@ -0,0 +1,133 @@
+import re
+from typing import Optional, Sequence, Tuple
+
+from django.contrib.admin.views.main import ORDER_VAR
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, FloatField, Func, Q, Value
+from django.db.models.lookups import PostgresOperatorLookup
+from film_works.pagination import KeysetAutocompleteJsonView, KeysetPage
+
+# Аннотация с релевантностью строки поисковому запросу
+SEARCH_RANK = "search_rank"
+# Аннотация со сходством строки с тем, что набрано в автодополнении
+SIMILARITY = "similarity"
+
+
+def prefix_query(search_term: str, config: str) -> Optional[SearchQuery]:
+    """
+    Запрос, в котором каждое слово может быть началом слова в тексте:
+    "star tre" найдёт "Star Trek". Всё, кроме букв и цифр, отбрасывается,
+    поэтому синтаксис tsquery пользователю недоступен.
+    """
+    words = re.findall(r"\w+", search_term)
+    if not words:
+        return None
+    raw = " & ".join(f"{word}:*" for word in words)
+    return SearchQuery(raw, config=config, search_type="raw")
+
+
+class FullTextSearchAdminMixin:
+    """
+    Поиск в админке по tsvector с GIN-индексом вместо ILIKE по search_fields.
+    search_vectors — пары (поле tsvector, конфигурация поиска). Поле
+    связанной модели, например "person__search_vector", ищется подзапросом
+    по её индексу, без JOIN. По полям самой модели считается релевантность,
+    и если пользователь не выбрал сортировку, результаты идут по ней.
+    search_fields по-прежнему нужны автодополнению и показывают поле поиска.
+    """
+
+    search_vectors: Sequence[Tuple[str, str]] = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        if not self.search_vectors or not search_term.strip():
+            return super().get_search_results(request, queryset, search_term)
+
+        condition = Q()
+        rank = None
+        for path, config in self.search_vectors:
+            query = prefix_query(search_term, config)
+            if query is None:
+                return super().get_search_results(request, queryset, search_term)
+            relation, _, field = path.rpartition("__")
+            if relation:
+                related = self.model._meta.get_field(relation).related_model
+                matches = related.objects.filter(**{field: query}).values("pk")
+                condition |= Q(**{f"{relation}__in": matches})
+                continue
+            condition |= Q(**{field: query})
+            field_rank = SearchRank(F(field), query)
+            rank = field_rank if rank is None else rank + field_rank
+
+        queryset = queryset.filter(condition)
+        if rank is not None:
+            queryset = queryset.annotate(**{SEARCH_RANK: rank})
+            if ORDER_VAR not in request.GET:
+                queryset = queryset.order_by(f"-{SEARCH_RANK}", "-pk")
+        return queryset, False
+
+
+class TrigramWordSimilar(PostgresOperatorLookup):
+    """
+    field %> term: в поле есть слово, похожее на term не меньше, чем
+    pg_trgm.word_similarity_threshold. Обслуживается индексом gin_trgm_ops.
+    Регистрируется для CharField и TextField в FilmWorksConfig.ready().
+    """
+
+    lookup_name = "trigram_word_similar"
+    postgres_operator = "%%>"
+
+
+class TrigramWordSimilarity(Func):
+    """ Сходство term с самым похожим на него словом поля, от 0 до 1 """
+
+    function = "WORD_SIMILARITY"
+    output_field = FloatField()
+
+
+class TrigramAutocompleteJsonView(KeysetAutocompleteJsonView):
+    """
+    Автодополнение по индексу gin_trgm_ops на поле trigram_field админки.
+    Находятся строки, где набранный текст встречается целиком (~*)
+    или есть похожее на него слово (%>): оба условия обслуживает
+    индекс, в отличие от UPPER(...) LIKE у icontains. Ближайшие
+    совпадения идут первыми, и их не больше paginate_by: следующих
+    страниц нет. Пустой запрос листается по ключу, как раньше.
+    """
+
+    def get_queryset(self):
+        term = self.term.strip()
+        if not term:
+            return super().get_queryset()
+
+        # Как и в AutocompleteJsonView, строки берутся из get_queryset
+        # админки, только search_fields заменяет поиск по триграммам
+        field = self.model_admin.trigram_field
+        return (
+            self.model_admin.get_queryset(self.request)
+            .filter(
+                Q(**{f"{field}__iregex": re.escape(term)})
+                | Q(**{f"{field}__trigram_word_similar": term})
+            )
+            .annotate(**{SIMILARITY: TrigramWordSimilarity(Value(term), F(field))})
+            .order_by(f"-{SIMILARITY}", field, "pk")
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.term.strip():
+            return super().paginate_queryset(queryset, page_size)
+        rows = list(queryset[:page_size])
+        return None, KeysetPage(rows, False), rows, False
+
+
+class TrigramAutocompleteAdminMixin:
+    """
+    Подключает автодополнение по триграммам. trigram_field — поле
+    модели с индексом gin_trgm_ops, по которому ищется набранный текст.
+    """
+
+    trigram_field: Optional[str] = None
+
+    def autocomplete_view(self, request):
+        if self.trigram_field is None:
+            return super().autocomplete_view(request)
+        return TrigramAutocompleteJsonView.as_view(model_admin=self)(request)
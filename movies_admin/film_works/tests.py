@@ -0,0 +1,618 @@
+from unittest import mock
+
+from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR, PAGE_VAR
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.search import SearchQuery
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from film_works.cache import AUTOCOMPLETE, FILTER_CHOICES, _version_key
+from film_works.models import (
+    FilmWork,
+    FilmWorksGenres,
+    FilmWorksPersons,
+    FilmWorkType,
+    Genre,
+    Person,
+    RolePerson,
+)
+from film_works.pagination import (
+    AFTER_VAR,
+    EXACT_COUNT_VAR,
+    EstimatedCountPaginator,
+    _seek,
+)
+from film_works.search import (
+    SEARCH_RANK,
+    SIMILARITY,
+    TrigramAutocompleteJsonView,
+    prefix_query,
+)
+
+# Строк в базе больше, чем на самой большой проверяемой странице
+ROWS = 30
+PAGE_SIZES = (5, 25)
+# Встроенных строк у «большой» кинокартины и «большого» участника
+INLINE_ROWS = 10
+
+
+class AdminQueriesTest(TestCase):
+    """
+    Число запросов страниц админки не зависит ни от размера страницы
+    списка, ни от числа встроенных строк в форме изменения.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        genres = Genre.objects.bulk_create(
+            Genre(title=f"Жанр {i}") for i in range(INLINE_ROWS)
+        )
+        persons = Person.objects.bulk_create(
+            Person(full_name=f"Участник {i}") for i in range(ROWS)
+        )
+        film_works = FilmWork.objects.bulk_create(
+            FilmWork(title=f"Кинокартина {i}", type=FilmWorkType.MOVIE, rating=i)
+            for i in range(ROWS)
+        )
+        roles = RolePerson.values
+        FilmWorksPersons.objects.bulk_create(
+            FilmWorksPersons(
+                film_work=film_work, person=person, role=roles[i % len(roles)]
+            )
+            for i, film_work in enumerate(film_works)
+            for person in persons[i : i + 2]
+        )
+        FilmWorksGenres.objects.bulk_create(
+            FilmWorksGenres(film_work=film_work, genre=genres[i % len(genres)])
+            for i, film_work in enumerate(film_works)
+        )
+
+        # Кинокартина и участник с одной и с INLINE_ROWS встроенными строками
+        cls.small_film_work = FilmWork.objects.create(title="Одна строка")
+        cls.large_film_work = FilmWork.objects.create(title="Много строк")
+        cls.small_person = Person.objects.create(full_name="Одна кинокартина")
+        cls.large_person = Person.objects.create(full_name="Много кинокартин")
+        FilmWorksPersons.objects.bulk_create(
+            [
+                FilmWorksPersons(
+                    film_work=cls.small_film_work,
+                    person=cls.small_person,
+                    role=RolePerson.ACTOR,
+                ),
+                *(
+                    FilmWorksPersons(
+                        film_work=cls.large_film_work,
+                        person=person,
+                        role=RolePerson.ACTOR,
+                    )
+                    for person in persons[:INLINE_ROWS]
+                ),
+                *(
+                    FilmWorksPersons(
+                        film_work=film_work,
+                        person=cls.large_person,
+                        role=RolePerson.DIRECTOR,
+                    )
+                    for film_work in film_works[:INLINE_ROWS]
+                ),
+            ]
+        )
+        FilmWorksGenres.objects.bulk_create(
+            [
+                FilmWorksGenres(film_work=cls.small_film_work, genre=genres[0]),
+                *(
+                    FilmWorksGenres(film_work=cls.large_film_work, genre=genre)
+                    for genre in genres
+                ),
+            ]
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        # Типы содержимого для журнала админки кэшируются на весь процесс,
+        # а варианты фильтров и страницы автодополнения — в кэше Django
+        ContentType.objects.get_for_models(FilmWork, Person, Genre, FilmWorksPersons)
+        cache.clear()
+
+    def assertChangelistQueries(self, model, num: int) -> None:
+        model_admin = admin.site._registry[model]
+        url = reverse(f"admin:film_works_{model._meta.model_name}_changelist")
+        for page_size in PAGE_SIZES:
+            with self.subTest(model=model.__name__, page_size=page_size):
+                cache.clear()
+                with mock.patch.object(model_admin, "list_per_page", page_size):
+                    with self.assertNumQueries(num):
+                        response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.context["cl"].result_list), page_size)
+
+    def assertChangeFormQueries(self, objects, num: int) -> None:
+        """ num включает SAVEPOINT и RELEASE вокруг change_view """
+        for obj in objects:
+            url = reverse(
+                f"admin:film_works_{obj._meta.model_name}_change", args=(obj.pk,)
+            )
+            with self.subTest(obj=str(obj)):
+                cache.clear()
+                with self.assertNumQueries(num):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_film_work_changelist(self):
+        self.assertChangelistQueries(FilmWork, 6)
+
+    def test_person_changelist(self):
+        self.assertChangelistQueries(Person, 5)
+
+    def test_genre_changelist(self):
+        Genre.objects.bulk_create(
+            Genre(title=f"Ещё жанр {i}") for i in range(ROWS - INLINE_ROWS)
+        )
+        self.assertChangelistQueries(Genre, 5)
+
+    def test_film_works_persons_changelist(self):
+        self.assertChangelistQueries(FilmWorksPersons, 5)
+
+    def test_film_work_change_form(self):
+        self.assertChangeFormQueries((self.small_film_work, self.large_film_work), 9)
+
+    def test_person_change_form(self):
+        self.assertChangeFormQueries((self.small_person, self.large_person), 6)
+
+
+class EstimatedCountPaginatorTest(TestCase):
+    """
+    Без фильтров количество берётся из pg_class.reltuples, отфильтрованный
+    список считается до count_cap, а exact_count включает точный COUNT(*).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        Person.objects.bulk_create(
+            Person(full_name=f"Участник {i}") for i in range(ROWS)
+        )
+
+    def analyze(self) -> None:
+        """ ANALYZE записывает в reltuples точное число строк маленькой таблицы """
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Person._meta.db_table}")
+
+    def test_unfiltered_large_table_uses_reltuples(self):
+        self.analyze()
+        paginator = EstimatedCountPaginator(Person.objects.all(), 5)
+        paginator.estimate_threshold = ROWS
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.count, ROWS)
+        self.assertTrue(paginator.estimated)
+        self.assertEqual(len(queries), 1)
+        self.assertIn("reltuples", queries[0]["sql"])
+        self.assertNotIn("COUNT(", queries[0]["sql"])
+
+    def test_unfiltered_estimate_is_not_checked(self):
+        paginator = EstimatedCountPaginator(Person.objects.all(), 5)
+        with mock.patch.object(paginator, "_estimate", return_value=250_000):
+            with self.assertNumQueries(0):
+                self.assertEqual(paginator.count, 250_000)
+        self.assertTrue(paginator.estimated)
+
+    def test_unfiltered_small_table_is_counted(self):
+        paginator = EstimatedCountPaginator(Person.objects.all(), 5)
+        with mock.patch.object(paginator, "_estimate", return_value=99_999):
+            with self.assertNumQueries(1):
+                self.assertEqual(paginator.count, ROWS)
+        self.assertFalse(paginator.estimated)
+
+    def test_filtered_count_is_capped(self):
+        queryset = Person.objects.filter(full_name__startswith="Участник")
+        paginator = EstimatedCountPaginator(queryset, 5)
+        paginator.count_cap = 10
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.count, 10)
+        self.assertTrue(paginator.estimated)
+        self.assertEqual(len(queries), 1)
+        self.assertIn("LIMIT 11", queries[0]["sql"])
+        self.assertNotIn("reltuples", queries[0]["sql"])
+
+    def test_filtered_count_below_cap_is_exact(self):
+        queryset = Person.objects.filter(full_name__startswith="Участник")
+        paginator = EstimatedCountPaginator(queryset, 5)
+        self.assertEqual(paginator.count_cap, 10_000)
+        self.assertEqual(paginator.count, ROWS)
+        self.assertFalse(paginator.estimated)
+
+    def test_exact_count_skips_estimate(self):
+        paginator = EstimatedCountPaginator(Person.objects.all(), 5, exact=True)
+        with mock.patch.object(paginator, "_estimate") as estimate:
+            self.assertEqual(paginator.count, ROWS)
+        estimate.assert_not_called()
+        self.assertFalse(paginator.estimated)
+
+    def test_changelist_exact_count(self):
+        self.client.force_login(self.user)
+        self.analyze()
+        url = reverse("admin:film_works_person_changelist")
+        with mock.patch.object(EstimatedCountPaginator, "estimate_threshold", 1):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.context["cl"].paginator.estimated)
+            self.assertContains(response, f"{EXACT_COUNT_VAR}=1")
+
+            response = self.client.get(url, {EXACT_COUNT_VAR: 1})
+        self.assertEqual(response.status_code, 200)
+        cl = response.context["cl"]
+        self.assertFalse(cl.paginator.estimated)
+        self.assertEqual(cl.result_count, ROWS)
+        self.assertEqual(cl.full_result_count, ROWS)
+
+
+class KeysetPaginationTest(TestCase):
+    """
+    Список и автодополнение листаются по ключу сортировки последней
+    строки: условие на (ключ, id) и ссылки вперёд и назад обходят все
+    строки ровно по разу, а автодополнение хранит ключ в сессии.
+    """
+
+    # Имена повторяются, так что порядок решает id
+    NAMES = 7
+    PAGE_SIZE = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        Person.objects.bulk_create(
+            Person(full_name=f"Участник {i % cls.NAMES}") for i in range(ROWS)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def changelist(self, query: str = ""):
+        model_admin = admin.site._registry[Person]
+        url = reverse("admin:film_works_person_changelist") + query
+        with mock.patch.object(model_admin, "list_per_page", self.PAGE_SIZE):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.context["cl"]
+
+    def test_seek(self):
+        opts = Person._meta
+        ordering = ("full_name", "-id")
+        keys = [
+            ("full_name", False, opts.get_field("full_name")),
+            ("id", True, opts.pk),
+        ]
+        people = list(Person.objects.order_by(*ordering))
+        for i, person in enumerate(people):
+            values = [person.full_name, person.id]
+            with self.subTest(i=i):
+                after = Person.objects.filter(_seek(keys, values, True))
+                self.assertEqual(list(after.order_by(*ordering)), people[i + 1 :])
+                before = Person.objects.filter(_seek(keys, values, False))
+                self.assertEqual(list(before.order_by(*ordering)), people[:i])
+
+    def test_walk_forward_and_back(self):
+        # Сортировка по имени: Django дополняет её -pk
+        query = f"?{ORDER_VAR}=1"
+        expected = list(Person.objects.order_by("full_name", "-pk"))
+
+        pages = []
+        cl = self.changelist(query)
+        self.assertIsNone(cl.previous_url)
+        self.assertIsNone(cl.first_url)
+        while True:
+            self.assertTrue(cl.keyset)
+            pages.append(list(cl.result_list))
+            if cl.next_url is None:
+                break
+            cl = self.changelist(cl.next_url)
+        self.assertEqual([row for page in pages for row in page], expected)
+        self.assertEqual(len(pages), -(-ROWS // self.PAGE_SIZE))
+
+        back = [list(cl.result_list)]
+        while cl.previous_url is not None:
+            self.assertIsNotNone(cl.first_url)
+            cl = self.changelist(cl.previous_url)
+            back.append(list(cl.result_list))
+        self.assertEqual(back[::-1], pages)
+
+    def test_page_number_uses_offset(self):
+        self.assertTrue(self.changelist().keyset)
+        # Номер первой страницы зависит от версии Django, но любой
+        # параметр p выключает листание по ключу
+        for page in ("0", "1"):
+            with self.subTest(page=page):
+                self.assertFalse(self.changelist(f"?{PAGE_VAR}={page}").keyset)
+
+    def test_bad_cursor(self):
+        url = reverse("admin:film_works_person_changelist")
+        response = self.client.get(url, {AFTER_VAR: "не курсор"})
+        self.assertRedirects(response, f"{url}?e=1", fetch_redirect_response=False)
+
+    def autocomplete(self, client, page: int):
+        url = reverse("admin:film_works_person_autocomplete")
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url, {"term": "", "page": page})
+        self.assertEqual(response.status_code, 200)
+        rows = [row["id"] for row in response.json()["results"]]
+        return rows, [query["sql"] for query in queries]
+
+    def test_autocomplete_cursor(self):
+        ids = [
+            str(pk) for pk in Person.objects.order_by("pk").values_list("pk", flat=True)
+        ]
+        first, _ = self.autocomplete(self.client, 1)
+        second, queries = self.autocomplete(self.client, 2)
+        self.assertEqual(first + second, ids)
+        self.assertFalse(any("OFFSET" in sql for sql in queries))
+
+        # Без ключа в кэше страница выбирается через OFFSET
+        cache.clear()
+        rows, queries = self.autocomplete(self.client, 2)
+        self.assertEqual(rows, second)
+        self.assertTrue(any("OFFSET" in sql for sql in queries))
+
+    def test_autocomplete_cursor_from_cached_page(self):
+        self.autocomplete(self.client, 1)
+
+        # Вторая сессия получает первую страницу из кэша, но ключ
+        # для второй страницы сохраняется и для неё
+        other = self.client_class()
+        other.force_login(self.user)
+        first, queries = self.autocomplete(other, 1)
+        self.assertFalse(any("persons" in sql for sql in queries))
+        second, queries = self.autocomplete(other, 2)
+        self.assertEqual(len(first + second), ROWS)
+        self.assertTrue(any("persons" in sql for sql in queries))
+        self.assertFalse(any("OFFSET" in sql for sql in queries))
+
+
+class FullTextSearchTest(TestCase):
+    """
+    Поиск в админке по search_vector: его заполняет триггер, каждое
+    слово запроса может быть началом слова, а результаты без выбранной
+    сортировки идут по релевантности.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        cls.in_title = FilmWork.objects.create(
+            title="Star Trek", description="A crew explores the galaxy."
+        )
+        cls.in_description = FilmWork.objects.create(
+            title="Voyage Home", description="The crew of the Star Trek returns."
+        )
+        cls.other = FilmWork.objects.create(
+            title="Bug Troopers", description="Soldiers fight bugs."
+        )
+        cls.person = Person.objects.create(full_name="Leonard Nimoy")
+        FilmWorksPersons.objects.create(
+            film_work=cls.in_title, person=cls.person, role=RolePerson.ACTOR
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def matches(self, model, term: str, config: str) -> list:
+        query = SearchQuery(term, config=config)
+        return list(model.objects.filter(search_vector=query))
+
+    def search(self, model, term: str, **params) -> list:
+        url = reverse(f"admin:film_works_{model._meta.model_name}_changelist")
+        response = self.client.get(url, {"q": term, **params})
+        self.assertEqual(response.status_code, 200)
+        return list(response.context["cl"].result_list)
+
+    def test_trigger_on_insert(self):
+        self.assertEqual(self.matches(FilmWork, "galaxy", "english"), [self.in_title])
+        self.assertEqual(self.matches(Person, "nimoy", "simple"), [self.person])
+
+    def test_trigger_on_update(self):
+        self.in_title.title = "Star Wars"
+        self.in_title.save()
+        self.assertEqual(self.matches(FilmWork, "wars", "english"), [self.in_title])
+
+        FilmWork.objects.filter(pk=self.other.pk).update(description="Giant ants.")
+        self.assertEqual(self.matches(FilmWork, "ant", "english"), [self.other])
+        self.assertEqual(self.matches(FilmWork, "soldiers", "english"), [])
+
+        Person.objects.filter(pk=self.person.pk).update(full_name="Zachary Quinto")
+        self.assertEqual(self.matches(Person, "quinto", "simple"), [self.person])
+        self.assertEqual(self.matches(Person, "nimoy", "simple"), [])
+
+    def test_prefix_query(self):
+        self.assertIsNone(prefix_query(" & !:* ", "english"))
+        self.assertEqual(
+            {obj.pk for obj in self.search(FilmWork, "sta tre")},
+            {self.in_title.pk, self.in_description.pk},
+        )
+        self.assertEqual(self.search(FilmWork, "troop"), [self.other])
+        self.assertEqual(self.search(Person, "leo nim"), [self.person])
+        # Операторы tsquery в запросе считаются разделителями слов
+        self.assertEqual(self.search(FilmWork, "troop & ! | ("), [self.other])
+
+    def test_related_search(self):
+        rows = self.search(FilmWorksPersons, "nimo")
+        self.assertEqual([row.film_work for row in rows], [self.in_title])
+
+    def test_ordered_by_rank(self):
+        rows = self.search(FilmWork, "star")
+        self.assertEqual(rows[:2], [self.in_title, self.in_description])
+        self.assertNotIn(self.other, rows)
+        ranks = [getattr(row, SEARCH_RANK) for row in rows]
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
+        self.assertGreater(ranks[0], ranks[1])
+
+    def test_chosen_ordering_wins(self):
+        # Первая колонка list_display — title, по убыванию
+        rows = self.search(FilmWork, "star", **{ORDER_VAR: "-1"})
+        self.assertEqual(rows, [self.in_description, self.in_title])
+
+
+class TrigramAutocompleteTest(TestCase):
+    """
+    Автодополнение с набранным текстом ищет по триграммам: похожее
+    слово (%>) или текст целиком (~*), ближайшие совпадения первыми,
+    не больше одной страницы, и по индексу gin_trgm_ops.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        cls.exact = Person.objects.create(full_name="Leonard Nimoy")
+        cls.close = Person.objects.create(full_name="Adam Nimoyski")
+        cls.brackets = Person.objects.create(full_name="Sammy Davis (Jr.)")
+        Person.objects.bulk_create(
+            Person(full_name=f"Участник {i}") for i in range(ROWS)
+        )
+        FilmWork.objects.create(title="Star Trek")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def view(self, model, term: str) -> TrigramAutocompleteJsonView:
+        request = RequestFactory().get("/")
+        request.user = self.user
+        view = TrigramAutocompleteJsonView(model_admin=admin.site._registry[model])
+        view.request = request
+        view.term = term
+        return view
+
+    def autocomplete(self, term: str) -> dict:
+        url = reverse("admin:film_works_person_autocomplete")
+        response = self.client.get(url, {"term": term})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_word_similar_lookup(self):
+        queryset = Person.objects.filter(full_name__trigram_word_similar="Nimoj")
+        self.assertIn("%>", str(queryset.query))
+        self.assertEqual(set(queryset), {self.exact, self.close})
+
+    def test_escaped_regex(self):
+        # Скобка и точка ищутся буквально, а не как синтаксис регулярного
+        # выражения: "y.D" не находит "Sammy Davis"
+        data = self.autocomplete("(Jr.")
+        self.assertEqual(
+            [row["id"] for row in data["results"]], [str(self.brackets.pk)]
+        )
+        self.assertEqual(self.autocomplete("y.D")["results"], [])
+
+    def test_ordered_by_similarity(self):
+        rows = list(self.view(Person, "nimoy").get_queryset())
+        self.assertEqual(rows, [self.exact, self.close])
+        similarity = [getattr(row, SIMILARITY) for row in rows]
+        self.assertEqual(similarity[0], 1)
+        self.assertLess(similarity[1], 1)
+
+    def test_result_limit(self):
+        data = self.autocomplete("Участник")
+        self.assertEqual(len(data["results"]), 20)
+        self.assertFalse(data["pagination"]["more"])
+
+    def test_gin_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        for model, index in (
+            (Person, "persons_full_name_trgm"),
+            (FilmWork, "film_work_title_trgm"),
+        ):
+            with self.subTest(model=model.__name__):
+                plan = self.view(model, "nimoy").get_queryset().explain()
+                self.assertIn(index, plan)
+
+
+class CacheInvalidationTest(TestCase):
+    """
+    Сохранение и удаление жанра, участника или кинокартины меняет версию
+    модели: закэшированные страницы автодополнения и варианты фильтров
+    собираются заново, а попадания и промахи видны в cache_stats.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        cls.genre = Genre.objects.create(title="Драма")
+        cls.person = Person.objects.create(full_name="Leonard Nimoy")
+        FilmWorksGenres.objects.create(
+            film_work=FilmWork.objects.create(title="Star Trek"), genre=cls.genre
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def stats(self) -> dict:
+        response = self.client.get(reverse("cache_stats"))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def autocomplete(self, model, term: str) -> list:
+        url = reverse(f"admin:film_works_{model._meta.model_name}_autocomplete")
+        response = self.client.get(url, {"term": term})
+        self.assertEqual(response.status_code, 200)
+        return [row["text"] for row in response.json()["results"]]
+
+    def genre_choices(self) -> list:
+        response = self.client.get(reverse("admin:film_works_filmwork_changelist"))
+        self.assertEqual(response.status_code, 200)
+        genres = response.context["cl"].filter_specs[1]
+        return [title for _, title in genres.lookup_choices]
+
+    def test_version_bumps(self):
+        objects = (
+            lambda: Genre.objects.create(title="Комедия"),
+            lambda: Person.objects.create(full_name="William Shatner"),
+            lambda: FilmWork.objects.create(title="Star Wars"),
+        )
+        for create in objects:
+            obj = create()
+            key = _version_key(type(obj))
+            with self.subTest(model=type(obj).__name__):
+                for change in (obj.save, obj.delete):
+                    before = cache.get(key)
+                    change()
+                    self.assertNotEqual(cache.get(key), before)
+
+    def test_links_do_not_bump(self):
+        key = _version_key(FilmWorksGenres)
+        FilmWorksGenres.objects.create(
+            film_work=FilmWork.objects.create(title="Star Wars"), genre=self.genre
+        )
+        self.assertIsNone(cache.get(key))
+
+    def test_autocomplete_invalidated(self):
+        for model, field, term, name in (
+            (Genre, "title", "Дра", "Драмеди"),
+            (Person, "full_name", "Leonard", "Leonard Cohen"),
+        ):
+            with self.subTest(model=model.__name__):
+                first = self.autocomplete(model, term)
+                obj = model.objects.create(**{field: name})
+                self.assertEqual(self.stats()[AUTOCOMPLETE], {"hits": 0, "misses": 1})
+                self.assertIn(name, self.autocomplete(model, term))
+                self.assertEqual(self.stats()[AUTOCOMPLETE], {"hits": 0, "misses": 2})
+
+                obj.delete()
+                self.assertEqual(self.autocomplete(model, term), first)
+                self.assertEqual(self.autocomplete(model, term), first)
+                self.assertEqual(self.stats()[AUTOCOMPLETE], {"hits": 1, "misses": 3})
+                cache.clear()
+
+    def test_filter_choices_invalidated(self):
+        self.assertEqual(self.genre_choices(), ["Драма"])
+        self.assertEqual(self.genre_choices(), ["Драма"])
+        self.assertEqual(self.stats()[FILTER_CHOICES], {"hits": 1, "misses": 1})
+
+        self.genre.title = "Мелодрама"
+        self.genre.save()
+        self.assertEqual(self.genre_choices(), ["Мелодрама"])
+        self.assertEqual(self.stats()[FILTER_CHOICES], {"hits": 1, "misses": 2})
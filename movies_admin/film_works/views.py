@@ -0,0 +1,16 @@
+from config.db import pool
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
+from film_works import cache
+
+
+@staff_member_required
+def cache_stats(request):
+    """ Попадания и промахи кэша админки: по ним подбираются timeout и max_entries """
+    return JsonResponse(cache.stats())
+
+
+@staff_member_required
+def db_pool_stats(request):
+    """ Ожидание соединений и насыщение пулов: по ним подбирается POOL SIZE """
+    return JsonResponse(pool.stats())
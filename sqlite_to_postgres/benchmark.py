@@ -0,0 +1,181 @@
+"""
+Бенчмарк миграции на синтетических данных: для каждого размера
+генерирует SQLite, очищает content.* в локальном Postgres, переносит
+данные и замеряет extract, transform и load по отдельности.
+Результаты дописываются в JSON, чтобы сравнивать коммиты между собой.
+Таблицы content.* базы --database очищаются, поэтому её нужно указать
+явно: POSTGRES_DB из окружения бенчмарк не использует.
+
+Запуск: python benchmark.py --database movies_bench --sizes 10000 100000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+from datetime import datetime
+from queue import Empty
+from typing import List, Optional
+
+import config
+import psycopg2
+from generate_data import generate
+from postgres import BACKENDS, save_all_data
+from psycopg2.extensions import connection as _connection
+from sqlite import Extractor, conn_context
+from stats import Stats
+
+TABLES = (
+    "content.film_works_genres",
+    "content.film_works_persons",
+    "content.genres",
+    "content.persons",
+    "content.film_work",
+)
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(
+    db_path: str,
+    pg_conn: _connection,
+    batch_size: int,
+    backend: str,
+    workers: int,
+    normalize_in_sql: bool,
+) -> dict:
+    """ Переносим db_path в пустые таблицы и возвращаем замеры стадий """
+    with pg_conn.cursor() as cursor:
+        cursor.execute(f"TRUNCATE {', '.join(TABLES)};")
+    pg_conn.commit()
+
+    stats = Stats()
+    with conn_context(db_path) as sqlite_conn:
+        extractor = Extractor(
+            sqlite_conn,
+            workers=workers,
+            normalize_in_sql=normalize_in_sql,
+            stats=stats,
+        )
+        for batch in extractor.iter_batches(batch_size):
+            save_all_data(pg_conn, batch, backend, stats=stats)
+        with stats.stage("commit"):
+            pg_conn.commit()
+
+    return stats.as_dict()
+
+
+def _run_in_process(
+    queue: multiprocessing.Queue, database: str, db_path: str, *args
+) -> None:
+    dsl = {
+        "dbname": database,
+        "user": config.POSTGRES_USER,
+        "password": config.POSTGRES_PASSWORD,
+        "host": config.POSTGRES_HOST,
+        "port": config.POSTGRES_PORT,
+    }
+    with psycopg2.connect(**dsl) as pg_conn:
+        queue.put(run(db_path, pg_conn, *args))
+
+
+def _wait_result(process: multiprocessing.Process, queue: multiprocessing.Queue):
+    """
+    Ждём замеры прогона, пока процесс жив. Если он завершился,
+    не отдав их (ошибка Postgres, OOM), бенчмарк падает, а не висит.
+    """
+    while True:
+        try:
+            return queue.get(timeout=1)
+        except Empty:
+            if process.is_alive():
+                continue
+        # Процесс мог отдать результат перед самым выходом
+        try:
+            return queue.get(timeout=1)
+        except Empty:
+            process.join()
+            raise RuntimeError(
+                f"benchmark run exited with code {process.exitcode} without a result"
+            )
+
+
+def main(args: argparse.Namespace) -> List[dict]:
+    """
+    Каждый размер прогоняется в отдельном процессе,
+    чтобы пиковый RSS не переходил от одного прогона к другому.
+    """
+    results = []
+
+    for size in args.sizes:
+        db_path = os.path.join(args.data_dir, f"synthetic_{size}.sqlite")
+        if not os.path.exists(db_path):
+            generate(db_path, size)
+
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(
+            target=_run_in_process,
+            args=(
+                queue,
+                args.database,
+                db_path,
+                args.batch_size,
+                args.backend,
+                args.workers,
+                args.normalize_in_sql,
+            ),
+        )
+        process.start()
+        result = _wait_result(process, queue)
+        process.join()
+        if process.exitcode != 0:
+            raise RuntimeError(f"benchmark run exited with code {process.exitcode}")
+
+        result.update(
+            movies=size,
+            database=args.database,
+            revision=_git_revision(),
+            started=datetime.now().isoformat(),
+            batch_size=args.batch_size,
+            backend=args.backend,
+            workers=args.workers,
+            normalize_in_sql=args.normalize_in_sql,
+        )
+        print(json.dumps(result))
+        results.append(result)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--database",
+        required=True,
+        help="база Postgres для прогонов; её таблицы content.* очищаются",
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000])
+    parser.add_argument("--data-dir", default=".")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--batch-size", type=int, default=config.BATCH_SIZE)
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="insert")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--normalize-in-sql", action="store_true")
+    args = parser.parse_args()
+
+    history = []
+    if os.path.exists(args.output):
+        with open(args.output) as f:
+            history = json.load(f)
+
+    history.extend(main(args))
+
+    with open(args.output, "w") as f:
+        json.dump(history, f, indent=2)
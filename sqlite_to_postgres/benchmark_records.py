@@ -0,0 +1,113 @@
+"""
+Сравнение памяти и скорости записей миграции: прежние dataclass
+с datetime.now() в default_factory и строки-dict из SQLite
+против именованных кортежей с общей меткой времени и строк-кортежей.
+
+Запуск: python benchmark_records.py [--rows 1000000] [--sqlite db.sqlite]
+"""
+import argparse
+import sqlite3
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlite import MOVIES_SQL, MoviePerson, _get_new_key, _with_bounds
+
+
+@dataclass
+class LegacyMoviePerson:
+    id: str
+    movie_id: str
+    person_id: str
+    role: str
+    created: datetime = field(default_factory=datetime.now)
+    modified: datetime = field(default_factory=datetime.now)
+
+
+def _legacy_dict_factory(cursor: sqlite3.Cursor, row: tuple) -> dict:
+    result = {}
+    for idx, col in enumerate(cursor.description):
+        result[col[0]] = row[idx]
+    return result
+
+
+def _measure(build: Callable[[], list]) -> Tuple[float, int, int]:
+    """ Возвращаем время, пиковую память и количество построенных строк """
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows = build()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, len(rows)
+
+
+def bench_link_records(count: int) -> List[Tuple[str, float, int, int]]:
+    """ Строим count связей фильм-лицо обоими способами """
+    ids = [_get_new_key() for _ in range(1000)]
+
+    def legacy() -> list:
+        return [
+            LegacyMoviePerson(
+                id=ids[i % 1000],
+                movie_id=ids[(i + 1) % 1000],
+                person_id=ids[(i + 2) % 1000],
+                role="actor",
+            )
+            for i in range(count)
+        ]
+
+    def compact() -> list:
+        now = datetime.now()
+        return [
+            MoviePerson(
+                ids[i % 1000],
+                ids[(i + 1) % 1000],
+                ids[(i + 2) % 1000],
+                "actor",
+                now,
+                now,
+            )
+            for i in range(count)
+        ]
+
+    return [
+        ("dataclass MoviePerson", *_measure(legacy)),
+        ("NamedTuple MoviePerson", *_measure(compact)),
+    ]
+
+
+def bench_row_factory(db_path: str) -> List[Tuple[str, float, int, int]]:
+    """ Читаем все фильмы из SQLite со строками-dict и строками-кортежами """
+    results = []
+    for name, factory in (
+        ("dict row factory", _legacy_dict_factory),
+        ("tuple rows", None),
+    ):
+        conn = sqlite3.connect(db_path)
+        conn.row_factory = factory
+        cursor = conn.execute(*_with_bounds(MOVIES_SQL))
+        results.append((name, *_measure(cursor.fetchall)))
+        conn.close()
+    return results
+
+
+def report(results: List[Tuple[str, float, int, int]]) -> None:
+    for name, elapsed, peak, rows in results:
+        print(
+            f"{name:<24} {rows:>9} rows "
+            f"{peak / rows:>8.1f} bytes/row "
+            f"{rows / elapsed:>12.0f} rows/sec"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--sqlite", default="db.sqlite")
+    args = parser.parse_args()
+
+    report(bench_link_records(args.rows))
+    report(bench_row_factory(args.sqlite))
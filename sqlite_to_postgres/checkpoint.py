@@ -0,0 +1,86 @@
+"""
+Контрольные точки и файл отказов для продолжения переноса после сбоя.
+
+Каждая пачка фиксируется отдельной транзакцией, после чего в файл
+состояния записывается id последнего фильма пачки. При перезапуске
+перенос продолжается с фильма, следующего за ним. Если сбой случился
+между фиксацией пачки и записью файла, пачка загружается повторно,
+поэтому перенос с контрольными точками идёт со стабильными ключами
+и ON CONFLICT. Строки, которые Postgres отказался принять, пишутся
+в JSONL-файл отказов вместе с ошибкой, а перенос идёт дальше.
+"""
+import json
+import os
+from datetime import datetime
+from typing import Optional, TextIO
+
+
+class Checkpoint:
+    """ Файл состояния переноса одной базы SQLite """
+
+    def __init__(self, path: str, sqlite_path: str) -> None:
+        self.path = path
+        self.sqlite_path = os.path.abspath(sqlite_path)
+        self.batches = 0
+        self.rows = 0
+
+    def load(self) -> Optional[str]:
+        """
+        Получаем id последнего загруженного фильма или None,
+        если состояния нет или оно сохранено для другой базы.
+        """
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as f:
+            state = json.load(f)
+        if state["sqlite"] != self.sqlite_path:
+            return None
+        self.batches = state["batches"]
+        self.rows = state["rows"]
+        return state["tables"]["movies"]
+
+    def save(self, last_id: str, rows: int) -> None:
+        """ Записываем состояние атомарно: через временный файл и rename """
+        self.batches += 1
+        self.rows += rows
+        state = {
+            "sqlite": self.sqlite_path,
+            "tables": {"movies": last_id},
+            "batches": self.batches,
+            "rows": self.rows,
+            "saved": datetime.now().isoformat(),
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def clear(self) -> None:
+        """ Перенос завершён: следующий запуск начнётся с начала """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class DeadLetters:
+    """ Дописывает отвергнутые строки в JSONL-файл """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.count = 0
+        self._file: Optional[TextIO] = None
+
+    def write(self, table: str, row: tuple, error: Exception) -> None:
+        if self._file is None:
+            self._file = open(self.path, "a")
+        record = {
+            "table": table,
+            "row": row._asdict() if hasattr(row, "_asdict") else list(row),
+            "error": str(error).strip(),
+        }
+        self._file.write(json.dumps(record, default=str, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.count += 1
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
@@ -7,3 +7,9 @@ POSTGRES_HOST = os.getenv("POSTGRES_HOST", "127.0.0.1")
 POSTGRES_PORT = int(os.getenv("POSTGRES_PORT", 5432))
 
 TIMEZONE = "Europe/Moscow"
+
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", 1000))
+
+# Настройки соединения SQLite в режиме read_only, см. sqlite.conn_context
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 1024**3))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", 64 * 1024))
@@ -0,0 +1,242 @@
+"""
+Выгрузка переноса в файлы COPY и их параллельная загрузка в Postgres.
+
+load_data.py --export DIR пишет разобранные пачки не в Postgres,
+а в файлы текстового формата COPY: DIR/<таблица>/00000.copy[.gz],
+каждый не больше rows_per_file строк. После успешной выгрузки
+в DIR/manifest.json записываются колонки, файлы и число строк
+каждой таблицы; выгрузка без манифеста считается незавершённой.
+
+Загрузка читает манифест и пишет файлы в jobs соединений:
+сначала film_work, persons и genres, затем связи, как в writer.py.
+Каждый файл загружается своей транзакцией. uuid уже лежат в файлах,
+поэтому выгрузку можно загрузить повторно с --on-conflict nothing.
+
+Запуск: python export.py DIR [--jobs 4] [--on-conflict nothing]
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import IO, Dict, List, Optional
+
+import config
+import psycopg2
+from postgres import (
+    GENRE_COLUMNS,
+    MOVIE_COLUMNS,
+    MOVIE_GENRE_COLUMNS,
+    MOVIE_PERSON_COLUMNS,
+    PERSON_COLUMNS,
+    _steps,
+    copy_file,
+    format_copy_rows,
+)
+from sqlite import Batch
+from stats import Stats
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+
+COLUMNS = {
+    "film_work": MOVIE_COLUMNS,
+    "persons": PERSON_COLUMNS,
+    "genres": GENRE_COLUMNS,
+    "film_works_persons": MOVIE_PERSON_COLUMNS,
+    "film_works_genres": MOVIE_GENRE_COLUMNS,
+}
+
+# Таблицы, на которые ссылаются связи: загружаются первой фазой
+PARENT_TABLES = ("film_work", "persons", "genres")
+
+
+def _open(path: str, mode: str) -> IO[str]:
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class _TableFiles:
+    """ Файлы одной таблицы: новый файл начинается после rows_per_file строк """
+
+    def __init__(self, directory: str, table: str, suffix: str) -> None:
+        self.directory = directory
+        self.table = table
+        self.suffix = suffix
+        self.files: List[Dict] = []
+        self._file: Optional[IO[str]] = None
+
+    def write(self, rows: list, rows_per_file: int) -> None:
+        while rows:
+            if self._file is None:
+                path = os.path.join(self.table, f"{len(self.files):05d}{self.suffix}")
+                self.files.append({"path": path, "rows": 0})
+                self._file = _open(os.path.join(self.directory, path), "w")
+            current = self.files[-1]
+            chunk = rows[: rows_per_file - current["rows"]]
+            self._file.write(format_copy_rows(chunk))
+            current["rows"] += len(chunk)
+            rows = rows[len(chunk) :]
+            if current["rows"] >= rows_per_file:
+                self.close()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class CopyExporter:
+    """ Пишет пачки в файлы COPY вместо Postgres, как ParallelWriter. """
+
+    def __init__(
+        self,
+        directory: str,
+        compress: bool = False,
+        rows_per_file: int = 100_000,
+        stats: Optional[Stats] = None,
+    ) -> None:
+        if os.path.exists(os.path.join(directory, MANIFEST)):
+            raise FileExistsError(f"{directory} already contains an export")
+        self.directory = directory
+        self.rows_per_file = rows_per_file
+        self.stats = stats or Stats()
+        suffix = ".copy.gz" if compress else ".copy"
+        self._tables = {
+            table: _TableFiles(directory, table, suffix) for table in COLUMNS
+        }
+        for table in COLUMNS:
+            os.makedirs(os.path.join(directory, table), exist_ok=True)
+
+    def write(self, batch: Batch) -> int:
+        """ Дописываем пачку в файлы таблиц, возвращаем количество строк """
+        for table, _, rows in _steps(batch):
+            with self.stats.stage(f"export.{table}") as stage:
+                self._tables[table].write(rows, self.rows_per_file)
+                stage.rows += len(rows)
+        return sum(len(rows) for rows in batch)
+
+    def finish(self, **details) -> None:
+        """
+        Закрываем файлы и записываем манифест. details, например
+        путь до SQLite и режим ключей, сохраняются в нём как есть.
+        """
+        self.close()
+        manifest = {
+            "created": datetime.now().isoformat(),
+            **details,
+            "tables": [
+                {"table": table, "columns": COLUMNS[table], "files": files.files}
+                for table, files in self._tables.items()
+            ],
+        }
+        path = os.path.join(self.directory, MANIFEST)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(f"{path}.tmp", path)
+
+    def close(self) -> None:
+        for files in self._tables.values():
+            files.close()
+
+
+def _load_file(
+    dsl: dict,
+    directory: str,
+    table: str,
+    columns: List[str],
+    path: str,
+    on_conflict: Optional[str],
+    schema: str,
+) -> float:
+    """ Загружаем один файл в отдельном соединении и транзакции """
+    started = time.perf_counter()
+    with psycopg2.connect(**dsl) as conn, _open(
+        os.path.join(directory, path), "r"
+    ) as file:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SET TIME ZONE '{config.TIMEZONE}';")
+            copy_file(cursor, f"{schema}.{table}", columns, file, on_conflict)
+    conn.close()
+    return time.perf_counter() - started
+
+
+def load_export(
+    dsl: dict,
+    directory: str,
+    jobs: int = 4,
+    on_conflict: Optional[str] = None,
+    schema: str = "content",
+    stats: Optional[Stats] = None,
+) -> Stats:
+    """
+    Загружаем выгрузку в Postgres: файлы таблиц, на которые ссылаются
+    связи, затем файлы связей, в каждой фазе до jobs файлов одновременно.
+    Время и строки по таблицам записываются в стадии load.<таблица>.
+    """
+    stats = stats or Stats()
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found, the export is incomplete")
+    with open(path) as f:
+        manifest = json.load(f)
+
+    parents = [t for t in manifest["tables"] if t["table"] in PARENT_TABLES]
+    links = [t for t in manifest["tables"] if t["table"] not in PARENT_TABLES]
+
+    with ThreadPoolExecutor(jobs) as executor:
+        for phase, tables in (("parents", parents), ("links", links)):
+            with stats.stage(f"import.{phase}"):
+                futures = [
+                    (
+                        table["table"],
+                        file["rows"],
+                        executor.submit(
+                            _load_file,
+                            dsl,
+                            directory,
+                            table["table"],
+                            table["columns"],
+                            file["path"],
+                            on_conflict,
+                            schema,
+                        ),
+                    )
+                    for table in tables
+                    for file in table["files"]
+                ]
+                for table, rows, future in futures:
+                    stats.record(f"load.{table}", future.result(), rows)
+            stats.log_progress(logger)
+
+    return stats
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("directory", help="каталог выгрузки load_data.py --export")
+    parser.add_argument("--jobs", type=int, default=4, help="соединений для загрузки")
+    parser.add_argument(
+        "--on-conflict",
+        choices=("nothing", "update"),
+        help="upsert: пропускать или обновлять уже загруженные строки",
+    )
+    parser.add_argument("--schema", default="content")
+    args = parser.parse_args()
+
+    dsl = {
+        "dbname": config.POSTGRES_DB,
+        "user": config.POSTGRES_USER,
+        "password": config.POSTGRES_PASSWORD,
+        "host": config.POSTGRES_HOST,
+        "port": config.POSTGRES_PORT,
+    }
+    stats = load_export(dsl, args.directory, args.jobs, args.on_conflict, args.schema)
+    stats.log_progress(logger, force=True)
+    print(json.dumps(stats.as_dict()))
@@ -0,0 +1,183 @@
+"""
+Генератор синтетической базы SQLite той же структуры, что и db.sqlite:
+таблицы movies, actors, movie_actors и writers с похожим распределением
+актёров, режиссёров и сценаристов на фильм.
+
+Запуск: python generate_data.py --movies 1000000 --output synthetic.sqlite
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sqlite3
+from typing import Iterator, List, Tuple
+
+SCHEMA = """
+CREATE TABLE actors(
+id integer primary key autoincrement,
+name text
+);
+CREATE TABLE rating_agency(
+id text(27),
+name text
+);
+CREATE TABLE movies (
+id text primary key,
+genre text,
+director text,
+writer text,
+title text,
+plot text,
+ratings text,
+imdb_rating text, writers text);
+CREATE TABLE writers(
+id text(27) primary key,
+name text
+);
+CREATE TABLE movie_actors(
+movie_id text,
+actor_id text
+);
+"""
+
+GENRES = (
+    "Action Adventure Animation Biography Comedy Crime Documentary Drama Family "
+    "Fantasy Film-Noir History Horror Music Musical Mystery News Reality-TV "
+    "Romance Sci-Fi Short Sport Talk-Show Thriller War Western"
+).split()
+
+WORDS = (
+    "star war night love dark city space last king return secret world lost "
+    "empire road dream fire shadow ghost river island planet storm garden"
+).split()
+
+# Доли, подобранные по db.sqlite
+NA_SHARE = 0.01
+NA_PLOT_SHARE = 0.25
+SINGLE_WRITER_SHARE = 0.6
+MULTI_DIRECTOR_SHARE = 0.09
+
+CHUNK_SIZE = 10_000
+
+
+def _writer_id(number: int) -> str:
+    return hashlib.sha1(f"writer-{number}".encode()).hexdigest()
+
+
+def _name(rnd: random.Random, kind: str, number: int) -> str:
+    if rnd.random() < NA_SHARE:
+        return "N/A"
+    return f"{kind} {number}"
+
+
+def _text(rnd: random.Random, words: int) -> str:
+    return " ".join(rnd.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _generate_movies(
+    rnd: random.Random, movies: int, actors: int, writers: int
+) -> Iterator[Tuple[tuple, List[tuple]]]:
+    """ Строим фильмы вместе с их строками movie_actors """
+    for number in range(movies):
+        movie_id = f"tt{number:08d}"
+
+        writer_ids = [
+            _writer_id(rnd.randrange(writers))
+            for _ in range(max(1, int(rnd.expovariate(1 / 3.5))))
+        ]
+        if len(writer_ids) == 1 or rnd.random() < SINGLE_WRITER_SHARE:
+            writer, writers_json = writer_ids[0], ""
+        else:
+            writer, writers_json = "", json.dumps([{"id": w} for w in writer_ids])
+
+        directors = 2 if rnd.random() < MULTI_DIRECTOR_SHARE else 1
+        plot = "N/A" if rnd.random() < NA_PLOT_SHARE else _text(rnd, 40)
+
+        movie = (
+            movie_id,
+            ", ".join(rnd.sample(GENRES, rnd.randint(1, 4))),
+            # Режиссёры выбираются без повторов: одно и то же лицо дважды
+            # в одной роли нарушило бы уникальность film_works_persons
+            ", ".join(
+                _name(rnd, "Director", number)
+                for number in rnd.sample(range(actors), min(directors, actors))
+            ),
+            writer,
+            _text(rnd, rnd.randint(1, 5)),
+            plot,
+            None,
+            f"{rnd.uniform(1, 10):.1f}" if rnd.random() > NA_SHARE else "N/A",
+            writers_json,
+        )
+        movie_actors = [
+            (movie_id, str(rnd.randrange(actors) + 1)) for _ in range(rnd.randint(1, 8))
+        ]
+        yield movie, movie_actors
+
+
+def _flush(conn: sqlite3.Connection, movies: list, movie_actors: list) -> None:
+    conn.executemany("INSERT INTO movies VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", movies)
+    conn.executemany("INSERT INTO movie_actors VALUES (?, ?)", movie_actors)
+
+
+def generate(
+    path: str,
+    movies: int,
+    actors_ratio: float = 2.7,
+    writers_ratio: float = 1.2,
+    seed: int = 0,
+) -> None:
+    """
+    Создаём базу path на movies фильмов. Размер справочников актёров
+    и сценаристов пропорционален числу фильмов, как в db.sqlite.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+
+    rnd = random.Random(seed)
+    actors = max(1, int(movies * actors_ratio))
+    writers = max(1, int(movies * writers_ratio))
+
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+
+    for start in range(0, actors, CHUNK_SIZE):
+        conn.executemany(
+            "INSERT INTO actors(id, name) VALUES (?, ?)",
+            (
+                (number + 1, _name(rnd, "Actor", number))
+                for number in range(start, min(start + CHUNK_SIZE, actors))
+            ),
+        )
+
+    for start in range(0, writers, CHUNK_SIZE):
+        conn.executemany(
+            "INSERT INTO writers(id, name) VALUES (?, ?)",
+            (
+                (_writer_id(number), _name(rnd, "Writer", number))
+                for number in range(start, min(start + CHUNK_SIZE, writers))
+            ),
+        )
+
+    chunk_movies, chunk_actors = [], []
+    for movie, movie_actors in _generate_movies(rnd, movies, actors, writers):
+        chunk_movies.append(movie)
+        chunk_actors.extend(movie_actors)
+        if len(chunk_movies) == CHUNK_SIZE:
+            _flush(conn, chunk_movies, chunk_actors)
+            chunk_movies, chunk_actors = [], []
+    _flush(conn, chunk_movies, chunk_actors)
+
+    conn.commit()
+    conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--movies", type=int, default=10_000)
+    parser.add_argument("--output", default="synthetic.sqlite")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    generate(args.output, args.movies, seed=args.seed)
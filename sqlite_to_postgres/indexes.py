@@ -0,0 +1,279 @@
+"""
+Отложенное построение индексов и внешних ключей при массовой загрузке.
+
+Перед загрузкой вторичные индексы, уникальные ограничения и внешние ключи
+таблиц content.* снимаются, а их определения сохраняются в JSON-файл.
+После загрузки индексы строятся параллельно в нескольких сессиях
+с увеличенным maintenance_work_mem, а внешние ключи добавляются
+как NOT VALID и проверяются отдельно.
+
+Если перенос упал между снятием и восстановлением, индексы можно
+вернуть вручную: python indexes.py deferred_indexes.json
+"""
+
+import argparse
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from typing import Dict, List, Optional
+
+import config
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extensions import cursor as pg_cursor
+from stats import Stats
+
+logger = logging.getLogger(__name__)
+
+TABLES = ("film_work", "persons", "genres", "film_works_persons", "film_works_genres")
+
+# Обычные индексы, не связанные с ограничениями таблицы
+INDEXES_SQL = """
+    SELECT i.indexrelid::regclass::text AS name,
+           pg_get_indexdef(i.indexrelid) AS definition
+    FROM pg_index i
+             JOIN pg_class c ON c.oid = i.indrelid
+             JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = %(schema)s
+      AND c.relname = ANY(%(tables)s)
+      AND NOT i.indisprimary
+      AND NOT EXISTS(
+        SELECT 1
+        FROM pg_constraint con
+        WHERE con.conindid = i.indexrelid AND con.conrelid = i.indrelid
+    )
+    ORDER BY 1
+"""
+
+# Первичные ключи, уникальные ограничения (их создаёт Django) и внешние ключи
+CONSTRAINTS_SQL = """
+    SELECT con.contype AS type,
+           con.conrelid::regclass::text AS table,
+           con.conname AS name,
+           ci.relname AS index,
+           CASE con.contype
+               WHEN 'f' THEN pg_get_constraintdef(con.oid)
+               ELSE pg_get_indexdef(con.conindid)
+               END AS definition
+    FROM pg_constraint con
+             JOIN pg_class c ON c.oid = con.conrelid
+             JOIN pg_namespace n ON n.oid = c.relnamespace
+             LEFT JOIN pg_class ci ON ci.oid = con.conindid
+    WHERE n.nspname = %(schema)s
+      AND c.relname = ANY(%(tables)s)
+      AND con.contype IN ('p', 'u', 'f')
+    ORDER BY 2, 3
+"""
+
+
+def capture(
+    cursor: pg_cursor, schema: str = "content", primary_keys: bool = False
+) -> Dict[str, List[dict]]:
+    """
+    Получаем определения вторичных индексов, уникальных ограничений
+    и внешних ключей, а с primary_keys=True и первичных ключей.
+    search_path сбрасывается, чтобы все имена в определениях
+    были указаны вместе со схемой.
+    """
+    params = {"schema": schema, "tables": list(TABLES)}
+    cursor.execute("SET LOCAL search_path = pg_catalog;")
+
+    cursor.execute(INDEXES_SQL, params)
+    indexes = [{"name": name, "definition": d} for name, d in cursor.fetchall()]
+
+    cursor.execute(CONSTRAINTS_SQL, params)
+    unique, foreign_keys = [], []
+    for con_type, table, name, index, definition in cursor.fetchall():
+        item = {"table": table, "name": name, "definition": definition}
+        if con_type == "f":
+            foreign_keys.append(item)
+        elif con_type == "u" or primary_keys:
+            kind = "UNIQUE" if con_type == "u" else "PRIMARY KEY"
+            unique.append(dict(item, index=index, kind=kind))
+
+    cursor.execute("RESET search_path;")
+    return {"indexes": indexes, "unique": unique, "foreign_keys": foreign_keys}
+
+
+def drop(cursor: pg_cursor, objects: Dict[str, List[dict]]) -> None:
+    """ Снимаем внешние ключи, уникальные ограничения и индексы """
+    for item in objects["foreign_keys"] + objects["unique"]:
+        cursor.execute(_alter(item, "DROP CONSTRAINT {name};"))
+    for item in objects["indexes"]:
+        cursor.execute(sql.SQL("DROP INDEX {};").format(sql.SQL(item["name"])))
+
+
+def defer(conn, path: str, schema: str = "content") -> Dict[str, List[dict]]:
+    """
+    Сохраняем определения в path и снимаем их с таблиц.
+    Снятие фиксируется сразу, чтобы загрузка шла уже без индексов,
+    а восстановление можно было выполнить из других сессий.
+    """
+    with conn.cursor() as cursor:
+        objects = capture(cursor, schema)
+        with open(path, "w") as f:
+            json.dump(objects, f, indent=2)
+        drop(cursor, objects)
+    conn.commit()
+
+    logger.info(
+        "Deferred %d indexes, %d unique constraints and %d foreign keys",
+        len(objects["indexes"]),
+        len(objects["unique"]),
+        len(objects["foreign_keys"]),
+    )
+    return objects
+
+
+def _execute(dsl: dict, maintenance_work_mem: str, statements: list) -> None:
+    """ Выполняем statements в отдельной сессии в режиме autocommit """
+    conn = psycopg2.connect(**dsl)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SET maintenance_work_mem = %s;", (maintenance_work_mem,))
+            for statement in statements:
+                cursor.execute(statement)
+    finally:
+        conn.close()
+
+
+def execute_parallel(
+    dsl: dict, groups: List[list], jobs: int = 4, maintenance_work_mem: str = "1GB"
+) -> None:
+    """
+    Выполняем группы запросов параллельно, не больше jobs сессий сразу.
+    Запросы внутри одной группы идут по порядку в одной сессии.
+    """
+    with ThreadPoolExecutor(jobs) as pool:
+        futures = [
+            pool.submit(_execute, dsl, maintenance_work_mem, statements)
+            for statements in groups
+        ]
+        for future in futures:
+            future.result()
+
+
+def _alter(item: dict, action: str, **parts: sql.Composable) -> sql.Composed:
+    """ ALTER TABLE над ограничением item; action ссылается на него как {name} """
+    return sql.SQL("ALTER TABLE {table} " + action).format(
+        table=sql.SQL(item["table"]), name=sql.Identifier(item["name"]), **parts
+    )
+
+
+def retarget(
+    objects: Dict[str, List[dict]], source: str, target: str
+) -> Dict[str, List[dict]]:
+    """
+    Переносим определения со схемы source на схему target,
+    например с живых таблиц на их копии в промежуточной схеме.
+    """
+
+    def move(text: str, prefix: str = "") -> str:
+        return text.replace(f"{prefix}{source}.", f"{prefix}{target}.", 1)
+
+    return {
+        "indexes": [
+            {"name": move(item["name"]), "definition": move(item["definition"], " ON ")}
+            for item in objects["indexes"]
+        ],
+        "unique": [
+            dict(
+                item,
+                table=move(item["table"]),
+                definition=move(item["definition"], " ON "),
+            )
+            for item in objects["unique"]
+        ],
+        "foreign_keys": [
+            dict(
+                item,
+                table=move(item["table"]),
+                definition=move(item["definition"], "REFERENCES "),
+            )
+            for item in objects["foreign_keys"]
+        ],
+    }
+
+
+def rebuild(
+    dsl: dict,
+    objects: Dict[str, List[dict]],
+    jobs: int = 4,
+    maintenance_work_mem: str = "1GB",
+    stats: Optional[Stats] = None,
+) -> None:
+    """
+    Восстанавливаем снятые объекты. Независимые индексы строятся
+    параллельно в jobs сессиях. Внешние ключи сначала добавляются
+    как NOT VALID, без проверки строк, а затем проверяются по таблицам
+    параллельно: VALIDATE не блокирует чтение и запись в таблицу.
+    """
+    stats = stats or Stats()
+
+    # Уникальный индекс строится отдельно, а ограничение или первичный ключ
+    # затем подключается к готовому индексу без повторного сканирования
+    index_jobs = [[item["definition"]] for item in objects["indexes"]] + [
+        [
+            item["definition"],
+            _alter(
+                item,
+                "ADD CONSTRAINT {name} {kind} USING INDEX {index};",
+                kind=sql.SQL(item["kind"]),
+                index=sql.Identifier(item["index"]),
+            ),
+        ]
+        for item in objects["unique"]
+    ]
+    with stats.stage("rebuild.indexes") as stage:
+        execute_parallel(dsl, index_jobs, jobs, maintenance_work_mem)
+        stage.rows += len(index_jobs)
+
+    foreign_keys = objects["foreign_keys"]
+    with stats.stage("rebuild.foreign_keys") as stage:
+        _execute(
+            dsl,
+            maintenance_work_mem,
+            [
+                _alter(
+                    item,
+                    "ADD CONSTRAINT {name} {definition} NOT VALID;",
+                    definition=sql.SQL(item["definition"]),
+                )
+                for item in foreign_keys
+            ],
+        )
+        by_table = groupby(
+            sorted(foreign_keys, key=lambda item: item["table"]),
+            key=lambda item: item["table"],
+        )
+        validate = [
+            [_alter(item, "VALIDATE CONSTRAINT {name};") for item in items]
+            for _, items in by_table
+        ]
+        execute_parallel(dsl, validate, jobs, maintenance_work_mem)
+        stage.rows += len(foreign_keys)
+
+    logger.info(
+        "Rebuilt %d indexes and %d foreign keys", len(index_jobs), len(foreign_keys)
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    parser = argparse.ArgumentParser(description="Восстановление отложенных индексов")
+    parser.add_argument("path", help="файл, сохранённый при снятии индексов")
+    parser.add_argument("--jobs", type=int, default=4)
+    parser.add_argument("--maintenance-work-mem", default="1GB")
+    args = parser.parse_args()
+
+    dsl = {
+        "dbname": config.POSTGRES_DB,
+        "user": config.POSTGRES_USER,
+        "password": config.POSTGRES_PASSWORD,
+        "host": config.POSTGRES_HOST,
+        "port": config.POSTGRES_PORT,
+    }
+    with open(args.path) as f:
+        rebuild(dsl, json.load(f), args.jobs, args.maintenance_work_mem)
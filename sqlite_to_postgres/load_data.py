@@ -1,21 +1,310 @@
+import argparse
+import cProfile
+import json
+import logging
+import os
 import sqlite3
+from contextlib import nullcontext
+from typing import Optional, Union
 
 import config
 import psycopg2
-from postgres import save_all_data
+from checkpoint import Checkpoint, DeadLetters
+from export import CopyExporter
+from indexes import defer, rebuild
+from pipeline import Pipeline
+from postgres import (
+    BACKENDS,
+    get_known_keys,
+    save_all_data,
+    save_all_data_by_row,
+)
+from psycopg2 import DataError, IntegrityError
 from psycopg2.extensions import connection as _connection
 from psycopg2.extras import DictCursor
-from sqlite import Extractor, conn_context
+from sqlite import Batch, Extractor, conn_context
+from staging import STAGING_SCHEMA, create_staging, prepare, swap
+from stats import Stats
+from writer import ParallelWriter
 
+logger = logging.getLogger(__name__)
 
-def load_from_sqlite(connection: sqlite3.Connection, pg_conn: _connection):
-    """Основной метод загрузки данных из SQLite в Postgres"""
-    data = Extractor(connection).get_data()
 
-    save_all_data(pg_conn, data)
+def load_from_sqlite(
+    connection: sqlite3.Connection,
+    pg_conn: Optional[_connection],
+    batch_size: int = config.BATCH_SIZE,
+    backend: str = "insert",
+    stable_keys: bool = False,
+    on_conflict: Optional[str] = None,
+    workers: int = 1,
+    normalize_in_sql: bool = False,
+    stats: Optional[Stats] = None,
+    schema: str = "content",
+    pipeline: bool = False,
+    queue_size: int = 2,
+    writer: Optional[Union[ParallelWriter, CopyExporter]] = None,
+    checkpoint: Optional[Checkpoint] = None,
+    dead_letters: Optional[DeadLetters] = None,
+    readers: int = 1,
+) -> Stats:
+    """
+    Основной метод загрузки данных из SQLite в Postgres.
+    Данные читаются и записываются пачками по batch_size фильмов,
+    поэтому потребление памяти не зависит от размера SQLite.
+    Для повторного запуска поверх уже загруженных данных нужны
+    stable_keys=True и on_conflict="nothing" или "update".
+    workers > 1 разбирает фильмы в пуле из workers процессов,
+    normalize_in_sql=True переносит разбор жанров и лиц в запросы SQLite.
+    Время, строки и память по стадиям и таблицам собираются в stats.
+    schema задаёт схему, в которую пишутся таблицы.
+    pipeline=True читает, разбирает и пишет пачки одновременно
+    в разных потоках, между стадиями ждут не больше queue_size пачек.
+    writer пишет пачки через несколько соединений или в файлы COPY
+    вместо pg_conn; с CopyExporter pg_conn может быть None.
+    С checkpoint или dead_letters каждая пачка фиксируется отдельно.
+    checkpoint хранит id последнего загруженного фильма, и повторный
+    запуск продолжает перенос с него; он требует stable_keys и
+    on_conflict, потому что пачка, зафиксированная в Postgres до сбоя,
+    но не попавшая в checkpoint, будет загружена ещё раз.
+    Пачку, которую Postgres не принял, dead_letters повторяет построчно
+    и сохраняет отвергнутые строки.
+    readers > 1 читает SQLite диапазонами id в readers процессах.
+    """
+    if on_conflict is not None and not stable_keys:
+        raise ValueError("on_conflict needs stable_keys to match loaded rows")
+    if checkpoint is not None and on_conflict is None:
+        # Пачку, зафиксированную перед самым сбоем, перезапуск загрузит снова
+        raise ValueError("checkpoint needs stable_keys and on_conflict")
+    stats = stats or Stats()
+
+    after = checkpoint.load() if checkpoint is not None else None
+    extractor = Extractor(
+        connection, stable_keys, workers, normalize_in_sql, stats, after, readers
+    )
+    if after:
+        # Лица и жанры прошлых пачек уже в Postgres, новые uuid им не нужны
+        with pg_conn.cursor() as cursor:
+            persons, genres = get_known_keys(cursor, schema)
+        extractor.persons.update(persons)
+        extractor.genres.update(genres)
+        logger.info(
+            "Resuming after movie %s: %d batches, %d rows already loaded",
+            after,
+            checkpoint.batches,
+            checkpoint.rows,
+        )
+
+    def save(batch: Batch) -> None:
+        try:
+            save_all_data(pg_conn, batch, backend, on_conflict, stats, schema)
+        except (DataError, IntegrityError):
+            if dead_letters is None:
+                raise
+            pg_conn.rollback()
+            save_all_data_by_row(
+                pg_conn, batch, dead_letters.write, backend, on_conflict, stats, schema
+            )
+        if checkpoint is not None or dead_letters is not None:
+            pg_conn.commit()
+
+    def load(batch: Batch) -> None:
+        if writer is not None:
+            writer.write(batch)
+        else:
+            save(batch)
+        if checkpoint is not None:
+            checkpoint.save(extractor.pop_checkpoint(), sum(map(len, batch)))
+        stats.log_progress(logger)
+
+    if pipeline:
+        runner = Pipeline(extractor.transform, load, queue_size)
+        runner.run(extractor.iter_raw_batches(batch_size))
+        stats.utilisation = runner.utilisation
+    else:
+        for batch in extractor.iter_batches(batch_size):
+            load(batch)
+
+    stats.log_progress(logger, force=True)
+    for name, stage in stats.stages.items():
+        logger.info(
+            "%-24s %9d rows in %8.2f s (%.0f rows/sec), RSS %+.0f MB, max %.0f MB",
+            name,
+            stage.rows,
+            stage.seconds,
+            stage.rows_per_sec,
+            stage.rss_delta_mb,
+            stage.max_rss_mb,
+        )
+    for name, share in stats.utilisation.items():
+        logger.info("%-24s busy %3.0f%% of wall time", name, share * 100)
+    if dead_letters is not None and dead_letters.count:
+        logger.warning(
+            "%d rows rejected, see %s", dead_letters.count, dead_letters.path
+        )
+
+    if checkpoint is not None:
+        checkpoint.clear()
+
+    return stats
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Перенос данных из SQLite в Postgres")
+    parser.add_argument("--sqlite", default="db.sqlite", help="путь до базы SQLite")
+    parser.add_argument("--batch-size", type=int, default=config.BATCH_SIZE)
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="insert")
+    parser.add_argument(
+        "--stable-keys",
+        action="store_true",
+        help="строить uuid5 от исходных данных вместо uuid4",
+    )
+    parser.add_argument(
+        "--on-conflict",
+        choices=("nothing", "update"),
+        help="upsert: пропускать или обновлять уже загруженные строки",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="процессов для разбора фильмов"
+    )
+    parser.add_argument(
+        "--normalize-in-sql",
+        action="store_true",
+        help="разбирать жанры и лица через json_each и рекурсивные CTE SQLite",
+    )
+    parser.add_argument(
+        "--defer-indexes",
+        action="store_true",
+        help="снять вторичные индексы и внешние ключи на время загрузки; "
+        "уникальность связей при этом проверяется только при восстановлении",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="читать, разбирать и писать пачки одновременно в разных потоках",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=2,
+        help="сколько пачек может ждать между стадиями конвейера",
+    )
+    parser.add_argument(
+        "--connections",
+        type=int,
+        default=1,
+        help="соединений для параллельной записи; атомарно только вместе с --staging",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        metavar="PATH",
+        help="фиксировать каждую пачку и продолжать перенос с места остановки; "
+        "нужны --stable-keys и --on-conflict",
+    )
+    parser.add_argument(
+        "--dead-letter",
+        metavar="PATH",
+        help="писать отвергнутые Postgres строки в JSONL вместо остановки",
+    )
+    parser.add_argument(
+        "--staging",
+        action="store_true",
+        help=f"загрузить в схему {STAGING_SCHEMA} и атомарно подменить ею таблицы",
+    )
+    parser.add_argument(
+        "--unlogged",
+        action="store_true",
+        help="создать промежуточные таблицы как UNLOGGED (только с --staging)",
+    )
+    parser.add_argument(
+        "--keep-old",
+        action="store_true",
+        help="оставить прежние таблицы в схеме content_old (только с --staging)",
+    )
+    parser.add_argument(
+        "--export",
+        metavar="DIR",
+        help="писать пачки в файлы COPY вместо Postgres; загрузка: export.py DIR",
+    )
+    parser.add_argument(
+        "--compress", action="store_true", help="сжимать файлы --export gzip"
+    )
+    parser.add_argument(
+        "--rows-per-file",
+        type=int,
+        default=100_000,
+        help="строк в одном файле --export",
+    )
+    parser.add_argument(
+        "--index-state",
+        default="deferred_indexes.json",
+        help="куда сохранить определения снятых индексов",
+    )
+    parser.add_argument(
+        "--index-jobs", type=int, default=4, help="сессий для построения индексов"
+    )
+    parser.add_argument("--maintenance-work-mem", default="1GB")
+    parser.add_argument(
+        "--read-only",
+        action="store_true",
+        help="открыть SQLite только для чтения как неизменяемую, с mmap",
+    )
+    parser.add_argument(
+        "--readers",
+        type=int,
+        default=1,
+        help="процессов для чтения SQLite диапазонами id (открывают её read-only)",
+    )
+    parser.add_argument(
+        "--progress-interval",
+        type=float,
+        default=30.0,
+        help="как часто писать строку прогресса, секунд",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="запустить под cProfile и сохранить статистику",
+    )
+    parser.add_argument(
+        "--stats-file", metavar="PATH", help="сохранить итоговые замеры в JSON"
+    )
+    args = parser.parse_args()
+
+    if args.pipeline and args.workers > 1:
+        parser.error("--pipeline parses in a single thread, drop --workers")
+    if args.staging and (args.on_conflict or args.defer_indexes):
+        parser.error("--staging loads into empty tables without indexes")
+    if args.on_conflict and not args.stable_keys:
+        parser.error("--on-conflict matches rows by id and requires --stable-keys")
+    if args.checkpoint and not args.on_conflict:
+        parser.error(
+            "--checkpoint may replay the last committed batch and requires "
+            "--stable-keys and --on-conflict"
+        )
+    if args.staging and args.checkpoint:
+        parser.error("--staging recreates the staging schema and cannot resume")
+    if args.connections > 1 and args.dead_letter:
+        parser.error("--dead-letter retries rows over a single connection")
+    if (args.unlogged or args.keep_old) and not args.staging:
+        parser.error("--unlogged and --keep-old require --staging")
+    if args.export and (
+        args.on_conflict
+        or args.defer_indexes
+        or args.staging
+        or args.checkpoint
+        or args.dead_letter
+        or args.connections > 1
+    ):
+        parser.error("--export does not connect to Postgres, pass these to export.py")
+    if (args.compress or args.rows_per_file != 100_000) and not args.export:
+        parser.error("--compress and --rows-per-file require --export")
+    return args
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    args = parse_args()
     dsl = {
         "dbname": config.POSTGRES_DB,
         "user": config.POSTGRES_USER,
@@ -23,7 +312,93 @@ if __name__ == "__main__":
         "host": config.POSTGRES_HOST,
         "port": config.POSTGRES_PORT,
     }
-    with conn_context("db.sqlite") as sqlite_conn, psycopg2.connect(
-        **dsl, cursor_factory=DictCursor
-    ) as pg_conn:
-        load_from_sqlite(sqlite_conn, pg_conn)
+    stats = Stats(args.progress_interval)
+    profiler = cProfile.Profile() if args.profile else None
+    deferred = None
+    writer = None
+    checkpoint = Checkpoint(args.checkpoint, args.sqlite) if args.checkpoint else None
+    dead_letters = DeadLetters(args.dead_letter) if args.dead_letter else None
+
+    sqlite_context = conn_context(args.sqlite, args.read_only)
+    if args.export:
+        pg_context = nullcontext()
+    else:
+        pg_context = psycopg2.connect(**dsl, cursor_factory=DictCursor)
+
+    try:
+        with sqlite_context as sqlite_conn, pg_context as pg_conn:
+            if args.defer_indexes:
+                deferred = defer(pg_conn, args.index_state)
+            if args.staging:
+                create_staging(pg_conn, unlogged=args.unlogged)
+            if args.export:
+                writer = CopyExporter(
+                    args.export, args.compress, args.rows_per_file, stats
+                )
+            elif args.connections > 1:
+                writer = ParallelWriter(
+                    dsl,
+                    args.connections,
+                    args.backend,
+                    args.on_conflict,
+                    STAGING_SCHEMA if args.staging else "content",
+                    stats,
+                )
+            if profiler:
+                profiler.enable()
+            load_from_sqlite(
+                sqlite_conn,
+                pg_conn,
+                args.batch_size,
+                args.backend,
+                args.stable_keys,
+                args.on_conflict,
+                args.workers,
+                args.normalize_in_sql,
+                stats,
+                STAGING_SCHEMA if args.staging else "content",
+                args.pipeline,
+                args.queue_size,
+                writer,
+                checkpoint,
+                dead_letters,
+                args.readers,
+            )
+            if args.export:
+                writer.finish(
+                    sqlite=os.path.abspath(args.sqlite), stable_keys=args.stable_keys
+                )
+
+            if args.staging:
+                pg_conn.commit()
+                prepare(
+                    pg_conn,
+                    dsl,
+                    unlogged=args.unlogged,
+                    jobs=args.index_jobs,
+                    maintenance_work_mem=args.maintenance_work_mem,
+                    stats=stats,
+                )
+                with stats.stage("staging.swap"):
+                    swap(pg_conn, keep_old=args.keep_old)
+    finally:
+        if writer is not None:
+            writer.close()
+        if dead_letters is not None:
+            dead_letters.close()
+
+        # Индексы возвращаем и после ошибки загрузки, уже на прежние данные
+        if deferred is not None:
+            rebuild(dsl, deferred, args.index_jobs, args.maintenance_work_mem, stats)
+            os.remove(args.index_state)
+
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+
+        # Итог пишем и при ошибке: видно, на какой стадии остановился перенос
+        summary = stats.as_dict()
+        if args.stats_file:
+            with open(args.stats_file, "w") as f:
+                json.dump(summary, f, indent=2)
+        print(json.dumps(summary))
@@ -0,0 +1,152 @@
+"""
+Конвейер extract -> transform -> load на потоках с ограниченными очередями.
+
+Чтение идёт в вызывающем потоке (соединение SQLite привязано к нему),
+разбор и запись — каждая в своём потоке. Пока пачка N пишется в Postgres,
+пачка N+1 разбирается, а N+2 читается из SQLite. Очереди ограничены,
+поэтому быстрая стадия ждёт медленную и в памяти одновременно
+находится не больше нескольких пачек.
+
+Чтение из SQLite и запись в Postgres отпускают GIL на время ввода-вывода,
+так что потоков достаточно, чтобы эти стадии шли одновременно с разбором.
+"""
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+# Метка конца потока пачек
+_DONE = object()
+
+# Как часто ожидающая стадия проверяет, не упала ли соседняя, секунд
+_POLL_INTERVAL = 0.1
+
+
+class _Cancelled(Exception):
+    """ Другая стадия упала, текущей нужно остановиться """
+
+
+def _put(q: queue.Queue, item: Any, failed: threading.Event) -> None:
+    while True:
+        try:
+            q.put(item, timeout=_POLL_INTERVAL)
+            return
+        except queue.Full:
+            if failed.is_set():
+                raise _Cancelled
+
+
+def _get(q: queue.Queue, failed: threading.Event) -> Any:
+    while True:
+        try:
+            return q.get(timeout=_POLL_INTERVAL)
+        except queue.Empty:
+            if failed.is_set():
+                raise _Cancelled
+
+
+class _Stage(threading.Thread):
+    """ Берёт пачки из inbox, обрабатывает func и кладёт результат в outbox """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[Any], Any],
+        inbox: queue.Queue,
+        outbox: Optional[queue.Queue],
+        failed: threading.Event,
+    ) -> None:
+        super().__init__(name=name, daemon=True)
+        self.func = func
+        self.inbox = inbox
+        self.outbox = outbox
+        self.failed = failed
+        self.busy = 0.0
+        self.error: Optional[BaseException] = None
+
+    def run(self) -> None:
+        try:
+            while True:
+                item = _get(self.inbox, self.failed)
+                if item is _DONE:
+                    break
+                started = time.perf_counter()
+                result = self.func(item)
+                self.busy += time.perf_counter() - started
+                if self.outbox is not None:
+                    _put(self.outbox, result, self.failed)
+            if self.outbox is not None:
+                _put(self.outbox, _DONE, self.failed)
+        except _Cancelled:
+            pass
+        except BaseException as error:
+            self.error = error
+            self.failed.set()
+
+
+class Pipeline:
+    """ Связывает чтение, разбор и запись пачек ограниченными очередями. """
+
+    def __init__(
+        self,
+        transform: Callable[[Any], Any],
+        load: Callable[[Any], None],
+        queue_size: int = 2,
+    ) -> None:
+        """
+        :param transform: превращает прочитанную пачку в пачку для загрузки
+        :param load: записывает пачку; вызывается из отдельного потока
+        :param queue_size: сколько пачек может ждать между стадиями
+        """
+        self._transform = transform
+        self._load = load
+        self._queue_size = queue_size
+        self.utilisation: Dict[str, float] = {}
+
+    def run(self, batches: Iterable) -> None:
+        """
+        Прогоняем batches через конвейер. Ошибка любой стадии
+        останавливает остальные и пробрасывается из run.
+        После завершения в utilisation лежит доля времени,
+        которую каждая стадия была занята работой, а не ожиданием:
+        стадия с долей около 1 и есть узкое место.
+        """
+        failed = threading.Event()
+        raw: queue.Queue = queue.Queue(self._queue_size)
+        ready: queue.Queue = queue.Queue(self._queue_size)
+        stages = [
+            _Stage("transform", self._transform, raw, ready, failed),
+            _Stage("load", self._load, ready, None, failed),
+        ]
+
+        started = time.perf_counter()
+        extract_busy = 0.0
+        for stage in stages:
+            stage.start()
+
+        try:
+            iterator = iter(batches)
+            while True:
+                read_started = time.perf_counter()
+                batch = next(iterator, _DONE)
+                extract_busy += time.perf_counter() - read_started
+                _put(raw, batch, failed)
+                if batch is _DONE:
+                    break
+        except _Cancelled:
+            pass
+        except BaseException:
+            failed.set()
+            raise
+        finally:
+            for stage in stages:
+                stage.join()
+
+        for stage in stages:
+            if stage.error is not None:
+                raise stage.error
+
+        wall = time.perf_counter() - started
+        self.utilisation = {"extract": extract_busy / wall if wall else 0.0}
+        for stage in stages:
+            self.utilisation[stage.name] = stage.busy / wall if wall else 0.0
@@ -1,74 +1,232 @@
-from typing import List, Tuple
+from datetime import date, datetime
+from io import StringIO
+from typing import IO, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
 from config import TIMEZONE
+from psycopg2 import DataError, IntegrityError
 from psycopg2.extensions import connection
 from psycopg2.extensions import cursor as pg_cursor
 from psycopg2.extras import execute_values
 from sqlite import Genre, Movie, MovieGenre, MoviePerson, Person
+from stats import Stats
 
+# Порядок колонок совпадает с порядком полей записей из sqlite.py,
+# поэтому записи передаются в write_rows без преобразования.
+MOVIE_COLUMNS = ("id", "title", "description", "rating", "created", "modified")
+PERSON_COLUMNS = ("id", "full_name", "created", "modified")
+GENRE_COLUMNS = ("id", "title", "created", "modified")
+MOVIE_PERSON_COLUMNS = (
+    "id",
+    "film_work_id",
+    "person_id",
+    "role",
+    "created",
+    "modified",
+)
+MOVIE_GENRE_COLUMNS = ("id", "film_work_id", "genre_id", "created", "modified")
 
-def save_movies(cursor: pg_cursor, movies: List[Movie]) -> None:
-    """ Загружает фильмы в content.movies. """
+RowWriter = Callable[[pg_cursor, str, Sequence[str], List[tuple], Optional[str]], None]
+# (таблица, строка, ошибка) для строк, которые не удалось записать
+RowErrorHandler = Callable[[str, tuple, Exception], None]
 
-    SQL = "INSERT INTO content.film_work(id, title, description, rating, created, modified) VALUES %s"
+# Колонки, которые не сравниваются и не перезаписываются при upsert
+_UPSERT_SKIP_COLUMNS = ("id", "created", "modified")
 
-    execute_values(
-        cursor,
-        SQL,
-        [
-            (m.id, m.title, m.description, m.rating, m.created, m.modified)
-            for m in movies
-        ],
-    )
+# Экранирование для текстового формата COPY:
+# https://www.postgresql.org/docs/current/sql-copy.html#id-1.9.3.55.9.2
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
 
 
-def save_persons(cursor: pg_cursor, persons: List[Person]) -> None:
-    """ Загружает лица в content.persons. """
+def _copy_value(value) -> str:
+    """ Приводим значение к текстовому представлению COPY. """
+    if value is None:
+        return "\\N"
+    if isinstance(value, str):
+        return value.translate(_COPY_ESCAPES)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
 
-    SQL = "INSERT INTO content.persons(id, full_name, created, modified) VALUES %s"
 
-    execute_values(
-        cursor, SQL, [(p.id, p.full_name, p.created, p.modified) for p in persons]
+def format_copy_rows(rows: Iterable[tuple]) -> str:
+    """ Собираем строки в текстовый формат COPY. """
+    return "".join(
+        "\t".join(_copy_value(value) for value in row) + "\n" for row in rows
     )
 
 
-def save_genres(cursor: pg_cursor, genres: List[Genre]) -> None:
-    """ Загружает жанры в content.genres. """
+def _conflict_clause(columns: Sequence[str], on_conflict: Optional[str]) -> str:
+    """
+    Собираем ON CONFLICT для INSERT INTO ... AS t.
+    "nothing" пропускает уже загруженные строки, "update" обновляет
+    только те из них, у которых действительно изменились данные.
+    """
+    if on_conflict is None:
+        return ""
+    if on_conflict == "nothing":
+        return " ON CONFLICT DO NOTHING"
+    if on_conflict != "update":
+        raise ValueError(f"Unknown conflict mode: {on_conflict}")
+
+    updated = [c for c in columns if c not in _UPSERT_SKIP_COLUMNS]
+    assignments = [f"{c} = EXCLUDED.{c}" for c in updated]
+    if "modified" in columns:
+        assignments.append("modified = EXCLUDED.modified")
+    current = ", ".join(f"t.{c}" for c in updated)
+    excluded = ", ".join(f"EXCLUDED.{c}" for c in updated)
+
+    return (
+        f" ON CONFLICT (id) DO UPDATE SET {', '.join(assignments)}"
+        f" WHERE ({current}) IS DISTINCT FROM ({excluded})"
+    )
+
 
-    SQL = "INSERT INTO content.genres(id, title, created, modified) VALUES %s"
+def insert_rows(
+    cursor: pg_cursor,
+    table: str,
+    columns: Sequence[str],
+    rows: List[tuple],
+    on_conflict: Optional[str] = None,
+) -> None:
+    """ Загружает строки в таблицу многострочным INSERT. """
 
-    execute_values(
-        cursor, SQL, [(g.id, g.title, g.created, g.modified) for g in genres]
+    SQL = (
+        f"INSERT INTO {table} AS t({', '.join(columns)}) VALUES %s"
+        + _conflict_clause(columns, on_conflict)
     )
 
+    execute_values(cursor, SQL, rows)
+
+
+def copy_file(
+    cursor: pg_cursor,
+    table: str,
+    columns: Sequence[str],
+    file: IO[str],
+    on_conflict: Optional[str] = None,
+) -> None:
+    """
+    Загружает в таблицу файл в текстовом формате COPY.
+    COPY не умеет ON CONFLICT, поэтому для upsert строки сначала
+    копируются во временную таблицу, а уже оттуда вставляются в целевую.
+    """
+    target = table
+    if on_conflict is not None:
+        target = f"tmp_{table.split('.')[-1]}"
+        cursor.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS {target} (LIKE {table}) ON COMMIT DROP;"
+            f"TRUNCATE {target};"
+        )
+
+    column_list = ", ".join(columns)
+    cursor.copy_expert(f"COPY {target}({column_list}) FROM STDIN", file)
+
+    if on_conflict is not None:
+        cursor.execute(
+            f"INSERT INTO {table} AS t({column_list}) "
+            f"SELECT {column_list} FROM {target}"
+            + _conflict_clause(columns, on_conflict)
+        )
+
+
+def copy_rows(
+    cursor: pg_cursor,
+    table: str,
+    columns: Sequence[str],
+    rows: List[tuple],
+    on_conflict: Optional[str] = None,
+) -> None:
+    """ Загружает строки в таблицу через COPY ... FROM STDIN. """
+    if not rows:
+        return
+
+    copy_file(cursor, table, columns, StringIO(format_copy_rows(rows)), on_conflict)
+
+
+BACKENDS: Dict[str, RowWriter] = {"insert": insert_rows, "copy": copy_rows}
+
+
+def save_movies(
+    cursor: pg_cursor,
+    movies: List[Movie],
+    write_rows: RowWriter = insert_rows,
+    on_conflict: Optional[str] = None,
+    schema: str = "content",
+) -> None:
+    """ Загружает фильмы в film_work схемы schema: content или content_staging. """
+
+    write_rows(cursor, f"{schema}.film_work", MOVIE_COLUMNS, movies, on_conflict)
+
+
+def save_persons(
+    cursor: pg_cursor,
+    persons: List[Person],
+    write_rows: RowWriter = insert_rows,
+    on_conflict: Optional[str] = None,
+    schema: str = "content",
+) -> None:
+    """ Загружает лица в persons схемы schema: content или content_staging. """
+
+    write_rows(cursor, f"{schema}.persons", PERSON_COLUMNS, persons, on_conflict)
+
+
+def save_genres(
+    cursor: pg_cursor,
+    genres: List[Genre],
+    write_rows: RowWriter = insert_rows,
+    on_conflict: Optional[str] = None,
+    schema: str = "content",
+) -> None:
+    """ Загружает жанры в genres схемы schema: content или content_staging. """
+
+    write_rows(cursor, f"{schema}.genres", GENRE_COLUMNS, genres, on_conflict)
 
-def save_movies_persons(cursor: pg_cursor, movies_persons: List[MoviePerson]) -> None:
-    """ Загружает данные в таблицу content.movies_persons. """
 
-    SQL = "INSERT INTO content.film_works_persons(id, film_work_id, person_id, role, created, modified) VALUES %s"
+def save_movies_persons(
+    cursor: pg_cursor,
+    movies_persons: List[MoviePerson],
+    write_rows: RowWriter = insert_rows,
+    on_conflict: Optional[str] = None,
+    schema: str = "content",
+) -> None:
+    """ Загружает film_works_persons в схему schema: content или content_staging. """
 
-    execute_values(
+    write_rows(
         cursor,
-        SQL,
-        [
-            (mp.id, mp.movie_id, mp.person_id, mp.role, mp.created, mp.modified)
-            for mp in movies_persons
-        ],
+        f"{schema}.film_works_persons",
+        MOVIE_PERSON_COLUMNS,
+        movies_persons,
+        on_conflict,
     )
 
 
-def save_movies_genres(cursor: pg_cursor, movies_genres: List[MovieGenre]) -> None:
-    """ Загружает данные в таблицу content.movies_genres. """
-
-    SQL = "INSERT INTO content.film_works_genres(id, film_work_id, genre_id, created, modified) VALUES %s"
+def save_movies_genres(
+    cursor: pg_cursor,
+    movies_genres: List[MovieGenre],
+    write_rows: RowWriter = insert_rows,
+    on_conflict: Optional[str] = None,
+    schema: str = "content",
+) -> None:
+    """ Загружает film_works_genres в схему schema: content или content_staging. """
 
-    execute_values(
+    write_rows(
         cursor,
-        SQL,
-        [
-            (mg.id, mg.movie_id, mg.genre_id, mg.created, mg.modified)
-            for mg in movies_genres
-        ],
+        f"{schema}.film_works_genres",
+        MOVIE_GENRE_COLUMNS,
+        movies_genres,
+        on_conflict,
+    )
+
+
+def _steps(data: Sequence[list]) -> Tuple[Tuple[str, Callable, list], ...]:
+    """ Таблицы в порядке загрузки: связи пишутся после фильмов, лиц и жанров """
+    movies, persons, genres, movies_persons, movies_genres = data
+    return (
+        ("film_work", save_movies, movies),
+        ("persons", save_persons, persons),
+        ("genres", save_genres, genres),
+        ("film_works_persons", save_movies_persons, movies_persons),
+        ("film_works_genres", save_movies_genres, movies_genres),
     )
 
 
@@ -77,14 +235,79 @@ def save_all_data(
     data: Tuple[
         List[Movie], List[Person], List[Genre], List[MoviePerson], List[MovieGenre]
     ],
-) -> None:
-    """ Основной метод загрузки данных в Postgres """
-    movies, persons, genres, movies_persons, movies_genres = data
+    backend: str = "insert",
+    on_conflict: Optional[str] = None,
+    stats: Optional[Stats] = None,
+    schema: str = "content",
+) -> int:
+    """
+    Основной метод загрузки данных в Postgres.
+    backend выбирает способ записи: "insert" или "copy".
+    on_conflict включает upsert: "nothing" или "update".
+    В stats для каждой таблицы пишется стадия load.<таблица>.
+    schema позволяет писать не в живые таблицы, а в промежуточную схему.
+    Возвращает количество загруженных строк.
+    """
+    write_rows = BACKENDS[backend]
+    stats = stats or Stats()
 
     with conn.cursor() as cursor:
         cursor.execute(f"SET TIME ZONE '{TIMEZONE}';")
-        save_movies(cursor, movies)
-        save_persons(cursor, persons)
-        save_genres(cursor, genres)
-        save_movies_persons(cursor, movies_persons)
-        save_movies_genres(cursor, movies_genres)
+        for table, save, rows in _steps(data):
+            with stats.stage(f"load.{table}") as stage:
+                save(cursor, rows, write_rows, on_conflict, schema)
+                stage.rows += len(rows)
+
+    return sum(len(rows) for rows in data)
+
+
+def save_all_data_by_row(
+    conn: connection,
+    data: Sequence[list],
+    on_error: RowErrorHandler,
+    backend: str = "insert",
+    on_conflict: Optional[str] = None,
+    stats: Optional[Stats] = None,
+    schema: str = "content",
+) -> int:
+    """
+    Медленный путь для пачки, которую не удалось записать целиком.
+    Каждая строка пишется под своей точкой сохранения: строка с ошибкой
+    в данных откатывается и передаётся в on_error, остальные остаются
+    в транзакции. Ошибки соединения не перехватываются.
+    Возвращает количество строк, которые не удалось записать.
+    """
+    write_rows = BACKENDS[backend]
+    stats = stats or Stats()
+    failed = 0
+
+    with conn.cursor() as cursor, stats.stage("load.by_row") as stage:
+        cursor.execute(f"SET TIME ZONE '{TIMEZONE}';")
+        for table, save, rows in _steps(data):
+            for row in rows:
+                cursor.execute("SAVEPOINT row;")
+                try:
+                    save(cursor, [row], write_rows, on_conflict, schema)
+                except (DataError, IntegrityError) as error:
+                    cursor.execute("ROLLBACK TO SAVEPOINT row;")
+                    on_error(table, row, error)
+                    failed += 1
+                else:
+                    cursor.execute("RELEASE SAVEPOINT row;")
+            stage.rows += len(rows)
+
+    return failed
+
+
+def get_known_keys(
+    cursor: pg_cursor, schema: str = "content"
+) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    Получаем uuid уже загруженных лиц и жанров по имени и названию,
+    чтобы продолжение переноса не создавало их заново.
+    """
+    cursor.execute(f"SELECT full_name, id FROM {schema}.persons;")
+    persons = {full_name: str(key) for full_name, key in cursor.fetchall()}
+    cursor.execute(f"SELECT title, id FROM {schema}.genres;")
+    genres = {title: str(key) for title, key in cursor.fetchall()}
+    return persons, genres
@@ -1,85 +1,120 @@
 import json
+import multiprocessing
+import os
 import sqlite3
+from collections import deque
 from contextlib import contextmanager
-from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Dict, List, Tuple
-from uuid import uuid4
-
-
-@dataclass
-class Movie:
+from itertools import chain
+from operator import itemgetter
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+from urllib.request import pathname2url
+from uuid import UUID, uuid4, uuid5
+
+from config import BATCH_SIZE, SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE
+from stats import Stats
+
+# Записи — именованные кортежи: без __dict__ на каждую строку,
+# а порядок полей совпадает с порядком колонок в Postgres,
+# поэтому записи передаются в INSERT и COPY как есть.
+# created и modified заполняются одной меткой времени на весь запуск.
+
+
+class Movie(NamedTuple):
     id: str
     title: str
     description: str
     rating: float
-    created: datetime = field(default_factory=datetime.now)
-    modified: datetime = field(default_factory=datetime.now)
+    created: datetime
+    modified: datetime
 
 
-@dataclass
-class Person:
+class Person(NamedTuple):
     id: str
     full_name: str
-    created: datetime = field(default_factory=datetime.now)
-    modified: datetime = field(default_factory=datetime.now)
+    created: datetime
+    modified: datetime
 
 
-@dataclass
-class Genre:
+class Genre(NamedTuple):
     id: str
     title: str
-    created: datetime = field(default_factory=datetime.now)
-    modified: datetime = field(default_factory=datetime.now)
+    created: datetime
+    modified: datetime
 
 
-@dataclass
-class MovieGenre:
+class MovieGenre(NamedTuple):
     id: str
     movie_id: str
     genre_id: str
-    created: datetime = field(default_factory=datetime.now)
-    modified: datetime = field(default_factory=datetime.now)
+    created: datetime
+    modified: datetime
 
 
-@dataclass
-class MoviePerson:
+class MoviePerson(NamedTuple):
     id: str
     movie_id: str
     person_id: str
     role: str
-    created: datetime = field(default_factory=datetime.now)
-    modified: datetime = field(default_factory=datetime.now)
+    created: datetime
+    modified: datetime
+
+
+class Batch(NamedTuple):
+    """ Пачка строк, готовых к загрузке в таблицы Postgres. """
 
+    movies: List[Movie]
+    persons: List[Person]
+    genres: List[Genre]
+    movies_persons: List[MoviePerson]
+    movies_genres: List[MovieGenre]
 
-def _dict_factory(cursor: sqlite3.Cursor, row: tuple) -> dict:
+
+def _connect(db_path: str, read_only: bool = False) -> sqlite3.Connection:
     """
-    Так как в SQLite нет встроенной фабрики для строк в виде dict,
-    всё приходится делать самостоятельно
+    В режиме read_only база открывается через URI как неизменяемая:
+    SQLite не берёт блокировок и не проверяет журнал, а файл читается
+    через mmap, поэтому процессы-читатели делят страницы в кеше ОС,
+    а не копируют их каждый в свою кучу.
     """
-    result = {}
-    for idx, col in enumerate(cursor.description):
-        result[col[0]] = row[idx]
-    return result
+    if not read_only:
+        return sqlite3.connect(db_path)
+
+    uri = f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro&immutable=1"
+    conn = sqlite3.connect(uri, uri=True)
+    conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE};")
+    conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB};")
+    conn.execute("PRAGMA temp_store = MEMORY;")
+    return conn
 
 
 @contextmanager
-def conn_context(db_path: str):
+def conn_context(db_path: str, read_only: bool = False):
     """
     В SQLite нет контекстного менеджера для работы с соединениями,
-    поэтому добавляем его тут, чтобы грамотно закрывать соединения
+    поэтому добавляем его тут, чтобы грамотно закрывать соединения.
+    Строки возвращаются обычными кортежами: порядок колонок задают
+    запросы, а кортежи дешевле dict и передаются в пул процессов.
     :param db_path: путь до базы данных
+    :param read_only: открыть базу только для чтения как неизменяемую;
+        файл не должен меняться, пока соединение открыто
     """
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = _dict_factory
+    conn = _connect(db_path, read_only)
     yield conn
     conn.close()
 
 
-def _get_movies(conn: sqlite3.Connection) -> list:
-    """ Получаем все фильмы из SQLite """
-
-    SQL = """
+MOVIES_SQL = """
     /* Используем CTE для читаемости. Здесь нет прироста
     производительности, поэтому можно поменять на subquery */
     WITH x as (
@@ -94,6 +129,7 @@ def _get_movies(conn: sqlite3.Connection) -> list:
         FROM movies m
                  LEFT JOIN movie_actors ma on m.id = ma.movie_id
                  LEFT JOIN actors a on ma.actor_id = a.id
+        WHERE {m_id_range}
         GROUP BY m.id
     )
     -- Получаем список всех фильмов со сценаристами и актёрами
@@ -114,24 +150,296 @@ def _get_movies(conn: sqlite3.Connection) -> list:
     приводим одиночные записи сценаристов к списку
     из одного объекта JSON и кладём всё в поле writers */
     CASE
-        WHEN m.writers = '' THEN '[{"id": "' || m.writer || '"}]'
+        WHEN m.writers = '' THEN '[{{"id": "' || m.writer || '"}}]'
         ELSE m.writers
         END AS writers
     FROM movies m
         LEFT JOIN x ON m.id = x.id
+    /* Фильмы идут по первичному ключу: так перенос можно продолжить
+    с фильма, следующего за последним загруженным (:after),
+    а диапазон (:after, :until] читать в отдельном процессе */
+    WHERE {m_id_range}
+    ORDER BY m.id
+"""
+
+
+def _with_bounds(
+    sql: str, after: Optional[str] = None, until: Optional[str] = None
+) -> Tuple[str, dict]:
+    """
+    Подставляем в запрос условия на id фильма из диапазона (after, until]
+    и получаем запрос с параметрами. Границы None не проверяются: без
+    границ читаются все фильмы, в том числе с id NULL.
+    """
+
+    def in_range(column: str) -> str:
+        conditions = []
+        if after is not None:
+            conditions.append(f"{column} > :after")
+        if until is not None:
+            conditions.append(f"{column} <= :until")
+        return " AND ".join(conditions) or "1"
+
+    sql = sql.format(
+        id_range=in_range("id"),
+        m_id_range=in_range("m.id"),
+        ma_id_range=in_range("ma.movie_id"),
+    )
+    return sql, {"after": after, "until": until}
+
+
+def _get_movies(
+    conn: sqlite3.Connection, after: Optional[str] = None, until: Optional[str] = None
+) -> list:
+    """ Получаем все фильмы из SQLite с id в диапазоне (after, until] """
+    return conn.execute(*_with_bounds(MOVIES_SQL, after, until)).fetchall()
+
+
+def _iter_movies(
+    conn: sqlite3.Connection, batch_size: int, after: Optional[str] = None
+) -> Iterator[list]:
+    """ Читаем фильмы с id больше after пачками не больше batch_size строк """
+    cursor = conn.execute(*_with_bounds(MOVIES_SQL, after))
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        yield rows
+
+
+NORMALIZED_MOVIES_SQL = """
+    SELECT id, title, plot AS description, imdb_rating
+    FROM movies
+    WHERE {id_range}
+    ORDER BY id
+"""
+
+NORMALIZED_GENRES_SQL = """
+    /* Рекурсивно режем строку жанров по запятым:
+    на каждом шаге отрезаем от rest первый элемент */
+    WITH RECURSIVE split(movie_id, genre, rest, ord) AS (
+        SELECT id, NULL, genre || ',', 0
+        FROM movies
+        WHERE {id_range}
+        UNION ALL
+        SELECT movie_id,
+               trim(substr(rest, 1, instr(rest, ',') - 1)),
+               substr(rest, instr(rest, ',') + 1),
+               ord + 1
+        FROM split
+        WHERE rest <> ''
+    )
+    SELECT movie_id, genre
+    FROM split
+    WHERE ord > 0
+    ORDER BY movie_id, ord
+"""
+
+NORMALIZED_PERSONS_SQL = """
+    WITH RECURSIVE directors(movie_id, full_name, rest, ord) AS (
+        SELECT id, NULL, director || ',', 0
+        FROM movies
+        WHERE {id_range}
+        UNION ALL
+        SELECT movie_id,
+               substr(rest, 1, instr(rest, ',') - 1),
+               substr(rest, instr(rest, ',') + 1),
+               ord + 1
+        FROM directors
+        WHERE rest <> ''
+    ),
+    /* Одиночный сценарист записан строкой в writer,
+    несколько сценаристов — списком объектов JSON в writers */
+    movie_writers AS (
+        SELECT id AS movie_id, writer AS writer_id, 0 AS ord
+        FROM movies
+        WHERE writers = '' AND {id_range}
+        UNION ALL
+        SELECT m.id, json_extract(j.value, '$.id'), j.key
+        FROM movies m, json_each(m.writers) j
+        WHERE m.writers <> '' AND {m_id_range}
+    ),
+    /* Один и тот же актёр или сценарист может быть указан у фильма
+    несколько раз: оставляем первое упоминание */
+    persons AS (
+        SELECT ma.movie_id, a.name AS full_name, 0 AS role_ord, min(ma.rowid) AS ord
+        FROM movie_actors ma
+                 JOIN movies m ON m.id = ma.movie_id
+                 JOIN actors a ON a.id = ma.actor_id
+        WHERE a.name <> 'N/A'
+          AND {ma_id_range}
+        GROUP BY ma.movie_id, a.id
+        UNION ALL
+        SELECT movie_id, full_name, 1, ord
+        FROM directors
+        WHERE ord > 0 AND full_name <> 'N/A'
+        UNION ALL
+        SELECT mw.movie_id, w.name, 2, min(mw.ord)
+        FROM movie_writers mw
+                 JOIN writers w ON w.id = mw.writer_id
+        WHERE w.name <> '' AND w.name <> 'N/A'
+        GROUP BY mw.movie_id, mw.writer_id
+    )
+    SELECT movie_id,
+           full_name,
+           CASE role_ord
+               WHEN 0 THEN 'actor'
+               WHEN 1 THEN 'director'
+               ELSE 'writer'
+               END AS role
+    FROM persons
+    ORDER BY movie_id, role_ord, ord
+"""
+
+
+class _GroupedRows:
+    """ Читает строки (movie_id, ...), упорядоченные по movie_id, группами """
+
+    def __init__(self, cursor: sqlite3.Cursor) -> None:
+        self._rows = iter(cursor)
+        self._next = next(self._rows, None)
+
+    def take(self, movie_id: str) -> List[tuple]:
+        """ Забираем все строки фильма movie_id без самого movie_id """
+        result = []
+        while self._next is not None and self._next[0] < movie_id:
+            self._next = next(self._rows, None)
+        while self._next is not None and self._next[0] == movie_id:
+            result.append(self._next[1:])
+            self._next = next(self._rows, None)
+        return result
+
+
+def _iter_normalized_movies(
+    conn: sqlite3.Connection,
+    batch_size: int,
+    after: Optional[str] = None,
+    until: Optional[str] = None,
+) -> Iterator[List[Tuple[tuple, List[str], List[Tuple[str, str]]]]]:
+    """
+    Читаем фильмы с id в диапазоне (after, until] пачками вместе с уже
+    нормализованными жанрами и лицами. Разбор строк делает SQLite,
+    а три запроса упорядочены по id фильма и склеиваются за один проход.
+    """
+    movies = conn.execute(*_with_bounds(NORMALIZED_MOVIES_SQL, after, until))
+    genres = _GroupedRows(
+        conn.execute(*_with_bounds(NORMALIZED_GENRES_SQL, after, until))
+    )
+    persons = _GroupedRows(
+        conn.execute(*_with_bounds(NORMALIZED_PERSONS_SQL, after, until))
+    )
+
+    while True:
+        rows = movies.fetchmany(batch_size)
+        if not rows:
+            break
+        yield [
+            (
+                row,
+                [genre for genre, in genres.take(row[0])],
+                persons.take(row[0]),
+            )
+            for row in rows
+        ]
+
+
+SHARD_BOUNDS_SQL = """
+    -- id каждого size-го фильма после :after: границы диапазонов для читателей
+    SELECT id
+    FROM (
+        SELECT id, row_number() OVER (ORDER BY id) AS n
+        FROM movies
+        WHERE {id_range}
+    )
+    WHERE n % :size = 0
+"""
+
+NULL_IDS_SQL = "SELECT count(*) FROM movies WHERE id IS NULL"
+
+
+def _shard_ranges(
+    conn: sqlite3.Connection, size: int, after: Optional[str] = None
+) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    Делим фильмы после after на диапазоны (after, until] по size фильмов.
+    У первого диапазона без after и у последнего нет границы.
+    Фильм с id NULL не попадает ни в один диапазон, поэтому с такими
+    фильмами делить нельзя.
     """
+    (null_ids,) = conn.execute(NULL_IDS_SQL).fetchone()
+    if null_ids:
+        raise ValueError(f"{null_ids} movies have a NULL id and cannot be sharded")
+    sql, params = _with_bounds(SHARD_BOUNDS_SQL, after)
+    rows = conn.execute(sql, {**params, "size": size})
+    bounds = [after, *(movie_id for movie_id, in rows), None]
+    return list(zip(bounds, bounds[1:]))
 
-    return conn.execute(SQL).fetchall()
+
+# Соединение SQLite в процессе-читателе, открывается в _init_reader
+_reader_conn: Optional[sqlite3.Connection] = None
+
+
+def _init_reader(db_path: str) -> None:
+    global _reader_conn
+    _reader_conn = _connect(db_path, read_only=True)
+
+
+def _read_shard(
+    normalized: bool, size: int, after: Optional[str], until: Optional[str]
+) -> list:
+    """ Читаем в процессе-читателе не больше size фильмов из (after, until] """
+    if normalized:
+        movies = _iter_normalized_movies(_reader_conn, size, after, until)
+        return next(movies, [])
+    return _get_movies(_reader_conn, after, until)
+
+
+def _iter_sharded_movies(
+    conn: sqlite3.Connection,
+    batch_size: int,
+    readers: int,
+    after: Optional[str] = None,
+    normalized: bool = False,
+) -> Iterator[list]:
+    """
+    Читаем фильмы в readers процессах: каждая пачка — это отдельный
+    диапазон id, который читатель выбирает своим соединением.
+    Пачки отдаются в порядке id, а вперёд читается не больше
+    2 * readers пачек, чтобы быстрые читатели не копили их в памяти.
+    """
+    db_path = conn.execute("PRAGMA database_list;").fetchone()[2]
+    ranges = _shard_ranges(conn, batch_size, after)
+    window = 2 * readers
+
+    with multiprocessing.Pool(
+        readers, initializer=_init_reader, initargs=(db_path,)
+    ) as pool:
+        pending: Deque = deque()
+        for bounds in ranges:
+            pending.append(
+                pool.apply_async(_read_shard, (normalized, batch_size, *bounds))
+            )
+            if len(pending) < window:
+                continue
+            rows = pending.popleft().get()
+            if rows:
+                yield rows
+        while pending:
+            rows = pending.popleft().get()
+            if rows:
+                yield rows
 
 
 def _get_writers(conn: sqlite3.Connection) -> Dict[str, str]:
     """ Получаем всех сценаристов из SQLite """
 
     SQL = "SELECT DISTINCT id, name FROM writers;"
-    result = {}
-    for row in conn.execute(SQL):
-        result[row["id"]] = row["name"]
-    return result
+    return dict(conn.execute(SQL))
+
+
+# Пространство имён для детерминированных ключей. Менять нельзя:
+# иначе повторная миграция не узнает уже загруженные строки.
+KEY_NAMESPACE = UUID("6f1c3e2a-5b0d-4c1e-9a57-0d3b8f4e2c71")
 
 
 def _get_new_key() -> str:
@@ -139,135 +447,437 @@ def _get_new_key() -> str:
     return str(uuid4())
 
 
-class Extractor:
-    """ Подготоваливает списки для загрузки в таблицы """
+def _get_stable_key(kind: str, *parts: str) -> str:
+    """ Получаем ключ, который зависит только от исходных данных """
+    return str(uuid5(KEY_NAMESPACE, "\x1f".join((kind,) + parts)))
 
-    def __init__(self, conn: sqlite3.Connection) -> None:
-        self._conn = conn
-        self.movies: List[Movie] = []
-        self.persons: Dict[str, str] = {}
-        self.genres: Dict[str, str] = {}
-        self.movies_genres: List[MovieGenre] = []
-        self.movies_persons: List[MoviePerson] = []
 
-    def _get_movies(self) -> list:
-        """ Получаем все фильмы из SQLite """
-        return _get_movies(self._conn)
+def clean_movie(description: str, imdb_rating: str) -> Tuple[str, float]:
+    """ Описание N/A заменяем пустым, нечисловой рейтинг — нулём """
+    if description == "N/A":
+        description = ""
 
-    def _get_writers(self) -> Dict[str, str]:
-        """ Получаем всех сценаристов из SQLite """
-        return _get_writers(self._conn)
+    try:
+        rating = float(imdb_rating)
+    except ValueError:
+        rating = float(0)
 
-    def _process_genres(self, raw_movie_data: dict) -> None:
-        """ Присваиваем uuid. Добавляем жанры в результирующие списки. """
-        for genre in raw_movie_data["genre"].split(","):
-            genre_uuid = self.genres.setdefault(genre.strip(), _get_new_key())
-            self.movies_genres.append(
-                MovieGenre(
-                    id=_get_new_key(),
-                    movie_id=raw_movie_data["id"],
-                    genre_id=genre_uuid,
-                )
+    return description, rating
+
+
+class ParsedMovie(NamedTuple):
+    """
+    Фильм после разбора строки SQLite. Лица и жанры пока указаны
+    по именам: uuid им присваивает Extractor, который видит все фильмы.
+    """
+
+    movie: Movie
+    # (id связи, название жанра)
+    genres: List[Tuple[str, str]]
+    # (id связи, имя, роль)
+    persons: List[Tuple[str, str, str]]
+
+
+class MovieParser:
+    """
+    Разбирает строки фильмов из SQLite. Не хранит состояния между
+    фильмами, поэтому может работать в отдельных процессах.
+    """
+
+    def __init__(
+        self, writers: Dict[str, str], now: datetime, stable_keys: bool = False
+    ) -> None:
+        self._writers = writers
+        self._now = now
+        self._stable_keys = stable_keys
+
+    def _get_key(self, kind: str, *parts: str) -> str:
+        """
+        Получаем ключ для строки. В режиме stable_keys ключ строится
+        как uuid5 от исходных данных и совпадает между запусками.
+        """
+        if self._stable_keys:
+            return _get_stable_key(kind, *parts)
+        return _get_new_key()
+
+    def _get_genre_link_key(self, movie_id: str, title: str) -> str:
+        """ Получаем ключ связи фильма и жанра. """
+        if self._stable_keys:
+            return _get_stable_key(
+                "movie_genre", movie_id, _get_stable_key("genre", title)
             )
+        return _get_new_key()
 
-    def _process_persons(self, raw_movie_data: dict, writers: dict) -> None:
-        """ Присваиваем uuid. Добавляем лица в результирующие списки. """
+    def _get_person_link_key(self, movie_id: str, full_name: str, role: str) -> str:
+        """ Получаем ключ связи фильма и лица. """
+        if self._stable_keys:
+            return _get_stable_key(
+                "movie_person", movie_id, _get_stable_key("person", full_name), role
+            )
+        return _get_new_key()
+
+    def _parse_genres(self, movie_id: str, genres: str) -> List[Tuple[str, str]]:
+        """ Разбираем жанры фильма. """
+        result = []
+        for genre in genres.split(","):
+            title = genre.strip()
+            result.append((self._get_genre_link_key(movie_id, title), title))
+        return result
+
+    def _parse_persons(
+        self,
+        movie_id: str,
+        directors: str,
+        actors_ids: str,
+        actors_names: str,
+        writers: str,
+    ) -> List[Tuple[str, str, str]]:
+        """ Разбираем актёров, режиссёров и сценаристов фильма. """
+        result = []
 
         set_of_actors = set()
-        for actor_id, actor_name in zip(
-            raw_movie_data["actors_ids"].split(","),
-            raw_movie_data["actors_names"].split(","),
-        ):
+        for actor_id, actor_name in zip(actors_ids.split(","), actors_names.split(",")):
             if actor_name != "N/A" and actor_id not in set_of_actors:
                 set_of_actors.add(actor_id)
-                person_uuid = self.persons.setdefault(actor_name, _get_new_key())
-                self.movies_persons.append(
-                    MoviePerson(
-                        id=_get_new_key(),
-                        movie_id=raw_movie_data["id"],
-                        person_id=person_uuid,
-                        role="actor",
+                result.append(
+                    (
+                        self._get_person_link_key(movie_id, actor_name, "actor"),
+                        actor_name,
+                        "actor",
                     )
                 )
 
-        for director in raw_movie_data["director"].split(","):
+        for director in directors.split(","):
             if director != "N/A":
-                person_uuid = self.persons.setdefault(director, _get_new_key())
-                self.movies_persons.append(
-                    MoviePerson(
-                        id=_get_new_key(),
-                        movie_id=raw_movie_data["id"],
-                        person_id=person_uuid,
-                        role="director",
+                result.append(
+                    (
+                        self._get_person_link_key(movie_id, director, "director"),
+                        director,
+                        "director",
                     )
                 )
 
         set_of_writers = set()
-        for writer in json.loads(raw_movie_data["writers"]):
-            writer_name = writers.get(writer["id"])
+        for writer in json.loads(writers):
+            writer_name = self._writers.get(writer["id"])
             if (
                 writer_name
                 and writer_name != "N/A"
                 and writer["id"] not in set_of_writers
             ):
                 set_of_writers.add(writer["id"])
-                person_uuid = self.persons.setdefault(writer_name, _get_new_key())
-                self.movies_persons.append(
-                    MoviePerson(
-                        id=_get_new_key(),
-                        movie_id=raw_movie_data["id"],
-                        person_id=person_uuid,
-                        role="writer",
+                result.append(
+                    (
+                        self._get_person_link_key(movie_id, writer_name, "writer"),
+                        writer_name,
+                        "writer",
                     )
                 )
 
-    def _process_movie_data(self, writers: dict, raw_movie_data: dict) -> None:
+        return result
+
+    def _parse_movie(
+        self, source_id: str, title: str, description: str, imdb_rating: str
+    ) -> Movie:
         """ Очищаем данные, значения N/A заменяем на None. Присваиваем uuid фильму. """
 
-        raw_movie_data["id"] = _get_new_key()
+        description, rating = clean_movie(description, imdb_rating)
+
+        return Movie(
+            id=self._get_key("movie", source_id),
+            title=title,
+            description=description,
+            rating=rating,
+            created=self._now,
+            modified=self._now,
+        )
+
+    def parse(self, raw_movie_data: tuple) -> ParsedMovie:
+        """ Разбираем строку MOVIES_SQL вместе с жанрами и лицами фильма. """
+        (
+            source_id,
+            genres,
+            directors,
+            title,
+            description,
+            imdb_rating,
+            actors_ids,
+            actors_names,
+            writers,
+        ) = raw_movie_data
+        movie = self._parse_movie(source_id, title, description, imdb_rating)
+        return ParsedMovie(
+            movie=movie,
+            genres=self._parse_genres(movie.id, genres),
+            persons=self._parse_persons(
+                movie.id, directors, actors_ids, actors_names, writers
+            ),
+        )
+
+    def parse_normalized(
+        self,
+        raw_movie_data: tuple,
+        genres: List[str],
+        persons: List[Tuple[str, str]],
+    ) -> ParsedMovie:
+        """ Собираем фильм из строк, которые уже нормализовал SQLite. """
+        movie = self._parse_movie(*raw_movie_data)
+        return ParsedMovie(
+            movie=movie,
+            genres=[(self._get_genre_link_key(movie.id, t), t) for t in genres],
+            persons=[
+                (self._get_person_link_key(movie.id, name, role), name, role)
+                for name, role in persons
+            ],
+        )
+
+
+# Разборщик фильмов в процессе-воркере, создаётся в _init_worker
+_worker_parser: Optional[MovieParser] = None
+
+
+def _init_worker(parser: MovieParser) -> None:
+    """ Сохраняем разборщик в воркере, чтобы не передавать его с каждой задачей """
+    global _worker_parser
+    _worker_parser = parser
 
-        description = raw_movie_data["description"]
-        if description == "N/A":
-            description = ""
 
-        try:
-            imdb_rating = float(raw_movie_data["imdb_rating"])
-        except ValueError:
-            imdb_rating = float(0)
+def _parse_chunk(raw_movies: List[tuple]) -> List[ParsedMovie]:
+    """ Разбираем часть пачки фильмов в процессе-воркере """
+    return [_worker_parser.parse(raw_movie_data) for raw_movie_data in raw_movies]
 
-        self._process_genres(raw_movie_data)
-        self._process_persons(raw_movie_data, writers)
 
-        self.movies.append(
-            Movie(
-                id=raw_movie_data["id"],
-                title=raw_movie_data["title"],
-                description=description,
-                rating=imdb_rating,
+def _split(rows: list, parts: int) -> List[list]:
+    """ Делим пачку на parts примерно равных частей с сохранением порядка """
+    size = -(-len(rows) // parts)
+    return [rows[i : i + size] for i in range(0, len(rows), size)]
+
+
+class Extractor:
+    """ Подготоваливает списки для загрузки в таблицы """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        stable_keys: bool = False,
+        workers: int = 1,
+        normalize_in_sql: bool = False,
+        stats: Optional[Stats] = None,
+        after: Optional[str] = None,
+        readers: int = 1,
+    ) -> None:
+        """
+        :param stable_keys: строить uuid5 от исходных данных вместо uuid4
+        :param workers: количество процессов для разбора фильмов
+        :param normalize_in_sql: разбирать жанры и лица запросами SQLite
+        :param stats: куда записывать время стадий extract и transform
+        :param after: читать только фильмы с id больше after;
+            None — все фильмы
+        :param readers: количество процессов для чтения SQLite
+        """
+        self._conn = conn
+        self._stable_keys = stable_keys
+        self._workers = workers
+        self._normalize_in_sql = normalize_in_sql
+        self._after = after
+        self._readers = readers
+        # id последнего фильма каждой прочитанной, но ещё не подтверждённой пачки
+        self._read_ids: Deque[str] = deque()
+        self._now = datetime.now()
+        self.stats = stats or Stats()
+        self.movies: List[Movie] = []
+        self.persons: Dict[str, str] = {}
+        self.genres: Dict[str, str] = {}
+        self.movies_genres: List[MovieGenre] = []
+        self.movies_persons: List[MoviePerson] = []
+        self._new_persons: List[Person] = []
+        self._new_genres: List[Genre] = []
+        self._parser: Optional[MovieParser] = None
+
+    def _get_movies(self) -> list:
+        """ Получаем все фильмы из SQLite """
+        return _get_movies(self._conn, self._after)
+
+    def _track(self, batches: Iterator[list], get_id: Callable) -> Iterator[list]:
+        """ Запоминаем id последнего фильма каждой пачки для pop_checkpoint """
+        for rows in batches:
+            self._read_ids.append(get_id(rows[-1]))
+            yield rows
+
+    def _iter_movies(self, batch_size: int) -> Iterator[list]:
+        """ Читаем фильмы из SQLite пачками, время чтения идёт в стадию extract """
+        if self._readers > 1:
+            movies_batches = _iter_sharded_movies(
+                self._conn, batch_size, self._readers, self._after
+            )
+        else:
+            movies_batches = _iter_movies(self._conn, batch_size, self._after)
+        return self._track(self.stats.timed("extract", movies_batches), itemgetter(0))
+
+    def pop_checkpoint(self) -> str:
+        """
+        Получаем id последнего фильма самой ранней из выданных пачек.
+        Пачки выдаются и записываются строго по порядку, поэтому вызов
+        после записи очередной пачки возвращает id, с которого
+        можно продолжить перенос.
+        """
+        return self._read_ids.popleft()
+
+    def _get_writers(self) -> Dict[str, str]:
+        """ Получаем всех сценаристов из SQLite """
+        return _get_writers(self._conn)
+
+    def _get_parser(self) -> MovieParser:
+        """ Разборщик создаётся один раз: ему нужен справочник сценаристов """
+        if self._parser is None:
+            writers = {} if self._normalize_in_sql else self._get_writers()
+            self._parser = MovieParser(writers, self._now, self._stable_keys)
+        return self._parser
+
+    def _get_key(self, kind: str, *parts: str) -> str:
+        """
+        Получаем ключ для строки. В режиме stable_keys ключ строится
+        как uuid5 от исходных данных и совпадает между запусками.
+        """
+        if self._stable_keys:
+            return _get_stable_key(kind, *parts)
+        return _get_new_key()
+
+    def _get_person_key(self, full_name: str) -> str:
+        """ Получаем uuid лица. Новое лицо попадает в текущую пачку. """
+        key = self.persons.get(full_name)
+        if key is None:
+            key = self.persons[full_name] = self._get_key("person", full_name)
+            self._new_persons.append(Person(key, full_name, self._now, self._now))
+        return key
+
+    def _get_genre_key(self, title: str) -> str:
+        """ Получаем uuid жанра. Новый жанр попадает в текущую пачку. """
+        key = self.genres.get(title)
+        if key is None:
+            key = self.genres[title] = self._get_key("genre", title)
+            self._new_genres.append(Genre(key, title, self._now, self._now))
+        return key
+
+    def _process_movie_data(self, parsed: ParsedMovie) -> None:
+        """ Присваиваем uuid лицам и жанрам, добавляем фильм в пачку. """
+        movie = parsed.movie
+        self.movies.append(movie)
+
+        now = self._now
+
+        for link_id, title in parsed.genres:
+            self.movies_genres.append(
+                MovieGenre(link_id, movie.id, self._get_genre_key(title), now, now)
             )
+
+        for link_id, full_name, role in parsed.persons:
+            self.movies_persons.append(
+                MoviePerson(
+                    link_id, movie.id, self._get_person_key(full_name), role, now, now
+                )
+            )
+
+    def _flush_batch(self) -> Batch:
+        """ Отдаём накопленную пачку и начинаем новую. """
+        batch = Batch(
+            self.movies,
+            self._new_persons,
+            self._new_genres,
+            self.movies_persons,
+            self.movies_genres,
+        )
+        self.movies, self._new_persons, self._new_genres = [], [], []
+        self.movies_persons, self.movies_genres = [], []
+        return batch
+
+    def _process_batch(self, parsed_movies: Iterable[ParsedMovie]) -> Batch:
+        """ Собираем пачку из разобранных фильмов. """
+        with self.stats.stage("transform") as stage:
+            for parsed in parsed_movies:
+                self._process_movie_data(parsed)
+            stage.rows += len(self.movies)
+            return self._flush_batch()
+
+    def _iter_parallel_batches(
+        self, parser: MovieParser, batch_size: int
+    ) -> Iterator[Batch]:
+        """
+        Разбираем фильмы в пуле процессов. Пачка делится на части
+        по числу воркеров, части разбираются параллельно, а результаты
+        склеиваются в исходном порядке, поэтому лица и жанры получают
+        uuid в том же порядке, что и при последовательном разборе.
+        Пока основной процесс собирает пачку N, воркеры уже разбирают N+1.
+        """
+        with multiprocessing.Pool(
+            self._workers, initializer=_init_worker, initargs=(parser,)
+        ) as pool:
+            pending = None
+            for raw_movies in self._iter_movies(batch_size):
+                result = pool.map_async(_parse_chunk, _split(raw_movies, self._workers))
+                if pending is not None:
+                    yield self._process_batch(chain.from_iterable(pending.get()))
+                pending = result
+            if pending is not None:
+                yield self._process_batch(chain.from_iterable(pending.get()))
+
+    def iter_raw_batches(self, batch_size: int = BATCH_SIZE) -> Iterator[list]:
+        """
+        Читаем строки SQLite пачками без разбора, время идёт в стадию extract.
+        Соединение SQLite нельзя использовать из других потоков,
+        поэтому вызывать нужно в потоке, который его открыл.
+        """
+        self._get_parser()
+        if not self._normalize_in_sql:
+            return self._iter_movies(batch_size)
+
+        if self._readers > 1:
+            movies_batches = _iter_sharded_movies(
+                self._conn, batch_size, self._readers, self._after, normalized=True
+            )
+        else:
+            movies_batches = _iter_normalized_movies(
+                self._conn, batch_size, self._after
+            )
+        return self._track(
+            self.stats.timed("extract", movies_batches), lambda movie: movie[0][0]
         )
 
+    def transform(self, raw_movies: list) -> Batch:
+        """ Разбираем пачку из iter_raw_batches и собираем из неё пачку для загрузки """
+        parser = self._get_parser()
+        if self._normalize_in_sql:
+            return self._process_batch(
+                parser.parse_normalized(*movie) for movie in raw_movies
+            )
+        return self._process_batch(map(parser.parse, raw_movies))
+
+    def iter_batches(self, batch_size: int = BATCH_SIZE) -> Iterator[Batch]:
+        """
+        Получаем данные для таблиц пачками. Каждая пачка содержит
+        фильмы из batch_size строк SQLite, их связи, а также лица
+        и жанры, которые ещё не попадали в предыдущие пачки.
+        В режиме normalize_in_sql разбирать в Python нечего,
+        поэтому пул процессов не используется.
+        """
+        if self._workers > 1 and not self._normalize_in_sql:
+            yield from self._iter_parallel_batches(self._get_parser(), batch_size)
+            return
+
+        for raw_movies in self.iter_raw_batches(batch_size):
+            yield self.transform(raw_movies)
+
     def get_data(
         self
     ) -> Tuple[
         List[Movie], List[Person], List[Genre], List[MoviePerson], List[MovieGenre]
     ]:
         """ Получаем обобщенные данные для таблиц. """
+        result = Batch([], [], [], [], [])
 
-        raw_movies = self._get_movies()
-        writers = self._get_writers()
-
-        for raw_movie_data in raw_movies:
-            self._process_movie_data(writers, raw_movie_data)
-
-        persons = [Person(id=v, full_name=k) for k, v in self.persons.items()]
-        genres = [Genre(id=v, title=k) for k, v in self.genres.items()]
-
-        return self.movies, persons, genres, self.movies_persons, self.movies_genres
-
+        for batch in self.iter_batches():
+            for rows, batch_rows in zip(result, batch):
+                rows.extend(batch_rows)
 
-if __name__ == "__main__":
-    with conn_context("db.sqlite") as sqlite_conn:
-        extractor = Extractor(sqlite_conn)
+        return result
 
-    data = extractor.get_data()
@@ -0,0 +1,161 @@
+"""
+Перезагрузка без простоя через промежуточную схему.
+
+Данные загружаются в копии таблиц content.* в схеме content_staging,
+без индексов и, по желанию, как UNLOGGED. Затем таблицы переводятся
+в LOGGED, получают индексы и ключи по образцу живых таблиц и в одной
+короткой транзакции меняются местами с живыми. Админка до этого момента
+видит старые данные, после него — новые, и никогда — наполовину
+загруженные.
+
+Меняются местами именно таблицы, а не схемы целиком: в content
+живут ещё и таблицы Django.
+"""
+import logging
+from typing import Optional
+
+from indexes import TABLES, capture, execute_parallel, rebuild, retarget
+from psycopg2 import sql
+from psycopg2.extensions import connection as _connection
+from stats import Stats
+
+logger = logging.getLogger(__name__)
+
+STAGING_SCHEMA = "content_staging"
+
+# Пользовательские триггеры таблиц, например заполнение search_vector
+TRIGGERS_SQL = """
+    SELECT pg_get_triggerdef(t.oid)
+    FROM pg_trigger t
+             JOIN pg_class c ON c.oid = t.tgrelid
+             JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = %s
+      AND c.relname = ANY(%s)
+      AND NOT t.tgisinternal
+"""
+
+
+def _table(schema: str, table: str) -> sql.Composed:
+    return sql.SQL("{}.{}").format(sql.Identifier(schema), sql.Identifier(table))
+
+
+def create_staging(
+    conn: _connection,
+    live: str = "content",
+    staging: str = STAGING_SCHEMA,
+    unlogged: bool = False,
+) -> None:
+    """
+    Пересоздаём промежуточную схему с пустыми копиями живых таблиц.
+    Копируются колонки, значения по умолчанию, CHECK и триггеры,
+    чтобы вычисляемые триггерами колонки заполнялись при загрузке,
+    но не индексы и не ключи: они строятся уже после загрузки.
+    """
+    create = "CREATE UNLOGGED TABLE" if unlogged else "CREATE TABLE"
+    with conn.cursor() as cursor:
+        cursor.execute(
+            sql.SQL("DROP SCHEMA IF EXISTS {0} CASCADE; CREATE SCHEMA {0};").format(
+                sql.Identifier(staging)
+            )
+        )
+        for table in TABLES:
+            cursor.execute(
+                sql.SQL(
+                    create + " {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS);"
+                ).format(_table(staging, table), _table(live, table))
+            )
+
+        cursor.execute("SET LOCAL search_path = pg_catalog;")
+        cursor.execute(TRIGGERS_SQL, (live, list(TABLES)))
+        for (definition,) in cursor.fetchall():
+            cursor.execute(definition.replace(f" ON {live}.", f" ON {staging}.", 1))
+    conn.commit()
+
+
+def prepare(
+    conn: _connection,
+    dsl: dict,
+    live: str = "content",
+    staging: str = STAGING_SCHEMA,
+    unlogged: bool = False,
+    jobs: int = 4,
+    maintenance_work_mem: str = "1GB",
+    stats: Optional[Stats] = None,
+) -> None:
+    """
+    Доводим загруженные таблицы до вида живых: переводим в LOGGED,
+    строим индексы и ключи по определениям из живой схемы
+    и собираем статистику для планировщика.
+    Тяжёлая работа идёт в промежуточной схеме и не мешает чтению живых таблиц.
+    """
+    stats = stats or Stats()
+
+    with conn.cursor() as cursor:
+        objects = retarget(capture(cursor, live, primary_keys=True), live, staging)
+    conn.commit()
+
+    if unlogged:
+        with stats.stage("staging.set_logged"):
+            execute_parallel(
+                dsl,
+                [
+                    [sql.SQL("ALTER TABLE {} SET LOGGED;").format(_table(staging, t))]
+                    for t in TABLES
+                ],
+                jobs,
+                maintenance_work_mem,
+            )
+
+    rebuild(dsl, objects, jobs, maintenance_work_mem, stats)
+
+    with stats.stage("staging.analyze"):
+        execute_parallel(
+            dsl,
+            [[sql.SQL("ANALYZE {};").format(_table(staging, t))] for t in TABLES],
+            jobs,
+            maintenance_work_mem,
+        )
+
+
+def swap(
+    conn: _connection,
+    live: str = "content",
+    staging: str = STAGING_SCHEMA,
+    keep_old: bool = False,
+    lock_timeout: str = "5s",
+) -> None:
+    """
+    В одной транзакции переносим живые таблицы в схему <live>_old,
+    а таблицы из промежуточной схемы — на их место.
+    Индексы и внешние ключи переезжают вместе с таблицами.
+    lock_timeout не даёт переключению надолго встать в очередь
+    за длинным запросом и заблокировать чтение всем остальным.
+    С keep_old=True старые таблицы остаются в <live>_old для отката.
+    """
+    old = f"{live}_old"
+    with conn.cursor() as cursor:
+        cursor.execute("SET LOCAL lock_timeout = %s;", (lock_timeout,))
+        cursor.execute(
+            sql.SQL("DROP SCHEMA IF EXISTS {0} CASCADE; CREATE SCHEMA {0};").format(
+                sql.Identifier(old)
+            )
+        )
+        for table in TABLES:
+            cursor.execute(
+                sql.SQL("ALTER TABLE {} SET SCHEMA {};").format(
+                    _table(live, table), sql.Identifier(old)
+                )
+            )
+            cursor.execute(
+                sql.SQL("ALTER TABLE {} SET SCHEMA {};").format(
+                    _table(staging, table), sql.Identifier(live)
+                )
+            )
+        cursor.execute(sql.SQL("DROP SCHEMA {};").format(sql.Identifier(staging)))
+        if not keep_old:
+            cursor.execute(
+                sql.SQL("DROP SCHEMA {} CASCADE;").format(sql.Identifier(old))
+            )
+    conn.commit()
+
+    logger.info("Swapped %s tables into %s", staging, live)
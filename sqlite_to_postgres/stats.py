@@ -0,0 +1,134 @@
+import logging
+import os
+import resource
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, Iterator
+
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def peak_rss_mb() -> float:
+    """
+    Пиковое потребление памяти процессом и его воркерами с начала
+    работы процесса, МБ. Значение только растёт, поэтому по нему не
+    понять, какая стадия заняла память.
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # В Linux ru_maxrss измеряется в килобайтах
+    return max(rss, children) / 1024
+
+
+def current_rss_mb() -> float:
+    """ Память, которую процесс занимает сейчас, МБ """
+    with open("/proc/self/statm") as statm:
+        resident_pages = int(statm.read().split()[1])
+    return resident_pages * PAGE_SIZE / 2**20
+
+
+@dataclass
+class StageStats:
+    seconds: float = 0.0
+    rows: int = 0
+    calls: int = 0
+    # Сколько памяти процесса прибавилось за вызовы стадии в сумме
+    # и сколько её было в начале или конце вызова самое большее
+    rss_delta_mb: float = 0.0
+    max_rss_mb: float = 0.0
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+class Stats:
+    """ Собирает время, количество строк и память по стадиям миграции. """
+
+    def __init__(self, progress_interval: float = 30.0) -> None:
+        """
+        :param progress_interval: как часто, в секундах, log_progress
+            пишет строку прогресса
+        """
+        self.stages: Dict[str, StageStats] = {}
+        # Доля времени, которую стадия конвейера была занята, см. pipeline.py
+        self.utilisation: Dict[str, float] = {}
+        self._started = time.perf_counter()
+        self._progress_interval = progress_interval
+        self._last_progress = self._started
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageStats]:
+        """ Замеряем время блока и добавляем его к стадии name """
+        stage = self.stages.setdefault(name, StageStats())
+        rss_before = current_rss_mb()
+        started = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage.seconds += time.perf_counter() - started
+            stage.calls += 1
+            rss_after = current_rss_mb()
+            stage.rss_delta_mb += rss_after - rss_before
+            stage.max_rss_mb = max(stage.max_rss_mb, rss_before, rss_after)
+
+    def record(self, name: str, seconds: float, rows: int = 0) -> None:
+        """
+        Добавляем к стадии name замер, сделанный в другом потоке.
+        Память в начале вызова неизвестна, поэтому учитывается
+        только текущая.
+        """
+        stage = self.stages.setdefault(name, StageStats())
+        stage.seconds += seconds
+        stage.rows += rows
+        stage.calls += 1
+        stage.max_rss_mb = max(stage.max_rss_mb, current_rss_mb())
+
+    def timed(self, name: str, batches: Iterable[list]) -> Iterator[list]:
+        """ Оборачиваем итератор пачек: время next() и размер пачки идут в name """
+        iterator = iter(batches)
+        while True:
+            with self.stage(name) as stage:
+                batch = next(iterator, None)
+            if batch is None:
+                return
+            stage.rows += len(batch)
+            yield batch
+
+    def _rows(self, prefix: str) -> int:
+        return sum(
+            stage.rows for name, stage in self.stages.items() if name.startswith(prefix)
+        )
+
+    def log_progress(self, logger: logging.Logger, force: bool = False) -> None:
+        """ Пишем строку прогресса не чаще раза в progress_interval секунд """
+        now = time.perf_counter()
+        if not force and now - self._last_progress < self._progress_interval:
+            return
+        self._last_progress = now
+
+        elapsed = now - self._started
+        movies = self.stages.get("transform", StageStats()).rows
+        logger.info(
+            "Progress: %d movies (%.0f/s), %d rows loaded (%.0f/s), "
+            "%.0f s elapsed, process peak RSS %.0f MB",
+            movies,
+            movies / elapsed if elapsed else 0,
+            self._rows("load."),
+            self._rows("load.") / elapsed if elapsed else 0,
+            elapsed,
+            peak_rss_mb(),
+        )
+
+    def as_dict(self) -> dict:
+        return {
+            "wall_seconds": time.perf_counter() - self._started,
+            "process_peak_rss_mb": peak_rss_mb(),
+            "utilisation": self.utilisation,
+            "stages": {
+                name: dict(asdict(stage), rows_per_sec=stage.rows_per_sec)
+                for name, stage in self.stages.items()
+            },
+        }
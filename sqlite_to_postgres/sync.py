@@ -0,0 +1,215 @@
+"""
+Инкрементальная синхронизация SQLite -> Postgres по отпечаткам строк.
+
+В SQLite нет времени изменения строк, поэтому для каждого фильма
+считается отпечаток: md5 от строки фильма вместе с жанрами, режиссёрами,
+актёрами и именами сценаристов. Отпечатки хранятся рядом с данными
+в content.migration_fingerprints. При следующем запуске строки SQLite
+по-прежнему читаются целиком — это дёшево, — но разбираются
+и пишутся в Postgres только новые и изменившиеся фильмы.
+
+Ключи строятся через uuid5, поэтому у фильма, лица и жанра тот же id,
+что и при прошлой загрузке. Связи изменившегося фильма удаляются
+и вставляются заново, сам фильм, лица и жанры обновляются через upsert.
+Первую загрузку для синхронизации нужно делать с --stable-keys
+(или начинать синхронизацию с пустых таблиц). Отпечатки считаются
+по сырым строкам и зависят от --normalize-in-sql: после смены режима
+все фильмы один раз перезаписываются как изменившиеся.
+
+Запуск: python sync.py --sqlite db.sqlite [--delete-missing]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import sqlite3
+from typing import Dict, List, Optional
+
+import config
+import psycopg2
+from postgres import BACKENDS, save_all_data
+from psycopg2.extensions import connection as _connection
+from psycopg2.extras import execute_values
+from sqlite import Extractor, _get_stable_key, _get_writers, conn_context
+from stats import Stats
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINTS_DDL = """
+    CREATE TABLE IF NOT EXISTS {schema}.migration_fingerprints (
+        movie_id     TEXT PRIMARY KEY,
+        fingerprint  TEXT NOT NULL,
+        film_work_id UUID NOT NULL,
+        synced       TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+    );
+"""
+
+
+def fingerprint(raw_movie: tuple, writers: Dict[str, str]) -> str:
+    """
+    Отпечаток строки MOVIES_SQL. Сценаристы в строке указаны только
+    по id, поэтому их имена добавляются из writers: переименование
+    сценариста тоже меняет отпечаток.
+    """
+    writer_names = [
+        writers.get(writer["id"]) for writer in json.loads(raw_movie[-1] or "[]")
+    ]
+    data = repr((raw_movie, writer_names)).encode()
+    return hashlib.md5(data).hexdigest()
+
+
+def fingerprint_normalized(raw_movie: tuple) -> str:
+    """ Отпечаток фильма, уже нормализованного запросами SQLite """
+    return hashlib.md5(repr(raw_movie).encode()).hexdigest()
+
+
+def _get_fingerprints(pg_conn: _connection, schema: str) -> Dict[str, str]:
+    with pg_conn.cursor() as cursor:
+        cursor.execute(FINGERPRINTS_DDL.format(schema=schema))
+        cursor.execute(
+            f"SELECT movie_id, fingerprint FROM {schema}.migration_fingerprints;"
+        )
+        return dict(cursor.fetchall())
+
+
+def _save_fingerprints(
+    pg_conn: _connection, schema: str, fingerprints: Dict[str, str]
+) -> None:
+    with pg_conn.cursor() as cursor:
+        execute_values(
+            cursor,
+            f"INSERT INTO {schema}.migration_fingerprints"
+            f"(movie_id, fingerprint, film_work_id) VALUES %s "
+            f"ON CONFLICT (movie_id) DO UPDATE SET "
+            f"fingerprint = EXCLUDED.fingerprint, synced = now()",
+            [
+                (movie_id, value, _get_stable_key("movie", movie_id))
+                for movie_id, value in fingerprints.items()
+            ],
+        )
+
+
+def _delete_links(pg_conn: _connection, schema: str, movie_ids: List[str]) -> None:
+    """ Удаляем связи фильмов: актуальные будут вставлены заново """
+    keys = [_get_stable_key("movie", movie_id) for movie_id in movie_ids]
+    with pg_conn.cursor() as cursor:
+        for table in ("film_works_persons", "film_works_genres"):
+            cursor.execute(
+                f"DELETE FROM {schema}.{table} WHERE film_work_id = ANY(%s::uuid[]);",
+                (keys,),
+            )
+
+
+def _delete_movies(pg_conn: _connection, schema: str, movie_ids: List[str]) -> None:
+    """ Удаляем фильмы, пропавшие из SQLite; связи удалит ON DELETE CASCADE """
+    keys = [_get_stable_key("movie", movie_id) for movie_id in movie_ids]
+    with pg_conn.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {schema}.film_work WHERE id = ANY(%s::uuid[]);", (keys,)
+        )
+        cursor.execute(
+            f"DELETE FROM {schema}.migration_fingerprints WHERE movie_id = ANY(%s);",
+            (movie_ids,),
+        )
+
+
+def sync(
+    connection: sqlite3.Connection,
+    pg_conn: _connection,
+    batch_size: int = config.BATCH_SIZE,
+    backend: str = "insert",
+    normalize_in_sql: bool = False,
+    delete_missing: bool = False,
+    schema: str = "content",
+    stats: Optional[Stats] = None,
+) -> Dict[str, int]:
+    """
+    Переносим только новые и изменившиеся фильмы. Вся синхронизация
+    идёт одной транзакцией: вызывающий код фиксирует её или откатывает.
+    delete_missing=True удаляет из Postgres фильмы, которых больше нет
+    в SQLite. Лица и жанры при этом не удаляются: на них могут
+    ссылаться другие фильмы.
+    Возвращает количество новых, изменённых, неизменных и удалённых фильмов.
+    """
+    stats = stats or Stats()
+    known = _get_fingerprints(pg_conn, schema)
+    writers = {} if normalize_in_sql else _get_writers(connection)
+    counts = {"new": 0, "changed": 0, "unchanged": 0, "deleted": 0}
+    seen = set()
+
+    extractor = Extractor(
+        connection, stable_keys=True, normalize_in_sql=normalize_in_sql, stats=stats
+    )
+    for raw_movies in extractor.iter_raw_batches(batch_size):
+        changed_movies, changed = [], {}
+        with stats.stage("sync.fingerprint") as stage:
+            for raw_movie in raw_movies:
+                if normalize_in_sql:
+                    movie_id = raw_movie[0][0]
+                    value = fingerprint_normalized(raw_movie)
+                else:
+                    movie_id = raw_movie[0]
+                    value = fingerprint(raw_movie, writers)
+                seen.add(movie_id)
+                previous = known.get(movie_id)
+                if previous == value:
+                    counts["unchanged"] += 1
+                    continue
+                counts["new" if previous is None else "changed"] += 1
+                changed_movies.append(raw_movie)
+                changed[movie_id] = value
+            stage.rows += len(raw_movies)
+
+        if not changed_movies:
+            continue
+
+        _delete_links(pg_conn, schema, [m for m in changed if m in known])
+        batch = extractor.transform(changed_movies)
+        save_all_data(pg_conn, batch, backend, "update", stats, schema)
+        _save_fingerprints(pg_conn, schema, changed)
+        stats.log_progress(logger)
+
+    if delete_missing:
+        missing = [movie_id for movie_id in known if movie_id not in seen]
+        if missing:
+            _delete_movies(pg_conn, schema, missing)
+        counts["deleted"] = len(missing)
+
+    logger.info(
+        "Synced: %(new)d new, %(changed)d changed, "
+        "%(unchanged)d unchanged, %(deleted)d deleted movies",
+        counts,
+    )
+    return counts
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sqlite", default="db.sqlite", help="путь до базы SQLite")
+    parser.add_argument("--batch-size", type=int, default=config.BATCH_SIZE)
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="insert")
+    parser.add_argument("--normalize-in-sql", action="store_true")
+    parser.add_argument(
+        "--delete-missing",
+        action="store_true",
+        help="удалить фильмы, которых больше нет в SQLite",
+    )
+    args = parser.parse_args()
+
+    dsl = {
+        "dbname": config.POSTGRES_DB,
+        "user": config.POSTGRES_USER,
+        "password": config.POSTGRES_PASSWORD,
+        "host": config.POSTGRES_HOST,
+        "port": config.POSTGRES_PORT,
+    }
+    with conn_context(args.sqlite) as sqlite_conn, psycopg2.connect(**dsl) as pg_conn:
+        sync(
+            sqlite_conn,
+            pg_conn,
+            args.batch_size,
+            args.backend,
+            args.normalize_in_sql,
+            args.delete_missing,
+        )
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Модули переноса импортируются плоско, как при запуске из sqlite_to_postgres
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,169 @@
+"""
+Разбор жанров и лиц в SQL (normalize_in_sql) против разбора в Python.
+Ключи строятся через uuid5, поэтому при одинаковом разборе совпадают
+все строки всех таблиц, кроме меток времени.
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from generate_data import generate
+from sqlite import Batch, Extractor, _get_movies, _shard_ranges
+
+# Фильмы с тем, что разбор должен обработать одинаково: повтор
+# актёра и сценариста, N/A, неизвестный сценарист, пробелы в жанрах,
+# id, который сортируется после любых символов ASCII и "\uffff"
+EDGE_CASES = {
+    "movies": [
+        (
+            "zz00000001",
+            "Drama,  Comedy ",
+            "N/A, Jane Director",
+            "",
+            "Edge 1",
+            "N/A",
+            None,
+            "N/A",
+            json.dumps([{"id": "w1"}, {"id": "w1"}, {"id": "w-missing"}]),
+        ),
+        ("zz00000002", "Horror", "N/A", "w2", "Edge 2", "Plot", None, "7.5", ""),
+        ("zz00000003", "Music", "Solo", "w-missing", "Edge 3", "", None, "x", ""),
+        ("\U0001f3ac", "Music", "N/A", "w2", "Edge 4", "", None, "1", ""),
+    ],
+    "writers": [("w1", "Same Writer"), ("w2", "N/A")],
+    "actors": [(900001, "Twice Actor"), (900002, "N/A")],
+    "movie_actors": [
+        ("zz00000001", "900001"),
+        ("zz00000001", "900001"),
+        ("zz00000001", "900002"),
+        ("zz00000002", "900002"),
+        # Разбор в Python не принимает фильмы без актёров
+        ("zz00000003", "1"),
+        ("\U0001f3ac", "1"),
+    ],
+}
+
+
+def _comparable(batch: Batch) -> list:
+    """ Строки таблиц без меток времени created и modified """
+    return [sorted(row[:-2] for row in rows) for rows in batch]
+
+
+def _load(path: str, batch_size: int, **kwargs) -> list:
+    """ Все пачки переноса, склеенные по таблицам """
+    result = Batch([], [], [], [], [])
+    with sqlite3.connect(path) as conn:
+        extractor = Extractor(conn, stable_keys=True, **kwargs)
+        for batch in extractor.iter_batches(batch_size):
+            for rows, batch_rows in zip(result, batch):
+                rows.extend(batch_rows)
+    conn.close()
+    return _comparable(result)
+
+
+class ParityTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.directory, "fixture.sqlite")
+        generate(cls.path, 300, seed=1)
+        conn = sqlite3.connect(cls.path)
+        conn.executemany(
+            "INSERT INTO movies VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            EDGE_CASES["movies"],
+        )
+        conn.executemany("INSERT INTO writers VALUES (?, ?)", EDGE_CASES["writers"])
+        conn.executemany("INSERT INTO actors VALUES (?, ?)", EDGE_CASES["actors"])
+        conn.executemany(
+            "INSERT INTO movie_actors VALUES (?, ?)", EDGE_CASES["movie_actors"]
+        )
+        conn.commit()
+        conn.close()
+        cls.expected = _load(cls.path, 1000)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def test_fixture_is_not_trivial(self):
+        movies, persons, genres, movies_persons, movies_genres = self.expected
+        self.assertEqual(len(movies), 304)
+        self.assertTrue(persons and genres and movies_persons and movies_genres)
+        names = {row[1] for row in persons}
+        self.assertNotIn("N/A", names)
+        self.assertIn("Twice Actor", names)
+        self.assertIn("Same Writer", names)
+
+    def test_edge_cases(self):
+        movies, persons, _, movies_persons, movies_genres = self.expected
+        names = {row[0]: row[1] for row in persons}
+        movie = next(row[0] for row in movies if row[1] == "Edge 1")
+        links = sorted(
+            (names[row[2]], row[3]) for row in movies_persons if row[1] == movie
+        )
+        self.assertEqual(
+            links,
+            [
+                # Режиссёры, как и в исходном разборе, не обрезаются
+                (" Jane Director", "director"),
+                ("Same Writer", "writer"),
+                ("Twice Actor", "actor"),
+            ],
+        )
+        self.assertEqual(len([row for row in movies_genres if row[1] == movie]), 2)
+
+    def test_sql_matches_python(self):
+        self.assertEqual(_load(self.path, 1000, normalize_in_sql=True), self.expected)
+
+    def test_batch_boundaries(self):
+        for batch_size in (1, 7, 303, 304):
+            for normalize_in_sql in (False, True):
+                with self.subTest(batch_size=batch_size, sql=normalize_in_sql):
+                    self.assertEqual(
+                        _load(self.path, batch_size, normalize_in_sql=normalize_in_sql),
+                        self.expected,
+                    )
+
+    def test_shard_boundaries(self):
+        for batch_size in (1, 50, 304):
+            for normalize_in_sql in (False, True):
+                with self.subTest(batch_size=batch_size, sql=normalize_in_sql):
+                    self.assertEqual(
+                        _load(
+                            self.path,
+                            batch_size,
+                            normalize_in_sql=normalize_in_sql,
+                            readers=3,
+                        ),
+                        self.expected,
+                    )
+
+    def test_resume_after_movie(self):
+        with sqlite3.connect(self.path) as conn:
+            ids = [movie_id for movie_id, in conn.execute("SELECT id FROM movies")]
+        conn.close()
+        after = sorted(ids)[149]
+        for normalize_in_sql in (False, True):
+            with self.subTest(sql=normalize_in_sql):
+                movies = _load(
+                    self.path, 10, normalize_in_sql=normalize_in_sql, after=after
+                )[0]
+                self.assertEqual(len(movies), len(ids) - 150)
+
+    def test_null_id(self):
+        path = os.path.join(self.directory, "null_id.sqlite")
+        shutil.copy(self.path, path)
+        with sqlite3.connect(path) as conn:
+            conn.execute(
+                "INSERT INTO movies VALUES (NULL, 'Music', 'N/A', 'w2', "
+                "'No id', '', NULL, '1', '')"
+            )
+            # Без границ id читаются все фильмы, по диапазонам — ни один
+            self.assertEqual(len(_get_movies(conn)), 305)
+            with self.assertRaises(ValueError):
+                _shard_ranges(conn, 50)
+        conn.close()
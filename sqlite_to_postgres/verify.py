@@ -0,0 +1,270 @@
+"""
+Проверка завершённого переноса по контрольным суммам.
+
+Для каждой таблицы обе стороны считают одинаковые ключи строк:
+содержимое строки без uuid и меток времени, поля через \\x1f.
+Строки раскладываются по частям по первым hex-символам md5 ключа,
+и для каждой части считаются количество строк и сумма 64-битных хешей.
+Сумма не зависит от порядка строк, поэтому Postgres считает её
+одним GROUP BY, а SQLite читается за один проход.
+Если суммы части не совпали, строки перечитываются только для этой части:
+SQLite ещё одним проходом сразу для всех таблиц с различиями, Postgres
+запросом по таблице. Выводятся недостающие и лишние строки.
+
+Проверяются фильмы, лица, лица по ролям, жанры и связи фильмов
+с лицами и жанрами: ключ связи включает ключ фильма, поэтому
+совпадение сумм означает совпадение и состава, и числа связей
+у каждого фильма.
+
+Запуск: python verify.py --sqlite db.sqlite [--chunk-digits 2]
+"""
+import argparse
+import hashlib
+import logging
+import sqlite3
+from collections import Counter
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import config
+import psycopg2
+from psycopg2.extensions import connection as _connection
+from sqlite import _iter_normalized_movies, clean_movie, conn_context
+
+logger = logging.getLogger(__name__)
+
+SEPARATOR = "\x1f"
+
+# Ключ фильма в Postgres: те же поля, что и в _movie_key. float8::numeric
+# переводит рейтинг в текст с 15 значащими цифрами, round округляет
+# половину от нуля, и _format_rating повторяет оба шага
+_PG_MOVIE_KEY = (
+    "concat_ws(E'\\x1f', f.title, coalesce(f.description, ''), "
+    "round(f.rating::numeric, 3)::text)"
+)
+
+# Ключи строк каждой таблицы в Postgres
+PG_KEYS = {
+    "film_work": f"SELECT {_PG_MOVIE_KEY} AS key FROM {{schema}}.film_work f",
+    "persons": "SELECT full_name AS key FROM {schema}.persons",
+    "persons_by_role": """
+        SELECT DISTINCT concat_ws(E'\\x1f', p.full_name, l.role) AS key
+        FROM {schema}.film_works_persons l
+                 JOIN {schema}.persons p ON p.id = l.person_id
+    """,
+    "genres": "SELECT title AS key FROM {schema}.genres",
+    "film_works_persons": f"""
+        SELECT concat_ws(E'\\x1f', {_PG_MOVIE_KEY}, p.full_name, l.role) AS key
+        FROM {{schema}}.film_works_persons l
+                 JOIN {{schema}}.film_work f ON f.id = l.film_work_id
+                 JOIN {{schema}}.persons p ON p.id = l.person_id
+    """,
+    "film_works_genres": f"""
+        SELECT concat_ws(E'\\x1f', {_PG_MOVIE_KEY}, g.title) AS key
+        FROM {{schema}}.film_works_genres l
+                 JOIN {{schema}}.film_work f ON f.id = l.film_work_id
+                 JOIN {{schema}}.genres g ON g.id = l.genre_id
+    """,
+}
+
+# Количество строк и сумма хешей по частям; sum(bigint) в Postgres
+# возвращает numeric, поэтому переполнения нет
+PG_CHUNKS_SQL = """
+    SELECT substr(h, 1, %(digits)s) AS chunk,
+           count(*),
+           sum(('x' || substr(h, 17, 16))::bit(64)::bigint)
+    FROM (SELECT md5(key) AS h FROM ({keys}) k) hashed
+    GROUP BY 1
+"""
+
+PG_ROWS_SQL = """
+    SELECT key FROM ({keys}) k WHERE substr(md5(key), 1, %(digits)s) = ANY(%(chunks)s)
+"""
+
+# Части таблицы: id части -> (количество строк, сумма хешей)
+Chunks = Dict[str, Tuple[int, int]]
+
+
+def _hash(key: str) -> Tuple[str, int]:
+    """ md5 ключа и его вторые 64 бита как знаковое число, как в Postgres """
+    digest = hashlib.md5(key.encode()).hexdigest()
+    value = int(digest[16:], 16)
+    if value >= 1 << 63:
+        value -= 1 << 64
+    return digest, value
+
+
+def _format_rating(rating: float) -> str:
+    """ Рейтинг как round(rating::numeric, 3)::text в Postgres """
+    return str(Decimal(f"{rating:.15g}").quantize(Decimal("0.001"), ROUND_HALF_UP))
+
+
+def _movie_key(title: str, description: Optional[str], imdb_rating: str) -> str:
+    description, rating = clean_movie(description, imdb_rating)
+    return SEPARATOR.join((title, description or "", _format_rating(rating)))
+
+
+def _iter_source_keys(
+    conn: sqlite3.Connection, batch_size: int
+) -> Iterator[Tuple[str, str]]:
+    """
+    Ключи строк, которые должны оказаться в Postgres, как (таблица, ключ).
+    Жанры и лица разбирает SQLite теми же запросами, что и при переносе
+    с normalize_in_sql: их совпадение с разбором в Python проверяет
+    tests/test_parity.py.
+    """
+    persons: Set[str] = set()
+    persons_by_role: Set[Tuple[str, str]] = set()
+    genres: Set[str] = set()
+
+    for movies in _iter_normalized_movies(conn, batch_size):
+        for (_, title, description, imdb_rating), movie_genres, movie_persons in movies:
+            movie = _movie_key(title, description, imdb_rating)
+            yield "film_work", movie
+            for genre in movie_genres:
+                genres.add(genre)
+                yield "film_works_genres", SEPARATOR.join((movie, genre))
+            for full_name, role in movie_persons:
+                persons.add(full_name)
+                persons_by_role.add((full_name, role))
+                yield "film_works_persons", SEPARATOR.join((movie, full_name, role))
+
+    yield from (("persons", full_name) for full_name in persons)
+    yield from (("genres", title) for title in genres)
+    yield from (("persons_by_role", SEPARATOR.join(key)) for key in persons_by_role)
+
+
+def source_chunks(
+    conn: sqlite3.Connection, digits: int, batch_size: int = config.BATCH_SIZE
+) -> Dict[str, Chunks]:
+    """ Считаем части всех таблиц по SQLite за один проход """
+    result: Dict[str, Dict[str, List[int]]] = {table: {} for table in PG_KEYS}
+    for table, key in _iter_source_keys(conn, batch_size):
+        digest, value = _hash(key)
+        chunk = result[table].setdefault(digest[:digits], [0, 0])
+        chunk[0] += 1
+        chunk[1] += value
+    return {
+        table: {chunk: (count, total) for chunk, (count, total) in chunks.items()}
+        for table, chunks in result.items()
+    }
+
+
+def target_chunks(cursor, table: str, digits: int, schema: str = "content") -> Chunks:
+    """ Считаем части таблицы в Postgres """
+    keys = PG_KEYS[table].format(schema=schema)
+    cursor.execute(PG_CHUNKS_SQL.format(keys=keys), {"digits": digits})
+    return {chunk: (count, int(total)) for chunk, count, total in cursor.fetchall()}
+
+
+def _differing(source: Chunks, target: Chunks) -> List[str]:
+    return sorted(
+        chunk
+        for chunk in source.keys() | target.keys()
+        if source.get(chunk) != target.get(chunk)
+    )
+
+
+def narrow_down(
+    conn: sqlite3.Connection,
+    cursor,
+    differing: Dict[str, List[str]],
+    digits: int,
+    schema: str = "content",
+    batch_size: int = config.BATCH_SIZE,
+) -> Dict[str, Tuple[Counter, Counter]]:
+    """
+    Перечитываем строки только из различающихся частей: SQLite одним
+    проходом для всех таблиц из differing, Postgres запросом по таблице.
+    Для каждой таблицы возвращаем строки, которых нет в Postgres,
+    и лишние строки в Postgres.
+    """
+    wanted = {table: set(chunks) for table, chunks in differing.items()}
+    source: Dict[str, Counter] = {table: Counter() for table in differing}
+    for table, key in _iter_source_keys(conn, batch_size):
+        if table in wanted and _hash(key)[0][:digits] in wanted[table]:
+            source[table][key] += 1
+
+    result = {}
+    for table, chunks in differing.items():
+        keys = PG_KEYS[table].format(schema=schema)
+        cursor.execute(
+            PG_ROWS_SQL.format(keys=keys), {"digits": digits, "chunks": chunks}
+        )
+        target = Counter(key for key, in cursor.fetchall())
+        result[table] = (source[table] - target, target - source[table])
+    return result
+
+
+def verify(
+    conn: sqlite3.Connection,
+    pg_conn: _connection,
+    digits: int = 2,
+    examples: int = 10,
+    schema: str = "content",
+) -> bool:
+    """ Сравниваем SQLite и Postgres, пишем в лог различия. True, если совпали """
+    source = source_chunks(conn, digits)
+    differing: Dict[str, List[str]] = {}
+    total_chunks: Dict[str, int] = {}
+
+    with pg_conn.cursor() as cursor:
+        for table in PG_KEYS:
+            target = target_chunks(cursor, table, digits, schema)
+            chunks = _differing(source[table], target)
+            if not chunks:
+                rows = sum(count for count, _ in source[table].values())
+                logger.info("%-20s OK, %d rows", table, rows)
+                continue
+            differing[table] = chunks
+            total_chunks[table] = len(source[table].keys() | target.keys())
+
+        if not differing:
+            return True
+
+        rows_by_table = narrow_down(conn, cursor, differing, digits, schema)
+
+    for table, (missing, extra) in rows_by_table.items():
+        logger.error(
+            "%-20s %d of %d chunks differ: %d rows missing, %d extra",
+            table,
+            len(differing[table]),
+            total_chunks[table],
+            sum(missing.values()),
+            sum(extra.values()),
+        )
+        for label, rows in (("missing", missing), ("extra", extra)):
+            for key in list(rows)[:examples]:
+                logger.error("    %s: %r", label, key.split(SEPARATOR))
+
+    return False
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sqlite", default="db.sqlite", help="путь до базы SQLite")
+    parser.add_argument(
+        "--chunk-digits",
+        type=int,
+        default=2,
+        help="частей на таблицу: 16 в этой степени",
+    )
+    parser.add_argument("--examples", type=int, default=10)
+    parser.add_argument("--schema", default="content")
+    args = parser.parse_args()
+
+    dsl = {
+        "dbname": config.POSTGRES_DB,
+        "user": config.POSTGRES_USER,
+        "password": config.POSTGRES_PASSWORD,
+        "host": config.POSTGRES_HOST,
+        "port": config.POSTGRES_PORT,
+    }
+    with conn_context(args.sqlite, read_only=True) as sqlite_conn, psycopg2.connect(
+        **dsl
+    ) as pg_conn:
+        if not verify(
+            sqlite_conn, pg_conn, args.chunk_digits, args.examples, args.schema
+        ):
+            raise SystemExit(1)
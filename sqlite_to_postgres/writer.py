@@ -0,0 +1,125 @@
+"""
+Параллельная запись пачек в Postgres через несколько соединений.
+
+Пачка пишется в две фазы:
+1. film_work, persons и genres — одновременно, каждая таблица
+   в своём соединении, после чего все три транзакции фиксируются;
+2. film_works_persons и film_works_genres — частями по хешу film_work_id,
+   каждая часть в своём соединении. Связи одного фильма всегда попадают
+   в одну часть, поэтому соединения не конкурируют за одни и те же
+   ключи уникальных индексов.
+Вторая фаза начинается только после фиксации первой,
+так что внешние ключи связей всегда находят свои строки.
+
+Фиксация идёт по соединениям, поэтому при ошибке в живых таблицах
+может остаться часть пачки. Чтобы перенос был атомарным,
+пишите в промежуточную схему (load_data.py --staging): живые таблицы
+подменяются только после успешной загрузки всех пачек.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+from config import TIMEZONE
+from postgres import (
+    BACKENDS,
+    save_genres,
+    save_movies,
+    save_movies_genres,
+    save_movies_persons,
+    save_persons,
+)
+from psycopg2.pool import ThreadedConnectionPool
+from sqlite import Batch
+from stats import Stats
+
+# (таблица, функция сохранения, строки)
+_Task = Tuple[str, Callable, list]
+
+
+def _split_by_movie(rows: list, parts: int) -> List[list]:
+    """ Делим связи на части так, что связи одного фильма не разделяются """
+    chunks: List[list] = [[] for _ in range(parts)]
+    for row in rows:
+        chunks[hash(row.movie_id) % parts].append(row)
+    return [chunk for chunk in chunks if chunk]
+
+
+class ParallelWriter:
+    """ Пишет пачки в Postgres через пул из connections соединений. """
+
+    def __init__(
+        self,
+        dsl: dict,
+        connections: int = 4,
+        backend: str = "insert",
+        on_conflict: Optional[str] = None,
+        schema: str = "content",
+        stats: Optional[Stats] = None,
+    ) -> None:
+        self._pool = ThreadedConnectionPool(connections, connections, **dsl)
+        self._executor = ThreadPoolExecutor(connections)
+        self._connections = connections
+        self._write_rows = BACKENDS[backend]
+        self._on_conflict = on_conflict
+        self._schema = schema
+        self.stats = stats or Stats()
+
+    def _save(self, task: _Task) -> Tuple[str, float, int]:
+        """ Пишем строки одной таблицы в отдельной транзакции """
+        table, save, rows = task
+        started = time.perf_counter()
+        conn = self._pool.getconn()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SET TIME ZONE '{TIMEZONE}';")
+                save(cursor, rows, self._write_rows, self._on_conflict, self._schema)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._pool.putconn(conn)
+        return table, time.perf_counter() - started, len(rows)
+
+    def _run(self, tasks: List[_Task]) -> None:
+        """
+        Выполняем задачи параллельно и ждём их все.
+        Время и строки записываются в стадии load.<таблица>
+        уже в вызывающем потоке.
+        """
+        futures = [self._executor.submit(self._save, task) for task in tasks if task[2]]
+        for future in futures:
+            table, seconds, rows = future.result()
+            self.stats.record(f"load.{table}", seconds, rows)
+
+    def write(self, batch: Batch) -> int:
+        """ Пишем пачку в две фазы, возвращаем количество строк """
+        with self.stats.stage("write.parents"):
+            self._run(
+                [
+                    ("film_work", save_movies, batch.movies),
+                    ("persons", save_persons, batch.persons),
+                    ("genres", save_genres, batch.genres),
+                ]
+            )
+
+        with self.stats.stage("write.links"):
+            self._run(
+                [
+                    ("film_works_persons", save_movies_persons, chunk)
+                    for chunk in _split_by_movie(
+                        batch.movies_persons, self._connections
+                    )
+                ]
+                + [
+                    ("film_works_genres", save_movies_genres, chunk)
+                    for chunk in _split_by_movie(batch.movies_genres, self._connections)
+                ]
+            )
+
+        return sum(len(rows) for rows in batch)
+
+    def close(self) -> None:
+        self._executor.shutdown()
+        self._pool.closeall()